@@ -0,0 +1,238 @@
+"""
+Hot/Cold Archival
+Moves papers and evaluations older than ARCHIVE_AFTER_DAYS out of the live
+tables into archive tables (questions, answers and feedback compressed), in
+small batches, so the tables and indexes behind the dashboard and lists stay
+small. Archived items are still fetched by ID, and an archived paper moves
+back when it is attempted again. Stats rollups are cumulative, so they keep
+counting archived rows.
+
+The first job worker runs a batch whenever it is idle and archival is due.
+
+Usage:
+    python archive.py --run              # archive everything past the cutoff now
+    python archive.py --run --days 180
+    python archive.py --stats            # live vs. archived row counts
+"""
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import insert, select, exists
+from sqlalchemy.orm import Session, selectinload
+from database import (
+    Paper, Evaluation, PaperQuestion, ArchivedPaper, ArchivedEvaluation, ArchivedSeenQuestion
+)
+from question_store import question_dict, attach_questions
+import config
+
+EVALUATION_COLUMNS = ("id", "user_id", "paper_id", "student_answers", "score", "total_marks", "feedback", "evaluated_at")
+
+
+def cutoff(days: Optional[int] = None) -> datetime:
+    """Items created before this time are archived"""
+    return datetime.utcnow() - timedelta(days=config.ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def archive_evaluations(db: Session, before: datetime, batch_size: int) -> int:
+    """
+    Move one batch of evaluations older than before into the archive
+
+    Rows are copied inside the database, so answers and feedback keep their
+    stored (compressed) form. Runs in the caller's transaction; the caller
+    commits. Returns the number of evaluations moved.
+    """
+    # An ID already in the archive (reused before IDs were AUTOINCREMENT) stays live
+    ids = [row[0] for row in db.query(Evaluation.id).filter(
+        Evaluation.evaluated_at < before,
+        ~exists().where(ArchivedEvaluation.id == Evaluation.id)
+    ).order_by(Evaluation.id).limit(batch_size)]
+    if not ids:
+        return 0
+
+    db.execute(insert(ArchivedEvaluation).from_select(
+        list(EVALUATION_COLUMNS) + ["subject"],
+        select(*(getattr(Evaluation, name) for name in EVALUATION_COLUMNS), Paper.subject).outerjoin(
+            Paper, Paper.id == Evaluation.paper_id
+        ).where(Evaluation.id.in_(ids))
+    ))
+    db.query(Evaluation).filter(Evaluation.id.in_(ids)).delete(synchronize_session=False)
+    return len(ids)
+
+
+def _paper_questions(paper: Paper) -> list:
+    """A paper's questions with their bank IDs, from its rows or the JSON blob of older papers"""
+    if not paper.question_rows:
+        return json.loads(paper.questions or "[]")
+    return [
+        dict(question_dict(row), bank_question_id=row.bank_question_id)
+        for row in paper.question_rows
+    ]
+
+
+def archive_papers(db: Session, before: datetime, batch_size: int) -> int:
+    """
+    Move one batch of papers older than before into the archive
+
+    Papers that still have live evaluations wait until those are archived.
+    Bank questions the papers used are remembered so they are not drawn for
+    the user again. Runs in the caller's transaction; the caller commits.
+    Returns the number of papers moved.
+    """
+    papers = db.query(Paper).options(selectinload(Paper.question_rows)).filter(
+        Paper.created_at < before,
+        ~exists().where(Evaluation.paper_id == Paper.id),
+        ~exists().where(ArchivedPaper.id == Paper.id)
+    ).order_by(Paper.id).limit(batch_size).all()
+    if not papers:
+        return 0
+
+    seen = {}
+    for paper in papers:
+        questions = _paper_questions(paper)
+        db.add(ArchivedPaper(
+            id=paper.id, user_id=paper.user_id, grade=paper.grade, subject=paper.subject,
+            chapter=paper.chapter, topic=paper.topic, document_name=paper.document_name,
+            document_id=paper.document_id, media_hash=paper.media_hash, paper_type=paper.paper_type,
+            questions=json.dumps(questions), total_marks=paper.total_marks, created_at=paper.created_at
+        ))
+        seen.setdefault(paper.user_id, set()).update(
+            q["bank_question_id"] for q in questions if q.get("bank_question_id")
+        )
+    for user_id, bank_ids in seen.items():
+        if bank_ids:
+            known = {row[0] for row in db.query(ArchivedSeenQuestion.bank_question_id).filter(
+                ArchivedSeenQuestion.user_id == user_id,
+                ArchivedSeenQuestion.bank_question_id.in_(bank_ids)
+            )}
+            db.add_all(
+                ArchivedSeenQuestion(user_id=user_id, bank_question_id=bank_id)
+                for bank_id in bank_ids - known
+            )
+
+    ids = [paper.id for paper in papers]
+    db.flush()
+    db.query(PaperQuestion).filter(PaperQuestion.paper_id.in_(ids)).delete(synchronize_session=False)
+    db.query(Paper).filter(Paper.id.in_(ids)).delete(synchronize_session=False)
+    for paper in papers:
+        db.expunge(paper)
+    return len(ids)
+
+
+def archive_batch(db: Session, days: Optional[int] = None, batch_size: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Archive one batch of evaluations, then one of papers, and commit
+
+    Returns (evaluations, papers) moved; a full batch means more are waiting.
+    """
+    before = cutoff(days)
+    batch_size = batch_size or config.ARCHIVE_BATCH_SIZE
+    try:
+        evaluations = archive_evaluations(db, before, batch_size)
+        db.commit()
+        papers = archive_papers(db, before, batch_size)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return evaluations, papers
+
+
+def restore_paper(db: Session, paper_id: int) -> Optional[Paper]:
+    """
+    Move an archived paper back to the live tables under its old ID
+
+    Returns the paper, or None if it is not archived. Raises ValueError if a
+    live paper already has the ID. Runs in the caller's transaction; the
+    caller commits.
+    """
+    archived = db.get(ArchivedPaper, paper_id)
+    if archived is None:
+        return None
+    if db.get(Paper, paper_id) is not None:
+        raise ValueError(f"Cannot restore archived paper {paper_id}: a live paper has the same ID")
+
+    questions = json.loads(archived.questions)
+    paper = Paper(
+        id=archived.id, user_id=archived.user_id, grade=archived.grade, subject=archived.subject,
+        chapter=archived.chapter, topic=archived.topic, document_name=archived.document_name,
+        document_id=archived.document_id, media_hash=archived.media_hash, paper_type=archived.paper_type,
+        total_marks=archived.total_marks, created_at=archived.created_at
+    )
+    attach_questions(paper, questions)
+    db.delete(archived)
+    db.add(paper)
+    db.flush()
+    return paper
+
+
+def archived_paper_question(db: Session, paper_id: int, user_id: int, number: int) -> Optional[dict]:
+    """One question of the user's archived paper, or None"""
+    archived = db.get(ArchivedPaper, paper_id)
+    if archived is None or archived.user_id != user_id:
+        return None
+    return next((q for q in json.loads(archived.questions) if q.get("question_number") == number), None)
+
+
+def archived_evaluation_question(db: Session, evaluation_id: int, user_id: int, number: int) -> Optional[dict]:
+    """One question of the paper behind the user's archived evaluation, or None"""
+    evaluation = db.get(ArchivedEvaluation, evaluation_id)
+    if evaluation is None or evaluation.user_id != user_id:
+        return None
+
+    row = db.query(PaperQuestion).filter(
+        PaperQuestion.paper_id == evaluation.paper_id,
+        PaperQuestion.number == number
+    ).first()
+    if row is not None:
+        return dict(question_dict(row), bank_question_id=row.bank_question_id)
+    return archived_paper_question(db, evaluation.paper_id, user_id, number)
+
+
+def archive_stats(db: Session) -> dict:
+    """Live and archived row counts"""
+    return {
+        "papers": (db.query(Paper.id).count(), db.query(ArchivedPaper.id).count()),
+        "evaluations": (db.query(Evaluation.id).count(), db.query(ArchivedEvaluation.id).count())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old papers and evaluations")
+    parser.add_argument("--run", action="store_true", help="Archive everything past the cutoff")
+    parser.add_argument("--days", type=int, help=f"Archive items older than this (default {config.ARCHIVE_AFTER_DAYS})")
+    parser.add_argument("--batch", type=int, default=config.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--stats", action="store_true", help="Show live vs. archived row counts")
+    args = parser.parse_args()
+
+    if not (args.run or args.stats):
+        parser.print_help()
+        return
+
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if args.run:
+            print(f"Archiving items older than {cutoff(args.days):%Y-%m-%d}...")
+            total_evaluations = total_papers = 0
+            while True:
+                evaluations, papers = archive_batch(db, args.days, args.batch)
+                total_evaluations += evaluations
+                total_papers += papers
+                if not (evaluations or papers):
+                    break
+                print(f"  ... {total_evaluations} evaluations, {total_papers} papers archived")
+                time.sleep(0.05)
+            print(f"✅ Archived {total_evaluations} evaluations and {total_papers} papers")
+
+        if args.stats:
+            for name, (live, archived) in archive_stats(db).items():
+                print(f"{name}: {live} live, {archived} archived")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
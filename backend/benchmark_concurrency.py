@@ -0,0 +1,133 @@
+"""
+API Concurrency Benchmark
+Many simultaneous clients against a running API server, reporting requests per
+second and latency for a mix of dashboard, list, paper and login requests
+
+Start the server first (python main.py), then, from the same directory so both
+use the same DATABASE_URL:
+
+Usage:
+    python benchmark_concurrency.py                         # 50 clients, 2,000 requests
+    python benchmark_concurrency.py --clients 100 --requests 5000 --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+EMAIL = "benchmark@example.com"
+PASSWORD = "benchmark-password"
+
+
+def _seed(user_id: int, papers: int):
+    """Give the benchmark user papers and evaluations to list (once)"""
+    from database import SessionLocal, Paper, Evaluation
+    from question_store import attach_questions
+    from user_stats import rebuild_user_stats
+
+    db = SessionLocal()
+    try:
+        existing = db.query(Paper).filter(Paper.user_id == user_id).count()
+        for number in range(existing, papers):
+            questions = [
+                {"question_number": i, "question_type": "Short Answer", "question_text": f"Question {i} of paper {number}",
+                 "marks": 5, "correct_answer": "answer"}
+                for i in range(1, 21)
+            ]
+            paper = Paper(
+                user_id=user_id, grade="9", subject=random.choice(["Biology", "Physics", "Chemistry"]),
+                chapter=f"Chapter {number}", paper_type="curriculum", questions=json.dumps(questions), total_marks=100
+            )
+            attach_questions(paper, questions)
+            db.add(paper)
+            db.flush()
+            db.add(Evaluation(
+                user_id=user_id, paper_id=paper.id, student_answers="[]", feedback="[]",
+                score=random.randint(20, 100), total_marks=100
+            ))
+        db.commit()
+        rebuild_user_stats(db, user_id)
+        db.commit()
+        return [row[0] for row in db.query(Paper.id).filter(Paper.user_id == user_id)]
+    finally:
+        db.close()
+
+
+async def _login(client: httpx.AsyncClient) -> dict:
+    response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+    if response.status_code != 200:
+        response = await client.post(
+            "/api/auth/signup", json={"email": EMAIL, "username": "benchmark", "password": PASSWORD}
+        )
+    response.raise_for_status()
+    return response.json()
+
+
+async def _client(client, headers, paper_ids, queue, timings, errors):
+    while True:
+        try:
+            kind = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        if kind == "login":
+            response = await client.post("/api/auth/login", json={"email": EMAIL, "password": PASSWORD})
+        elif kind == "dashboard":
+            response = await client.get("/api/dashboard", headers=headers)
+        elif kind == "papers":
+            response = await client.get("/api/papers", headers=headers, params={"limit": 20})
+        else:
+            response = await client.get(f"/api/papers/{random.choice(paper_ids)}", headers=headers)
+        timings.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def run(url: str, clients: int, requests: int, papers: int, login_share: float):
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        token = await _login(client)
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+        paper_ids = _seed(token["user"]["id"], papers)
+
+        queue = asyncio.Queue()
+        for _ in range(requests):
+            if random.random() < login_share:
+                queue.put_nowait("login")
+            else:
+                queue.put_nowait(random.choice(["dashboard", "papers", "paper"]))
+
+        timings, errors = {}, []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _client(client, headers, paper_ids, queue, timings, errors) for _ in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+
+    print(f"{requests:,} requests from {clients} clients in {elapsed:.1f}s: "
+          f"{requests / elapsed:.0f} requests/s, {len(errors)} errors")
+    for kind, values in sorted(timings.items()):
+        values.sort()
+        print(f"  {kind:<10} {len(values):>6,}  median {statistics.median(values):8.1f} ms  "
+              f"p95 {values[int(len(values) * 0.95)]:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--papers", type=int, default=200, help="Papers to seed for the benchmark user")
+    parser.add_argument("--login-share", type=float, default=0.02, help="Fraction of requests that log in")
+    args = parser.parse_args()
+
+    random.seed(7)
+    asyncio.run(run(args.url, args.clients, args.requests, args.papers, args.login_share))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+DOCX Extraction Benchmark
+Compares the streaming extractor against the previous python-docx path
+
+Usage:
+    python benchmark_docx.py                 # builds a 50 MB worksheet-style DOCX
+    python benchmark_docx.py --size-mb 10
+    python benchmark_docx.py --file path/to/document.docx
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+EXTRACTORS = ["python-docx", "python-docx+tables", "streaming"]
+WORDS = (
+    "cell membrane nucleus energy photosynthesis chlorophyll glucose oxygen carbon "
+    "dioxide respiration enzyme protein molecule osmosis diffusion tissue organ "
+    "system plant animal water light reaction product substrate temperature"
+).split()
+
+
+def _paragraph(rng: random.Random) -> str:
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30)))
+    return f'<w:p><w:r><w:t xml:space="preserve">{words}</w:t></w:r></w:p>'
+
+
+def _table(rng: random.Random) -> str:
+    rows = []
+    for _ in range(rng.randint(3, 8)):
+        cells = "".join(f"<w:tc>{_paragraph(rng)}</w:tc>" for _ in range(3))
+        rows.append(f"<w:tr>{cells}</w:tr>")
+    return f"<w:tbl>{''.join(rows)}</w:tbl>"
+
+
+def build_docx(path: str, size_mb: int, seed: int = 42):
+    """Write a worksheet-style DOCX (paragraphs and tables) of roughly size_mb on disk"""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", PACKAGE_RELS)
+        with archive.open("word/document.xml", "w", force_zip64=True) as xml_stream:
+            xml_stream.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            )
+            while os.path.getsize(path) < target:
+                chunk = "".join(_table(rng) if rng.random() < 0.4 else _paragraph(rng) for _ in range(2000))
+                xml_stream.write(chunk.encode("utf-8"))
+                archive.fp.flush()
+            xml_stream.write(b"</w:body></w:document>")
+
+
+def extract_with_python_docx(content: bytes) -> str:
+    """The previous extractor: full python-docx object model, paragraphs only"""
+    from docx import Document
+    doc = Document(io.BytesIO(content))
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return text.strip()
+
+
+def extract_with_python_docx_tables(content: bytes) -> str:
+    """python-docx object model walked in body order, including table cells"""
+    from docx import Document
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+    doc = Document(io.BytesIO(content))
+    lines = []
+    for child in doc.element.body.iterchildren():
+        if child.tag.endswith("}p"):
+            lines.append(Paragraph(child, doc).text)
+        elif child.tag.endswith("}tbl"):
+            for row in Table(child, doc).rows:
+                lines.append(" | ".join(cell.text for cell in row.cells if cell.text))
+    return "\n".join(line for line in lines if line).strip()
+
+
+def extract_with_streaming(content: bytes) -> str:
+    """The current extractor in document_utils, without its MAX_DOCX_TEXT_CHARS cap so all text is extracted"""
+    from document_utils import extract_text_from_docx
+    return extract_text_from_docx(content, max_chars=sys.maxsize)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return float("nan")
+
+
+def run_single(extractor: str, path: str):
+    """Run one extractor in this process and print its measurements as JSON"""
+    with open(path, "rb") as f:
+        content = f.read()
+    baseline_mb = peak_rss_mb()
+    
+    start = time.perf_counter()
+    if extractor == "python-docx":
+        text = extract_with_python_docx(content)
+    elif extractor == "python-docx+tables":
+        text = extract_with_python_docx_tables(content)
+    else:
+        text = extract_with_streaming(content)
+    seconds = time.perf_counter() - start
+    
+    print(json.dumps({
+        "extractor": extractor,
+        "seconds": round(seconds, 2),
+        "peak_mb_over_input": round(peak_rss_mb() - baseline_mb, 1),
+        "chars": len(text)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DOCX text extraction")
+    parser.add_argument("--file", help="Existing DOCX to benchmark (default: generate one)")
+    parser.add_argument("--size-mb", type=int, default=50, help="Size of the generated DOCX")
+    parser.add_argument("--run", choices=EXTRACTORS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.run:
+        run_single(args.run, args.file)
+        return
+    
+    print("=" * 60)
+    print("DOCX Extraction Benchmark")
+    print("=" * 60)
+    
+    path = args.file
+    generated = False
+    if not path:
+        fd, path = tempfile.mkstemp(suffix=".docx")
+        os.close(fd)
+        generated = True
+        print(f"\nBuilding {args.size_mb} MB test document...")
+        build_docx(path, args.size_mb)
+    
+    try:
+        print(f"Document: {path} ({os.path.getsize(path) / (1024 * 1024):.1f} MB)\n")
+        # Each extractor runs in a fresh process so peak memory is measured separately
+        for extractor in EXTRACTORS:
+            result = subprocess.run(
+                [sys.executable, __file__, "--run", extractor, "--file", path],
+                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            if result.returncode != 0:
+                print(f"   ❌ {extractor} failed: {result.stderr.strip().splitlines()[-1:]}")
+                continue
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"   {extractor:<18} {stats['seconds']:>8.2f}s  "
+                  f"peak +{stats['peak_mb_over_input']:>8.1f} MB  {stats['chars']:>12,} chars")
+    finally:
+        if generated:
+            os.unlink(path)
+    
+    print("\n" + "=" * 60)
+
+
+if __name__ == "__main__":
+    main()
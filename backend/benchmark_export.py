@@ -0,0 +1,109 @@
+"""
+History Export Benchmark
+Streams a user's evaluations in each export format from a scratch database,
+reporting rows per second and output size, and the peak memory used for a
+small and a large history to show it does not grow with the row count
+
+Usage:
+    python benchmark_export.py                       # 100,000 evaluations
+    python benchmark_export.py --rows 500000 --details
+"""
+import os
+import json
+import random
+import argparse
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def _seed(db, email: str, rows: int) -> int:
+    """A user with papers and rows evaluations spread over the last two years"""
+    from sqlalchemy import insert
+    from database import User, Paper, Evaluation
+
+    user = User(email=email, username=email.split("@")[0], hashed_password="x")
+    db.add(user)
+    db.flush()
+    papers = [
+        Paper(user_id=user.id, grade="9", subject=subject, chapter=f"Chapter {number}", paper_type="curriculum",
+              questions="[]", total_marks=100)
+        for number in range(50) for subject in ("Biology", "Physics", "Chemistry")
+    ]
+    db.add_all(papers)
+    db.flush()
+
+    start = datetime.utcnow() - timedelta(days=730)
+    for offset in range(0, rows, 5000):
+        db.execute(insert(Evaluation), [
+            {
+                "user_id": user.id,
+                "paper_id": random.choice(papers).id,
+                "student_answers": json.dumps({str(n): f"Answer {n} for attempt {number}" for n in range(1, 11)}),
+                "feedback": json.dumps([
+                    {"question_number": n, "marks_obtained": random.randint(0, 10), "marks_total": 10,
+                     "feedback": "Mostly correct, but the explanation misses a step.", "correct_answer": "B"}
+                    for n in range(1, 11)
+                ]),
+                "score": random.randint(20, 100),
+                "total_marks": 100,
+                "evaluated_at": start + timedelta(minutes=number * 7)
+            }
+            for number in range(offset, min(offset + 5000, rows))
+        ])
+    db.commit()
+    return user.id
+
+
+def _drain(user_id: int, format: str, details: bool) -> int:
+    from export import stream_export
+
+    return sum(len(chunk) for chunk in stream_export(user_id, "evaluations", format, details))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100000, help="Evaluations in the large history")
+    parser.add_argument("--details", action="store_true", help="Include answers and feedback")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configure the scratch database before anything imports database.py
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'benchmark.db')}"
+        from database import SessionLocal
+        import export
+
+        random.seed(7)
+        small_rows = max(args.rows // 10, 1)
+        print(f"Seeding {small_rows:,} and {args.rows:,} evaluations...")
+        db = SessionLocal()
+        try:
+            small_user = _seed(db, "small@example.com", small_rows)
+            large_user = _seed(db, "large@example.com", args.rows)
+        finally:
+            db.close()
+
+        formats = [name for name in export.FORMATS if name != "parquet" or export.pyarrow is not None]
+        # Load lazily imported modules before timing anything
+        _drain(small_user, "csv", args.details)
+        for format in formats:
+            start = time.perf_counter()
+            size = _drain(large_user, format, args.details)
+            elapsed = time.perf_counter() - start
+
+            peaks = []
+            for user_id in (small_user, large_user):
+                tracemalloc.start()
+                _drain(user_id, format, args.details)
+                peaks.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+                tracemalloc.stop()
+
+            print(f"{format:<8} {args.rows / elapsed:9,.0f} rows/s  {elapsed:6.2f}s  {size / 1024 / 1024:7.1f} MB  "
+                  f"peak memory {peaks[0]:.1f} MB at {small_rows:,} rows, {peaks[1]:.1f} MB at {args.rows:,}")
+        if "parquet" not in formats:
+            print("parquet  skipped (pyarrow is not installed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Near-Duplicate Index Benchmark
+Builds a MinHash/LSH index of synthetic questions and times lookups
+
+Usage:
+    python benchmark_minhash.py                    # 1,000,000 questions
+    python benchmark_minhash.py --questions 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+STEMS = ["Explain", "Describe", "What is", "Define", "State", "Why does", "How does", "Compare"]
+VOCABULARY_SIZE = 20000
+
+
+def _vocabulary(rng: random.Random) -> list:
+    """Pseudo-words standing in for a real subject vocabulary"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+def _question(rng: random.Random, vocabulary: list, weights: list) -> str:
+    words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(6, 14))
+    return f"{rng.choice(STEMS)} {' '.join(words)}?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["MINHASH_INDEX_PATH"] = os.path.join(tmp, "minhash.db")
+        import minhash_index
+
+        rng = random.Random(7)
+        vocabulary = _vocabulary(rng)
+        # Word frequencies follow Zipf's law, as in real question text
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1)))
+        question = lambda: _question(rng, vocabulary, weights)
+        start = time.perf_counter()
+        for first in range(0, args.questions, args.batch):
+            count = min(args.batch, args.questions - first)
+            minhash_index.add_questions((first + i, question(), 0) for i in range(count))
+        build = time.perf_counter() - start
+        size_mb = os.path.getsize(minhash_index.INDEX_PATH) / (1024 * 1024)
+        print(f"Indexed {args.questions:,} questions in {build:.1f}s ({size_mb:.0f} MB)")
+
+        # Half the lookups are paraphrases (one word swapped) of indexed questions
+        rng.seed(7)
+        vocabulary = _vocabulary(rng)
+        indexed = [question() for _ in range(args.lookups // 2)]
+        paraphrases = []
+        for text in indexed:
+            words = text.split()
+            words[rng.randrange(2, len(words))] = rng.choice(vocabulary)
+            paraphrases.append(" ".join(words))
+        queries = [minhash_index.signature(text) for text in paraphrases]
+        rng.seed(99)
+        queries += [minhash_index.signature(question()) for _ in range(args.lookups - len(queries))]
+        timings = []
+        found = 0
+        for sig in queries:
+            start = time.perf_counter()
+            found += bool(minhash_index.query(sig=sig))
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(f"Lookup (precomputed signature): median {statistics.median(timings):.3f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95)]:.3f} ms, {found} with near-duplicates")
+
+        start = time.perf_counter()
+        for _ in range(args.lookups):
+            minhash_index.signature(question())
+        print(f"Signature: {(time.perf_counter() - start) * 1000 / args.lookups:.3f} ms per question")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+SQLite Write-Contention Benchmark
+50 concurrent users reading their dashboards and paper lists while committing
+evaluations, with and without the SQLite performance profile in database.py
+
+Usage:
+    python benchmark_sqlite.py                     # both profiles, 50 users, 20 seconds each
+    python benchmark_sqlite.py --users 100 --seconds 60 --write-share 0.5
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+
+def _seed(db, users: int, papers: int) -> list:
+    from database import User, Paper
+    from user_stats import rebuild_user_stats
+
+    user_ids = []
+    for number in range(users):
+        user = User(email=f"user{number}@example.com", username=f"user{number}", hashed_password="x")
+        db.add(user)
+        db.flush()
+        for paper_number in range(papers):
+            db.add(Paper(
+                user_id=user.id, grade="9", subject=random.choice(["Biology", "Physics", "Chemistry"]),
+                chapter=f"Chapter {paper_number}", paper_type="curriculum", questions="[]", total_marks=100
+            ))
+        db.flush()
+        rebuild_user_stats(db, user.id)
+        user_ids.append(user.id)
+    db.commit()
+    return user_ids
+
+
+def _read(db, user_id: int):
+    """What the dashboard and My Papers pages load"""
+    from database import Paper
+    from user_stats import get_user_stats
+    from pagination import paginate
+
+    get_user_stats(db, user_id)
+    query = db.query(Paper.id, Paper.subject, Paper.chapter, Paper.created_at).filter(Paper.user_id == user_id)
+    paginate(query, Paper.created_at, Paper.id, None, 20)
+
+
+def _write(db, user_id: int, paper_ids: list):
+    """What saving an evaluation commits"""
+    from database import Evaluation
+    from user_stats import record_evaluation
+
+    score = random.randint(20, 100)
+    record_evaluation(db, user_id, "Biology", score, 100, "B")
+    db.add(Evaluation(
+        user_id=user_id, paper_id=random.choice(paper_ids), student_answers="[]", feedback="[]",
+        score=score, total_marks=100
+    ))
+    db.commit()
+
+
+def _user(user_id, paper_ids, deadline, write_share, results):
+    from database import SessionLocal
+
+    while time.perf_counter() < deadline:
+        kind = "write" if random.random() < write_share else "read"
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            if kind == "write":
+                _write(db, user_id, paper_ids)
+            else:
+                _read(db, user_id)
+            results[kind].append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            db.rollback()
+            results["errors"].append(type(e).__name__ + ": " + str(e).splitlines()[0][:80])
+        finally:
+            db.close()
+
+
+def run(users: int, seconds: float, write_share: float):
+    """One benchmark pass with the profile chosen by SQLITE_PERFORMANCE_PROFILE"""
+    from database import SessionLocal, Paper, engine
+
+    db = SessionLocal()
+    try:
+        user_ids = _seed(db, users, 20)
+        paper_ids = {user_id: [row[0] for row in db.query(Paper.id).filter(Paper.user_id == user_id)] for user_id in user_ids}
+    finally:
+        db.close()
+
+    results = {"read": [], "write": [], "errors": []}
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(target=_user, args=(user_id, paper_ids[user_id], deadline, write_share, results))
+        for user_id in user_ids
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with engine.connect() as connection:
+        journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    operations = len(results["read"]) + len(results["write"])
+    print(f"journal_mode={journal_mode}: {operations / seconds:.0f} operations/s, "
+          f"{len(results['errors'])} errors")
+    for kind in ("read", "write"):
+        values = sorted(results[kind])
+        if values:
+            print(f"  {kind:<6} {len(values) / seconds:7.0f}/s  median {statistics.median(values):7.1f} ms  "
+                  f"p95 {values[int(len(values) * 0.95)]:7.1f} ms")
+    for error in sorted(set(results["errors"]))[:3]:
+        print(f"  ❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--write-share", type=float, default=0.25, help="Fraction of operations that commit")
+    parser.add_argument("--profile", choices=["on", "off"], help="Run one pass only (used internally)")
+    args = parser.parse_args()
+
+    if args.profile:
+        random.seed(7)
+        run(args.users, args.seconds, args.write_share)
+        return
+
+    # Each pass needs a fresh process, as the engine is configured at import
+    for profile in ("off", "on"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'benchmark.db')}",
+                SQLITE_PERFORMANCE_PROFILE="true" if profile == "on" else "false"
+            )
+            print(f"Profile {profile}:")
+            subprocess.run([
+                sys.executable, __file__, "--profile", profile, "--users", str(args.users),
+                "--seconds", str(args.seconds), "--write-share", str(args.write_share)
+            ], env=env, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Vector Index Benchmark
+Builds a TF-IDF vector index of synthetic questions and times top-k searches,
+brute force and through the inverted-file lists
+
+Usage:
+    python benchmark_vectors.py                    # 1,000,000 questions
+    python benchmark_vectors.py --questions 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+STEMS = ["Explain", "Describe", "What is", "Define", "State", "Why does", "How does", "Compare"]
+VOCABULARY_SIZE = 20000
+
+
+def _vocabulary(rng: random.Random) -> list:
+    """Pseudo-words standing in for a real subject vocabulary"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(VOCABULARY_SIZE)]
+
+
+def _question(rng: random.Random, vocabulary: list, weights: list) -> str:
+    words = rng.choices(vocabulary, cum_weights=weights, k=rng.randint(6, 14))
+    return f"{rng.choice(STEMS)} {' '.join(words)}?"
+
+
+def _time(search, queries) -> list:
+    timings = []
+    for vector in queries:
+        start = time.perf_counter()
+        search(vector)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["VECTOR_INDEX_PATH"] = os.path.join(tmp, "vectors.db")
+        import vector_index
+
+        vocabulary = _vocabulary(random.Random(7))
+        # Word frequencies follow Zipf's law, as in real question text
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY_SIZE + 1)))
+
+        def batches():
+            rng = random.Random(11)
+            for first in range(0, args.questions, args.batch):
+                count = min(args.batch, args.questions - first)
+                yield [(first + i + 1, _question(rng, vocabulary, weights)) for i in range(count)]
+
+        start = time.perf_counter()
+        indexed = vector_index.build(batches)
+        build = time.perf_counter() - start
+        size_mb = os.path.getsize(vector_index.INDEX_PATH) / (1024 * 1024)
+        print(f"Indexed {indexed:,} questions in {build:.1f}s ({size_mb:.0f} MB)")
+
+        start = time.perf_counter()
+        matrix = vector_index._matrix()
+        print(f"Loaded into memory in {time.perf_counter() - start:.1f}s")
+
+        # Queries are paraphrases (one word swapped) of indexed questions
+        rng = random.Random(99)
+        idf = matrix.model["idf"]
+        sources = next(batches())[:args.lookups]
+        queries = []
+        for _, text in sources:
+            words = text.split()
+            words[rng.randrange(2, len(words))] = rng.choice(vocabulary)
+            queries.append(vector_index.vectorize(" ".join(words), idf))
+
+        ivf = _time(lambda vector: vector_index.search(vector=vector, k=args.k), queries)
+        centroids = matrix.model["centroids"]
+        matrix.model["centroids"] = None
+        brute = _time(lambda vector: vector_index.search(vector=vector, k=args.k), queries)
+        exact = [set(q for q, _ in vector_index.search(vector=vector, k=args.k)) for vector in queries]
+        matrix.model["centroids"] = centroids
+        approximate = [set(q for q, _ in vector_index.search(vector=vector, k=args.k)) for vector in queries]
+        recall = sum(len(a & e) for a, e in zip(approximate, exact)) / max(1, sum(len(e) for e in exact))
+        found = sum(question_id in e for (question_id, _), e in zip(sources, exact))
+        found_ivf = sum(question_id in a for (question_id, _), a in zip(sources, approximate))
+
+        print(f"Brute force top-{args.k}: median {statistics.median(brute):.2f} ms, "
+              f"p95 {brute[int(len(brute) * 0.95)]:.2f} ms, source found {found}/{len(queries)}")
+        if centroids is not None:
+            print(f"IVF top-{args.k} ({len(centroids)} lists, {vector_index.IVF_PROBES} probed): "
+                  f"median {statistics.median(ivf):.2f} ms, p95 {ivf[int(len(ivf) * 0.95)]:.2f} ms, recall {recall:.2f}, source found {found_ivf}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Compressed Text Columns
+zstd or zlib compression of large text values behind a short format marker,
+so existing plain rows stay readable (database.CompressedText applies it
+through the ORM), plus a background job that recompresses existing rows in
+small batches
+
+Usage:
+    python compression.py --recompress            # compress rows written before compression
+    python compression.py --recompress --vacuum   # then shrink the SQLite file
+    python compression.py --stats                 # stored vs. original sizes
+"""
+import zlib
+import time
+import base64
+import argparse
+from typing import Optional
+from sqlalchemy import Text, select, update, type_coerce, bindparam
+import config
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB_MARKER = "zl1:"
+ZSTD_MARKER = "zs1:"
+MARKERS = (ZLIB_MARKER, ZSTD_MARKER)
+
+
+def default_codec() -> str:
+    """zstd when the zstandard package is installed, otherwise zlib"""
+    codec = config.COMPRESSION_CODEC
+    if codec == "auto":
+        return "zstd" if zstandard is not None else "zlib"
+    return codec
+
+
+def compress_text(value: str, codec: Optional[str] = None) -> str:
+    """
+    Stored form of a value: marker + base64 of the compressed UTF-8 bytes
+
+    Values under COMPRESSION_MIN_BYTES, or that would not get smaller, stay
+    plain unless they happen to start with a marker.
+    """
+    raw = value.encode("utf-8")
+    ambiguous = value.startswith(MARKERS)
+    if len(raw) < config.COMPRESSION_MIN_BYTES and not ambiguous:
+        return value
+
+    codec = codec or default_codec()
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("COMPRESSION_CODEC is zstd but the zstandard package is not installed")
+        compressed = zstandard.ZstdCompressor(level=config.ZSTD_LEVEL).compress(raw)
+        stored = ZSTD_MARKER + base64.b64encode(compressed).decode("ascii")
+    else:
+        stored = ZLIB_MARKER + base64.b64encode(zlib.compress(raw, config.ZLIB_LEVEL)).decode("ascii")
+    return stored if len(stored) < len(raw) or ambiguous else value
+
+
+def decompress_text(stored: Optional[str]) -> Optional[str]:
+    """Original value of a stored one; plain values are returned unchanged"""
+    if stored is None or not stored.startswith(MARKERS):
+        return stored
+    data = base64.b64decode(stored[len(ZLIB_MARKER):])
+    if stored.startswith(ZSTD_MARKER):
+        if zstandard is None:
+            raise RuntimeError("Row is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    return zlib.decompress(data).decode("utf-8")
+
+
+def _compressed_columns():
+    """(table, column) pairs of every CompressedText column"""
+    from database import Base, CompressedText
+    return [
+        (table, column)
+        for table in Base.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, CompressedText)
+    ]
+
+
+def recompress(batch_size: int = 200, pause: float = 0.05, codec: Optional[str] = None) -> int:
+    """
+    Rewrite stored values that are plain or use another codec, in id order,
+    committing each batch so the app keeps running alongside
+
+    Returns the number of values rewritten.
+    """
+    from database import engine
+
+    codec = codec or default_codec()
+    marker = ZSTD_MARKER if codec == "zstd" else ZLIB_MARKER
+    rewritten = 0
+    for table, column in _compressed_columns():
+        # Read and write the stored form, bypassing the column type
+        raw = type_coerce(column, Text)
+        last_id = 0
+        while True:
+            with engine.begin() as connection:
+                rows = connection.execute(
+                    select(table.c.id, raw.label("stored")).where(
+                        table.c.id > last_id
+                    ).order_by(table.c.id).limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                changes = []
+                for row in rows:
+                    if row.stored is None or row.stored.startswith(marker):
+                        continue
+                    stored = compress_text(decompress_text(row.stored), codec)
+                    if stored != row.stored:
+                        changes.append({"row_id": row.id, "stored": stored})
+                if changes:
+                    connection.execute(
+                        update(table).where(table.c.id == bindparam("row_id")).values(
+                            {column.name: type_coerce(bindparam("stored"), Text)}
+                        ),
+                        changes
+                    )
+                    rewritten += len(changes)
+            print(f"  ... {table.name}.{column.name} up to id {last_id}: {rewritten} rewritten")
+            time.sleep(pause)
+    return rewritten
+
+
+def storage_stats() -> dict:
+    """Stored and original sizes in bytes of each compressed column"""
+    from database import engine
+
+    stats = {}
+    with engine.connect() as connection:
+        for table, column in _compressed_columns():
+            stored_bytes = original_bytes = 0
+            for (stored,) in connection.execute(select(type_coerce(column, Text))).yield_per(500):
+                if stored is not None:
+                    stored_bytes += len(stored.encode("utf-8"))
+                    original_bytes += len(decompress_text(stored).encode("utf-8"))
+            stats[f"{table.name}.{column.name}"] = {"stored": stored_bytes, "original": original_bytes}
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain compressed text columns")
+    parser.add_argument("--recompress", action="store_true", help="Compress existing rows with the current codec")
+    parser.add_argument("--vacuum", action="store_true", help="Rebuild the SQLite file afterwards to return freed pages")
+    parser.add_argument("--stats", action="store_true", help="Show stored vs. original sizes")
+    parser.add_argument("--batch", type=int, default=200)
+    args = parser.parse_args()
+
+    if not (args.recompress or args.stats):
+        parser.print_help()
+        return
+
+    if args.recompress:
+        print(f"Recompressing with {default_codec()}...")
+        print(f"✅ Rewrote {recompress(args.batch)} values")
+        if args.vacuum:
+            from database import engine
+            if engine.dialect.name == "sqlite":
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                    connection.exec_driver_sql("VACUUM")
+                print("✓ Vacuumed database file")
+
+    if args.stats:
+        for name, sizes in storage_stats().items():
+            ratio = sizes["original"] / sizes["stored"] if sizes["stored"] else 0
+            print(f"{name}: {sizes['stored'] / 1024 / 1024:.1f} MB stored, "
+                  f"{sizes['original'] / 1024 / 1024:.1f} MB original ({ratio:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,16 @@ load_dotenv()
 
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./oxford_papers.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# SQLite Performance Profile (WAL, relaxed fsync, lock waits, mmap and page cache per connection)
+SQLITE_PERFORMANCE_PROFILE = os.getenv("SQLITE_PERFORMANCE_PROFILE", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "16"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_OPTIMIZE_MINUTES = int(os.getenv("SQLITE_OPTIMIZE_MINUTES", "60"))
 
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -14,3 +24,63 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))
+
+# Document Processing Configuration
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "./document_cache")
+DOCUMENT_PROMPT_CHARS = int(os.getenv("DOCUMENT_PROMPT_CHARS", "10000"))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "4"))
+MAX_DOCUMENT_FILES = int(os.getenv("MAX_DOCUMENT_FILES", "20"))
+MAX_DOCUMENT_UPLOAD_MB = int(os.getenv("MAX_DOCUMENT_UPLOAD_MB", "50"))
+# DOCX text is zipped, so a small upload can expand to hundreds of MB of text
+MAX_DOCX_TEXT_CHARS = int(os.getenv("MAX_DOCX_TEXT_CHARS", "5000000"))
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", "./document_store")
+RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", "./retrieval_index")
+PAPER_SEARCH_DIR = os.getenv("PAPER_SEARCH_DIR", "./paper_search")
+MINHASH_INDEX_PATH = os.getenv("MINHASH_INDEX_PATH", "./question_index/minhash.db")
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.6"))
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./question_index/vectors.db")
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))
+
+# Media Processing Configuration
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+FFPROBE_PATH = os.getenv("FFPROBE_PATH", "ffprobe")
+MAX_MEDIA_MINUTES = int(os.getenv("MAX_MEDIA_MINUTES", "180"))
+MAX_MEDIA_UPLOAD_MB = int(os.getenv("MAX_MEDIA_UPLOAD_MB", "500"))
+MAX_TRANSCRIPT_CHARS = int(os.getenv("MAX_TRANSCRIPT_CHARS", "100000"))
+TRANSCRIPTION_SEGMENT_SECONDS = int(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", "600"))
+TRANSCRIPTION_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_OVERLAP_SECONDS", "3"))
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "4"))
+MEDIA_TRIM_SILENCE = os.getenv("MEDIA_TRIM_SILENCE", "false").lower() == "true"
+TRIM_SILENCE_MIN_SECONDS = float(os.getenv("TRIM_SILENCE_MIN_SECONDS", "1.0"))
+TRIM_SILENCE_PADDING_SECONDS = float(os.getenv("TRIM_SILENCE_PADDING_SECONDS", "0.25"))
+TRANSCRIPT_CACHE_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_ENTRIES", "500"))
+
+# Background Job Configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", "./job_spool")
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = int(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "15"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "3600"))
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "60"))
+
+# Column Compression Configuration (Paper.questions, Evaluation answers and feedback)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_CODEC = os.getenv("COMPRESSION_CODEC", "auto")  # auto, zstd or zlib
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "256"))
+ZLIB_LEVEL = int(os.getenv("ZLIB_LEVEL", "6"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "9"))
+
+# Archival Configuration (old papers and evaluations move to archive tables)
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "200"))
+ARCHIVE_INTERVAL_MINUTES = int(os.getenv("ARCHIVE_INTERVAL_MINUTES", "60"))
+
+# List Endpoint Configuration
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "200"))
+
+# Progress Chart Configuration (points per series from /api/progress/timeseries)
+PROGRESS_POINTS = int(os.getenv("PROGRESS_POINTS", "120"))
+PROGRESS_MAX_POINTS = int(os.getenv("PROGRESS_MAX_POINTS", "1000"))
@@ -1,22 +1,107 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, ForeignKey
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, Boolean, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from datetime import datetime
+import time
 import config
+from compression import compress_text, decompress_text
 
 DATABASE_URL = config.DATABASE_URL
 
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# SQLite in WAL mode serves many readers alongside one writer, so a pool of
+# connections lets reads run while a commit waits its turn (busy_timeout)
+POOL_ARGS = {
+    "pool_size": config.DB_POOL_SIZE,
+    "max_overflow": config.DB_MAX_OVERFLOW,
+    "pool_timeout": config.DB_POOL_TIMEOUT
+} if ":memory:" not in DATABASE_URL else {}
+
+SQLITE_PRAGMAS = (
+    "journal_mode = WAL",
+    "synchronous = NORMAL",
+    f"busy_timeout = {config.SQLITE_BUSY_TIMEOUT_MS}",
+    f"cache_size = -{config.SQLITE_CACHE_SIZE_MB * 1024}",
+    f"mmap_size = {config.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+    "temp_store = MEMORY",
+    "optimize = 0x10002"
+)
+
 # Create engine with appropriate settings for SQLite or PostgreSQL
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+if IS_SQLITE:
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False}, **POOL_ARGS)
 else:
     # PostgreSQL or other databases
-    engine = create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, **POOL_ARGS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async drivers for the same database, used by the API endpoints
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL rewritten for its async driver (aiosqlite or asyncpg)"""
+    scheme, _, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+# aiosqlite defaults to a new connection (and thread) per checkout; pool them like the sync engine
+async_engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    **({"poolclass": AsyncAdaptedQueuePool, **POOL_ARGS} if POOL_ARGS else {})
+)
+
+# Objects stay readable after commit, as endpoints build responses from them
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def _apply_sqlite_profile(dbapi_connection, connection_record):
+    """Set the SQLite performance pragmas on a new connection"""
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+    connection_record.info["optimized_at"] = time.monotonic()
+
+
+def _optimize_periodically(dbapi_connection, connection_record, connection_proxy):
+    """Refresh the query planner's statistics on long-lived pooled connections"""
+    if time.monotonic() - connection_record.info.get("optimized_at", 0) < config.SQLITE_OPTIMIZE_MINUTES * 60:
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA optimize")
+    cursor.close()
+    connection_record.info["optimized_at"] = time.monotonic()
+
+
+if IS_SQLITE and config.SQLITE_PERFORMANCE_PROFILE:
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "connect", _apply_sqlite_profile)
+        event.listen(sync_engine, "checkout", _optimize_periodically)
+
 Base = declarative_base()
 
 
+class CompressedText(TypeDecorator):
+    """Text compressed on write and decompressed on read (see compression.py)"""
+    
+    impl = Text
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or not config.COMPRESSION_ENABLED:
+            return value
+        return compress_text(value)
+    
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -30,10 +115,13 @@ class User(Base):
     # Relationships
     papers = relationship("Paper", back_populates="user")
     evaluations = relationship("Evaluation", back_populates="user")
+    documents = relationship("Document", back_populates="user")
 
 
 class Paper(Base):
     __tablename__ = "papers"
+    # AUTOINCREMENT: SQLite must never hand out the ID of an archived paper again
+    __table_args__ = (Index("ix_papers_user_created", "user_id", "created_at", "id"), {"sqlite_autoincrement": True})
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -42,26 +130,35 @@ class Paper(Base):
     chapter = Column(String(200), nullable=True)
     topic = Column(String(200), nullable=True)
     document_name = Column(String(500), nullable=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    media_hash = Column(String(64), nullable=True, index=True)  # Source recording of media papers
     paper_type = Column(String(50), default="curriculum")
-    questions = Column(Text, nullable=False)
+    questions = Column(CompressedText, nullable=True)  # JSON, compressed; only papers saved before question rows
     total_marks = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="papers")
     evaluations = relationship("Evaluation", back_populates="paper")
+    document = relationship("Document", back_populates="papers")
+    question_rows = relationship(
+        "PaperQuestion", back_populates="paper", order_by="PaperQuestion.number", cascade="all, delete-orphan"
+    )
 
 
 class Evaluation(Base):
     __tablename__ = "evaluations"
+    __table_args__ = (
+        Index("ix_evaluations_user_evaluated", "user_id", "evaluated_at", "id"), {"sqlite_autoincrement": True}
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     paper_id = Column(Integer, ForeignKey("papers.id"), nullable=False)
-    student_answers = Column(Text, nullable=False)
+    student_answers = Column(CompressedText, nullable=False)  # JSON, compressed
     score = Column(Float, nullable=False)
     total_marks = Column(Integer, nullable=False)
-    feedback = Column(Text, nullable=False)
+    feedback = Column(CompressedText, nullable=False)  # JSON, compressed
     evaluated_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -69,6 +166,186 @@ class Evaluation(Base):
     paper = relationship("Paper", back_populates="evaluations")
 
 
+class PaperQuestion(Base):
+    __tablename__ = "questions"
+    __table_args__ = (Index("ix_questions_paper_number", "paper_id", "number"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    paper_id = Column(Integer, ForeignKey("papers.id"), nullable=False)
+    number = Column(Integer, nullable=False)
+    question_type = Column(String(50), nullable=False, index=True)  # MCQ, Short Answer, Long Answer
+    marks = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    options = Column(Text, nullable=True)  # JSON list for MCQs
+    answer = Column(Text, nullable=True)  # Correct or expected answer
+    bank_question_id = Column(Integer, ForeignKey("question_bank.id"), nullable=True, index=True)
+    
+    # Relationships
+    paper = relationship("Paper", back_populates="question_rows")
+
+
+class BankQuestion(Base):
+    __tablename__ = "question_bank"
+    # AUTOINCREMENT: the vector index loads rows by ascending ID, so IDs must never be reused
+    __table_args__ = (
+        Index("ix_question_bank_lookup", "grade", "subject", "chapter", "question_type", "marks"),
+        {"sqlite_autoincrement": True}
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, nullable=False)  # SHA-256 of the tags and normalized question
+    grade = Column(String(50), nullable=False)  # Tags are stored lowercased with collapsed whitespace
+    subject = Column(String(100), nullable=False)
+    chapter = Column(String(200), nullable=False)
+    topic = Column(String(200), nullable=False, default="")
+    question_type = Column(String(50), nullable=False)
+    marks = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    options = Column(Text, nullable=True)  # JSON list for MCQs
+    answer = Column(Text, nullable=True)
+    use_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Document(Base):
+    __tablename__ = "documents"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    filename = Column(String(500), nullable=False)
+    subject = Column(String(100), nullable=True, index=True)
+    text_hash = Column(String(64), nullable=False, index=True)  # Key of the compressed text blob
+    char_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    user = relationship("User", back_populates="documents")
+    papers = relationship("Paper", back_populates="document")
+
+
+class MediaTranscript(Base):
+    __tablename__ = "media_transcripts"
+    __table_args__ = (UniqueConstraint("media_hash", "trimmed", name="uq_media_transcripts_hash_trimmed"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    media_hash = Column(String(64), nullable=False, index=True)  # SHA-256 of the uploaded recording
+    trimmed = Column(Boolean, nullable=False, default=False)  # Transcribed with silence trimmed
+    media_type = Column(String(20), nullable=True)
+    transcript = Column(Text, nullable=False)
+    media_stats = Column(Text, nullable=True)  # JSON string
+    char_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False)  # 'generate_paper', 'document_paper', 'media_paper', 'evaluate_paper'
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, succeeded, failed
+    payload = Column(Text, nullable=False)  # JSON string
+    result = Column(Text, nullable=True)  # JSON string of the API response
+    error = Column(Text, nullable=True)
+    stage = Column(String(50), nullable=True)
+    progress = Column(Text, nullable=True)  # JSON list of stages with timings
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, default=datetime.utcnow, index=True)
+    locked_by = Column(String(100), nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    paper_count = Column(Integer, nullable=False, default=0)
+    evaluation_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    total_marks_sum = Column(Float, nullable=False, default=0.0)
+    percentage_sum = Column(Float, nullable=False, default=0.0)
+
+
+class UserSubjectStats(Base):
+    __tablename__ = "user_subject_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    subject = Column(String(100), primary_key=True)
+    evaluation_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    total_marks_sum = Column(Float, nullable=False, default=0.0)
+    percentage_sum = Column(Float, nullable=False, default=0.0)
+
+
+class UserGradeCount(Base):
+    __tablename__ = "user_grade_counts"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    grade = Column(String(5), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class UserDailyStats(Base):
+    __tablename__ = "user_daily_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC date of the evaluations
+    subject = Column(String(100), primary_key=True)  # Empty for papers without a subject
+    evaluation_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)
+    total_marks_sum = Column(Float, nullable=False, default=0.0)
+    percentage_sum = Column(Float, nullable=False, default=0.0)
+
+
+class ArchivedPaper(Base):
+    __tablename__ = "archived_papers"
+    __table_args__ = (Index("ix_archived_papers_user_created", "user_id", "created_at", "id"),)
+    
+    id = Column(Integer, primary_key=True)  # Same ID the paper had in papers
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    grade = Column(String(50), nullable=True)
+    subject = Column(String(100), nullable=True)
+    chapter = Column(String(200), nullable=True)
+    topic = Column(String(200), nullable=True)
+    document_name = Column(String(500), nullable=True)
+    document_id = Column(Integer, nullable=True)
+    media_hash = Column(String(64), nullable=True)
+    paper_type = Column(String(50), nullable=True)
+    questions = Column(CompressedText, nullable=False)  # JSON of the question rows, compressed
+    total_marks = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedEvaluation(Base):
+    __tablename__ = "archived_evaluations"
+    __table_args__ = (Index("ix_archived_evaluations_user_evaluated", "user_id", "evaluated_at", "id"),)
+    
+    id = Column(Integer, primary_key=True)  # Same ID the evaluation had in evaluations
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    paper_id = Column(Integer, nullable=False, index=True)  # Live or archived paper
+    subject = Column(String(100), nullable=True)  # The paper's, for rebuilding stats rollups
+    student_answers = Column(CompressedText, nullable=False)  # JSON, compressed
+    score = Column(Float, nullable=False)
+    total_marks = Column(Integer, nullable=False)
+    feedback = Column(CompressedText, nullable=False)  # JSON, compressed
+    evaluated_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivedSeenQuestion(Base):
+    __tablename__ = "archived_seen_questions"
+    
+    # Bank questions the user had in archived papers, so they are not drawn again
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bank_question_id = Column(Integer, ForeignKey("question_bank.id"), primary_key=True)
+
+
 # Create tables
 Base.metadata.create_all(bind=engine)
 
@@ -79,3 +356,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
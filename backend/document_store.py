@@ -0,0 +1,97 @@
+"""
+Document Library Storage
+Content-addressed, compressed storage of extracted document text so papers can
+be regenerated from a user's library without re-uploading
+"""
+import os
+import zlib
+import hashlib
+from typing import Optional
+from sqlalchemy.orm import Session
+from database import Document
+import retrieval_index
+import config
+
+STORE_DIR = config.DOCUMENT_STORE_DIR
+
+
+def _blob_path(text_hash: str) -> str:
+    """Blobs are sharded by the first two hex digits of their hash"""
+    return os.path.join(STORE_DIR, text_hash[:2], f"{text_hash}.zz")
+
+
+def save_text(text: str) -> str:
+    """
+    Store text as a zlib-compressed blob named by its SHA-256 and return the hash
+
+    Identical text is stored only once, however many users or papers use it.
+    """
+    data = text.encode("utf-8")
+    text_hash = hashlib.sha256(data).hexdigest()
+    path = _blob_path(text_hash)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(data, 6))
+        os.replace(tmp_path, path)
+
+    return text_hash
+
+
+def load_text(text_hash: str) -> str:
+    """Load a stored text blob by its hash"""
+    with open(_blob_path(text_hash), "rb") as f:
+        return zlib.decompress(f.read()).decode("utf-8")
+
+
+def add_to_library(db: Session, user_id: int, filename: str, text: str, subject: Optional[str] = None) -> Document:
+    """
+    Store extracted text and add it to the user's library and retrieval index
+
+    Re-adding the same text returns the existing library entry. The entry is
+    committed straight away so it survives a failed generation and its ID is
+    never reused by the retrieval index.
+    """
+    text_hash = save_text(text)
+
+    document = db.query(Document).filter(
+        Document.user_id == user_id,
+        Document.text_hash == text_hash
+    ).first()
+    if document:
+        if subject and not document.subject:
+            document.subject = subject
+            db.commit()
+        return document
+
+    document = Document(
+        user_id=user_id,
+        filename=filename[:500],
+        subject=subject,
+        text_hash=text_hash,
+        char_count=len(text)
+    )
+    db.add(document)
+    db.commit()
+    db.refresh(document)
+
+    try:
+        retrieval_index.add_document(user_id, document.id, text)
+    except Exception as e:
+        # Documents missing from the index are picked up by ensure_library_indexed
+        print(f"WARNING: Could not index document {document.id}: {str(e)}")
+    return document
+
+
+def ensure_library_indexed(db: Session, user_id: int) -> int:
+    """Index any of the user's library documents that are not in the retrieval index yet"""
+    indexed = retrieval_index.indexed_document_ids(user_id)
+    query = db.query(Document.id, Document.text_hash).filter(Document.user_id == user_id)
+    if indexed:
+        query = query.filter(Document.id.notin_(indexed))
+    missing = query.all()
+    for document_id, text_hash in missing:
+        retrieval_index.add_document(user_id, document_id, load_text(text_hash))
+    return len(missing)
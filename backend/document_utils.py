@@ -1,41 +1,236 @@
 import PyPDF2
-from docx import Document
 import io
+import asyncio
+import os
+import json
+import hashlib
+import zipfile
+from lxml import etree
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Iterator, Tuple
 from fastapi import UploadFile, HTTPException
+import config
+from text_normalizer import PAGE_BREAK, normalize_text
 
+SUPPORTED_DOCUMENT_FORMATS = ('.pdf', '.docx', '.txt')
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+_extraction_executor = None
 
-async def extract_text_from_file(file: UploadFile) -> str:
+# Page/outline indexes of recently seen PDFs, keyed by content hash
+PAGE_INDEX_DIR = os.path.join(config.DOCUMENT_CACHE_DIR, "page_index")
+MAX_CACHED_INDEXES = 32
+_page_indexes = OrderedDict()
+
+# WordprocessingML tags used by the streaming DOCX extractor
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = W_NS + "body"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+W_TBL = W_NS + "tbl"
+W_TR = W_NS + "tr"
+W_TC = W_NS + "tc"
+DOCX_TAGS = (W_BODY, W_P, W_T, W_TAB, W_BR, W_CR, W_TBL, W_TR, W_TC)
+
+
+async def extract_text_from_file(
+    file: UploadFile,
+    page_range: Optional[str] = None,
+    sections: Optional[str] = None
+) -> str:
     """
     Extract text content from uploaded file (PDF, DOCX, TXT)
+    
+    For PDFs, page_range (e.g. "40-55" or "1-3,7") and sections (comma-separated
+    outline headings) restrict extraction to the requested pages only.
     """
     try:
         content = await file.read()
-        filename = file.filename.lower()
-        
-        if filename.endswith('.pdf'):
-            return extract_text_from_pdf(content)
-        elif filename.endswith('.docx'):
-            return extract_text_from_docx(content)
-        elif filename.endswith('.txt'):
-            return content.decode('utf-8')
-        else:
-            raise HTTPException(
-                status_code=400, 
-                detail="Unsupported file format. Please upload PDF, DOCX, or TXT file."
-            )
+        return extract_text_from_bytes(file.filename, content, page_range, sections)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
 
 
-def extract_text_from_pdf(content: bytes) -> str:
-    """Extract text from PDF file"""
+def extract_text_from_bytes(
+    filename: str,
+    content: bytes,
+    page_range: Optional[str] = None,
+    sections: Optional[str] = None
+) -> str:
+    """Extract text from the raw bytes of a PDF, DOCX or TXT file"""
+    filename = filename.lower()
+    
+    if (page_range or sections) and not filename.endswith('.pdf'):
+        raise HTTPException(
+            status_code=400,
+            detail="Page ranges and sections are only supported for PDF documents."
+        )
+    
+    if filename.endswith('.pdf'):
+        pages = None
+        if page_range or sections:
+            pages = select_pdf_pages(content, page_range, sections)
+        return extract_text_from_pdf(content, pages)
+    elif filename.endswith('.docx'):
+        return extract_text_from_docx(content)
+    elif filename.endswith('.txt'):
+        return content.decode('utf-8')
+    else:
+        raise HTTPException(
+            status_code=400, 
+            detail="Unsupported file format. Please upload PDF, DOCX, or TXT file."
+        )
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> Tuple[bytes, str]:
+    """Read an upload in chunks, enforcing a size limit and hashing as it goes"""
+    digest = hashlib.sha256()
+    content = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        content.extend(chunk)
+        digest.update(chunk)
+        if len(content) > max_bytes:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{file.filename} is too large. Maximum size is {max_bytes // (1024 * 1024)}MB."
+            )
+    return bytes(content), digest.hexdigest()
+
+
+def expand_zip_archive(
+    filename: str,
+    content: bytes,
+    max_bytes: int,
+    max_files: Optional[int] = None
+) -> List[Tuple[str, bytes, str]]:
+    """
+    List the supported documents inside a zip archive as (name, bytes, sha256) triples
+    
+    Members are read in chunks so a compressed archive cannot expand past
+    max_bytes, and reading stops as soon as there are more than max_files.
+    """
+    documents = []
+    total = 0
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            for info in archive.infolist():
+                name = os.path.basename(info.filename)
+                if info.is_dir() or name.startswith(".") or not name.lower().endswith(SUPPORTED_DOCUMENT_FORMATS):
+                    continue
+                if max_files is not None and len(documents) >= max_files:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Too many documents in {filename}. Maximum is {config.MAX_DOCUMENT_FILES} in total."
+                    )
+                
+                data = bytearray()
+                digest = hashlib.sha256()
+                with archive.open(info) as member:
+                    while True:
+                        chunk = member.read(UPLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        data.extend(chunk)
+                        digest.update(chunk)
+                        total += len(chunk)
+                        if total > max_bytes:
+                            raise HTTPException(
+                                status_code=400,
+                                detail=f"{filename} expands to more than {max_bytes // (1024 * 1024)}MB."
+                            )
+                documents.append((name, bytes(data), digest.hexdigest()))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"{filename} is not a valid zip archive.")
+    
+    if not documents:
+        raise HTTPException(status_code=400, detail=f"{filename} contains no PDF, DOCX, or TXT files.")
+    return documents
+
+
+def extract_and_normalize(filename: str, content: bytes) -> Tuple[str, dict]:
+    """Extraction worker task: extract one document and normalize its text"""
     try:
-        pdf_file = io.BytesIO(content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        return normalize_text(extract_text_from_bytes(filename, content))
+    except HTTPException as e:
+        # HTTPException does not survive the trip back from a worker process
+        raise ValueError(e.detail)
+
+
+def get_extraction_executor() -> ProcessPoolExecutor:
+    """Process pool that runs document extraction off the event loop, in parallel"""
+    global _extraction_executor
+    if _extraction_executor is None:
+        _extraction_executor = ProcessPoolExecutor(max_workers=config.EXTRACTION_WORKERS)
+    return _extraction_executor
+
+
+async def extract_documents_parallel(documents: List[Tuple[str, bytes]]) -> List[Tuple[str, str, dict]]:
+    """Extract and normalize several documents in parallel through the extraction workers"""
+    loop = asyncio.get_running_loop()
+    executor = get_extraction_executor()
+    tasks = [loop.run_in_executor(executor, extract_and_normalize, name, content) for name, content in documents]
+    
+    results = []
+    for (name, _), outcome in zip(documents, await asyncio.gather(*tasks, return_exceptions=True)):
+        if isinstance(outcome, Exception):
+            raise HTTPException(status_code=400, detail=f"Error reading {name}: {str(outcome)}")
+        text, stats = outcome
+        results.append((name, text, stats))
+    return results
+
+
+def combine_documents(documents: List[Tuple[str, str]], budget: int) -> str:
+    """
+    Combine several documents into one prompt text within a character budget
+    
+    Short documents are kept whole and the remaining budget is shared evenly
+    between the longer ones, so every document is represented.
+    """
+    headers = [f"=== {name} ===\n" for name, _ in documents]
+    allowances = {}
+    remaining = budget - sum(len(header) + 2 for header in headers)
+    pending = sorted(range(len(documents)), key=lambda i: len(documents[i][1]))
+    while pending:
+        share = remaining // len(pending)
+        i = pending.pop(0)
+        allowances[i] = min(len(documents[i][1]), share)
+        remaining -= allowances[i]
+    
+    parts = []
+    for i, (_, text) in enumerate(documents):
+        parts.append(headers[i] + text[:max(allowances[i], 0)].strip())
+    return "\n\n".join(parts)
+
+
+def extract_text_from_pdf(content: bytes, pages: Optional[List[int]] = None) -> str:
+    """
+    Extract text from PDF file
+    
+    Only the requested 1-based pages are extracted (all pages if None). Page text
+    is cached in the document's page index, so repeat requests skip parsing.
+    """
+    try:
+        index = get_pdf_page_index(content)
+        if pages is None:
+            pages = list(range(1, index["num_pages"] + 1))
+        
+        missing = [p for p in pages if str(p) not in index["pages"]]
+        if missing:
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+            for page_number in missing:
+                index["pages"][str(page_number)] = pdf_reader.pages[page_number - 1].extract_text() or ""
+            _save_page_index(index)
         
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+        # Pages are separated with a form feed for the normalization stage
+        text = PAGE_BREAK.join(index["pages"][str(page_number)] for page_number in pages)
         
         if not text.strip():
             raise Exception("No text could be extracted from the PDF")
@@ -45,24 +240,239 @@ def extract_text_from_pdf(content: bytes) -> str:
         raise Exception(f"Error extracting PDF text: {str(e)}")
 
 
-def extract_text_from_docx(content: bytes) -> str:
-    """Extract text from DOCX file"""
+def get_pdf_page_index(content: bytes) -> dict:
+    """
+    Get the page count, outline and cached page text for a PDF
+    
+    Indexes are keyed by a hash of the file content and kept in memory and on
+    disk. The PDF is only opened when no index exists yet.
+    """
+    key = hashlib.sha256(content).hexdigest()
+    
+    if key in _page_indexes:
+        _page_indexes.move_to_end(key)
+        return _page_indexes[key]
+    
+    index = None
+    index_path = os.path.join(PAGE_INDEX_DIR, f"{key}.json")
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+    
+    if index is None:
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+        index = {
+            "key": key,
+            "num_pages": len(pdf_reader.pages),
+            "outline": _read_pdf_outline(pdf_reader),
+            "pages": {}
+        }
+        _save_page_index(index)
+    
+    _page_indexes[key] = index
+    if len(_page_indexes) > MAX_CACHED_INDEXES:
+        _page_indexes.popitem(last=False)
+    return index
+
+
+def _read_pdf_outline(pdf_reader, outline=None, level: int = 0) -> list:
+    """Flatten the PDF outline (bookmarks) into a list of headings with 1-based pages"""
+    if outline is None:
+        try:
+            outline = pdf_reader.outline
+        except Exception:
+            return []
+    
+    entries = []
+    for item in outline:
+        if isinstance(item, list):
+            entries.extend(_read_pdf_outline(pdf_reader, item, level + 1))
+            continue
+        try:
+            page_number = pdf_reader.get_destination_page_number(item) + 1
+        except Exception:
+            continue
+        entries.append({"title": str(item.title).strip(), "page": page_number, "level": level})
+    return entries
+
+
+def _save_page_index(index: dict):
+    """Persist a page index so later requests on the same file skip parsing"""
     try:
-        docx_file = io.BytesIO(content)
-        doc = Document(docx_file)
+        os.makedirs(PAGE_INDEX_DIR, exist_ok=True)
+        tmp_path = os.path.join(PAGE_INDEX_DIR, f"{index['key']}.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(PAGE_INDEX_DIR, f"{index['key']}.json"))
+    except OSError as e:
+        print(f"WARNING: Could not save PDF page index: {str(e)}")
+
+
+def select_pdf_pages(content: bytes, page_range: Optional[str] = None, sections: Optional[str] = None) -> List[int]:
+    """Resolve a page range and/or section headings to a sorted list of 1-based pages"""
+    index = get_pdf_page_index(content)
+    num_pages = index["num_pages"]
+    
+    pages = set()
+    if page_range:
+        pages.update(parse_page_range(page_range, num_pages))
+    if sections:
+        headings = [s.strip() for s in sections.split(",") if s.strip()]
+        pages.update(resolve_section_pages(index["outline"], headings, num_pages))
+    
+    if not pages:
+        raise HTTPException(status_code=400, detail="No pages selected from the document.")
+    return sorted(pages)
+
+
+def parse_page_range(page_range: str, num_pages: int) -> List[int]:
+    """
+    Parse a page range like "40-55" or "1-3,7,10-12" into 1-based page numbers
+    """
+    pages = []
+    for part in page_range.replace(" ", "").split(","):
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start = int(start_str) if start_str else 1
+                end = int(end_str) if end_str else num_pages
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid page range: '{part}'")
         
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
+        if start < 1 or end < start or end > num_pages:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Page range '{part}' is out of bounds. The document has {num_pages} pages."
+            )
+        pages.extend(range(start, end + 1))
+    return pages
+
+
+def resolve_section_pages(outline: list, headings: List[str], num_pages: int) -> List[int]:
+    """
+    Map section headings to the pages they span using the PDF outline
+    
+    A section runs from its heading's page up to the page before the next
+    heading at the same or a higher level.
+    """
+    if not outline:
+        raise HTTPException(
+            status_code=400,
+            detail="This PDF has no outline (bookmarks), so sections cannot be selected. Use a page range instead."
+        )
+    
+    pages = []
+    for heading in headings:
+        matches = [i for i, entry in enumerate(outline) if heading.lower() in entry["title"].lower()]
+        if not matches:
+            raise HTTPException(status_code=400, detail=f"Section '{heading}' not found in the document outline.")
+        
+        for i in matches:
+            entry = outline[i]
+            end = num_pages
+            for following in outline[i + 1:]:
+                if following["level"] <= entry["level"]:
+                    end = max(entry["page"], following["page"] - 1)
+                    break
+            pages.extend(range(entry["page"], end + 1))
+    return pages
+
+
+def extract_text_from_docx(content: bytes, max_chars: int = config.MAX_DOCX_TEXT_CHARS) -> str:
+    """
+    Extract text from DOCX file, including table cells, in document order
+    
+    Blocks are written to one buffer as they are parsed, and parsing stops as
+    soon as the text passes max_chars.
+    """
+    try:
+        buffer = io.StringIO()
+        for block in iter_docx_blocks(io.BytesIO(content)):
+            if buffer.tell():
+                buffer.write("\n")
+            buffer.write(block)
+            if buffer.tell() > max_chars:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Document is too long. Maximum {max_chars} characters can be extracted from a DOCX."
+                )
+        text = buffer.getvalue()
         
         if not text.strip():
             raise Exception("No text could be extracted from the DOCX")
         
         return text.strip()
+    except HTTPException:
+        raise
     except Exception as e:
         raise Exception(f"Error extracting DOCX text: {str(e)}")
 
 
+def iter_docx_blocks(docx_file) -> Iterator[str]:
+    """
+    Stream paragraphs and table rows out of a DOCX in document order
+    
+    word/document.xml is read straight from the zip with an incremental parser,
+    so no object model is built. Table rows are emitted as their cells joined
+    with " | "; nested tables are folded into the enclosing cell.
+    """
+    with zipfile.ZipFile(docx_file) as archive:
+        with archive.open("word/document.xml") as xml_stream:
+            body = None
+            paragraph = []
+            rows = []   # cell texts of each open table row
+            cells = []  # paragraph texts of each open table cell
+            
+            for event, elem in etree.iterparse(xml_stream, events=("start", "end"), tag=DOCX_TAGS, huge_tree=True):
+                tag = elem.tag
+                
+                if event == "start":
+                    if tag == W_BODY:
+                        body = elem
+                    elif tag == W_TR:
+                        rows.append([])
+                    elif tag == W_TC:
+                        cells.append([])
+                    continue
+                
+                if tag == W_T:
+                    paragraph.append(elem.text or "")
+                elif tag == W_TAB:
+                    paragraph.append("\t")
+                elif tag in (W_BR, W_CR):
+                    paragraph.append("\n")
+                elif tag == W_P:
+                    line = "".join(paragraph).strip()
+                    paragraph = []
+                    if cells:
+                        cells[-1].append(line)
+                    elif line:
+                        yield line
+                elif tag == W_TC:
+                    cell_text = " ".join(p for p in cells.pop() if p)
+                    if rows:
+                        rows[-1].append(cell_text)
+                elif tag == W_TR:
+                    row_cells = rows.pop()
+                    line = " | ".join(c for c in row_cells if c)
+                    if cells:
+                        cells[-1].append(line)
+                    elif line:
+                        yield line
+                
+                # Drop finished elements and top-level blocks so memory stays flat
+                elem.clear()
+                if body is not None and not cells and tag in (W_P, W_TBL):
+                    body.clear()
+
+
 def validate_document_length(text: str, max_chars: int = 15000) -> bool:
     """
     Validate that document is not too long for processing
@@ -0,0 +1,271 @@
+"""
+History Export
+Streams all of a user's papers or evaluations, archived ones included, as
+NDJSON, CSV or Parquet. Rows are read with yield_per (a server-side cursor on
+PostgreSQL) and encoded a batch at a time, so memory stays flat however long
+the history is.
+
+Usage:
+    python export.py --user 42 --kind evaluations --format csv > evaluations.csv
+    python export.py --user 42 --kind papers --format parquet --details -o papers.parquet
+"""
+import io
+import csv
+import sys
+import json
+import argparse
+import itertools
+from collections import defaultdict
+from typing import Iterator, List, Tuple
+from sqlalchemy.orm import Session
+from database import Paper, Evaluation, ArchivedPaper, ArchivedEvaluation, PaperQuestion
+from question_store import question_dict
+from user_stats import percentage_of
+from question_bank import without_bank_ids
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+KINDS = ("papers", "evaluations")
+
+# format: (media type, file extension)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet")
+}
+
+# Columns and their types; JSON columns only with details, as JSON text in CSV and Parquet
+COLUMNS = {
+    "papers": [
+        ("id", "int"), ("created_at", "datetime"), ("grade", "str"), ("subject", "str"), ("chapter", "str"),
+        ("topic", "str"), ("document_name", "str"), ("paper_type", "str"), ("total_marks", "int"),
+        ("archived", "bool")
+    ],
+    "evaluations": [
+        ("id", "int"), ("evaluated_at", "datetime"), ("paper_id", "int"), ("subject", "str"), ("score", "float"),
+        ("total_marks", "int"), ("percentage", "float"), ("grade", "str"), ("archived", "bool")
+    ]
+}
+DETAIL_COLUMNS = {
+    "papers": [("questions", "json")],
+    "evaluations": [("student_answers", "json"), ("feedback", "json")]
+}
+
+BATCH_ROWS = 1000
+PARQUET_ROW_GROUP_ROWS = 10000
+PARQUET_ROW_GROUP_BYTES = 8 * 1024 * 1024
+
+
+def columns(kind: str, details: bool = False) -> List[Tuple[str, str]]:
+    """(name, type) of each exported column"""
+    return COLUMNS[kind] + (DETAIL_COLUMNS[kind] if details else [])
+
+
+def _paper_rows(db: Session, user_id: int, details: bool) -> Iterator[dict]:
+    for table, archived in ((ArchivedPaper, True), (Paper, False)):
+        selected = [getattr(table, name) for name, _ in columns("papers", details) if name != "archived"]
+        query = db.query(*selected).filter(table.user_id == user_id).order_by(table.created_at, table.id)
+        papers = (dict(row._mapping, archived=archived) for row in query.yield_per(BATCH_ROWS))
+        for batch in _batches(papers, BATCH_ROWS):
+            if details:
+                _add_question_json(db, batch)
+            yield from batch
+
+
+def _add_question_json(db: Session, papers: List[dict]) -> None:
+    """Fill in the questions JSON of a batch of papers, reading question rows for papers without a blob"""
+    missing = [paper["id"] for paper in papers if paper["questions"] is None]
+    rows = defaultdict(list)
+    if missing:
+        query = db.query(PaperQuestion).filter(PaperQuestion.paper_id.in_(missing)).order_by(
+            PaperQuestion.paper_id, PaperQuestion.number, PaperQuestion.id
+        )
+        for row in query:
+            rows[row.paper_id].append(question_dict(row))
+    for paper in papers:
+        if paper["questions"] is not None:
+            # Archived papers and papers saved before question rows carry them in the JSON
+            paper["questions"] = json.dumps(without_bank_ids(json.loads(paper["questions"])))
+        elif rows[paper["id"]]:
+            paper["questions"] = json.dumps(rows[paper["id"]])
+
+
+def _evaluation_rows(db: Session, user_id: int, details: bool) -> Iterator[dict]:
+    from paper_service import calculate_grade
+
+    detail_names = [name for name, _ in DETAIL_COLUMNS["evaluations"]] if details else []
+    archived_query = db.query(
+        ArchivedEvaluation.id, ArchivedEvaluation.evaluated_at, ArchivedEvaluation.paper_id, ArchivedEvaluation.subject,
+        ArchivedEvaluation.score, ArchivedEvaluation.total_marks,
+        *(getattr(ArchivedEvaluation, name) for name in detail_names)
+    ).filter(ArchivedEvaluation.user_id == user_id).order_by(ArchivedEvaluation.evaluated_at, ArchivedEvaluation.id)
+    live_query = db.query(
+        Evaluation.id, Evaluation.evaluated_at, Evaluation.paper_id, Paper.subject,
+        Evaluation.score, Evaluation.total_marks,
+        *(getattr(Evaluation, name) for name in detail_names)
+    ).outerjoin(Paper, Paper.id == Evaluation.paper_id).filter(
+        Evaluation.user_id == user_id
+    ).order_by(Evaluation.evaluated_at, Evaluation.id)
+
+    for query, archived in ((archived_query, True), (live_query, False)):
+        for row in query.yield_per(BATCH_ROWS):
+            percentage = percentage_of(row.score, row.total_marks)
+            yield dict(
+                row._mapping,
+                percentage=round(percentage, 2), grade=calculate_grade(percentage), archived=archived
+            )
+
+
+def export_rows(db: Session, user_id: int, kind: str, details: bool = False) -> Iterator[dict]:
+    """A user's papers or evaluations as dicts, archived first, then oldest first"""
+    if kind == "papers":
+        return _paper_rows(db, user_id, details)
+    return _evaluation_rows(db, user_id, details)
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _json_default(value):
+    return value.isoformat()
+
+
+def ndjson_chunks(rows: Iterator[dict], column_types: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """One JSON object per line; JSON columns are nested rather than quoted"""
+    json_names = [name for name, kind in column_types if kind == "json"]
+    for batch in _batches(rows, BATCH_ROWS):
+        lines = []
+        for row in batch:
+            for name in json_names:
+                if row[name] is not None:
+                    row[name] = json.loads(row[name])
+            lines.append(json.dumps(row, default=_json_default, ensure_ascii=False))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def csv_chunks(rows: Iterator[dict], column_types: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """A header line, then one line per row"""
+    names = [name for name, _ in column_types]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in _batches(rows, BATCH_ROWS):
+        writer.writerows(
+            [row[name].isoformat() if hasattr(row[name], "isoformat") else row[name] for name in names]
+            for row in batch
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file that hands back what was written since the last take()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(rows: Iterator[dict], column_types: List[Tuple[str, str]]) -> Iterator[bytes]:
+    """
+    A zstd-compressed Parquet file written one row group at a time
+
+    Rows are converted to Arrow a batch at a time; a row group is written once
+    PARQUET_ROW_GROUP_ROWS rows or PARQUET_ROW_GROUP_BYTES have built up.
+    """
+    if pyarrow is None:
+        raise RuntimeError("Parquet export needs the pyarrow package")
+
+    arrow_types = {
+        "int": pyarrow.int64(), "float": pyarrow.float64(), "str": pyarrow.string(),
+        "datetime": pyarrow.timestamp("us"), "bool": pyarrow.bool_(), "json": pyarrow.string()
+    }
+    schema = pyarrow.schema([(name, arrow_types[kind]) for name, kind in column_types])
+    sink = _ChunkSink()
+    with pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(sink, mode="w"), schema, compression="zstd") as writer:
+        pending = []
+        for batch in _batches(rows, BATCH_ROWS):
+            pending.append(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+            if (sum(part.num_rows for part in pending) >= PARQUET_ROW_GROUP_ROWS
+                    or sum(part.nbytes for part in pending) >= PARQUET_ROW_GROUP_BYTES):
+                writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+                pending = []
+                yield sink.take()
+        if pending:
+            writer.write_table(pyarrow.Table.from_batches(pending, schema=schema))
+    yield sink.take()
+
+
+ENCODERS = {"ndjson": ndjson_chunks, "csv": csv_chunks, "parquet": parquet_chunks}
+
+
+def stream_export(user_id: int, kind: str, format: str, details: bool = False) -> Iterator[bytes]:
+    """
+    Encoded export of a user's papers or evaluations, chunk by chunk
+
+    Opens its own session for as long as the stream runs, so it can back a
+    streaming response.
+    """
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = export_rows(db, user_id, kind, details)
+        yield from ENCODERS[format](rows, columns(kind, details))
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a user's papers or evaluations")
+    parser.add_argument("--user", type=int, required=True, help="User ID")
+    parser.add_argument("--kind", choices=KINDS, default="evaluations")
+    parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+    parser.add_argument("--details", action="store_true", help="Include questions, answers and feedback")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(args.user, args.kind, args.format, args.details):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
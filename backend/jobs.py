@@ -0,0 +1,341 @@
+"""
+Background Jobs
+Durable SQLite-backed queue for long-running AI operations, run by worker.py
+"""
+import os
+import json
+import uuid
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import Job, User, SessionLocal
+from schemas_new import PaperGenerationRequest, EvaluationRequest
+from paper_service import generate_curriculum_paper, document_paper_from_bytes, media_paper_from_file, evaluate_submission
+import config
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+def spool_path(filename: str) -> str:
+    """A new path in the spool directory for an upload waiting for its job"""
+    os.makedirs(config.JOB_SPOOL_DIR, exist_ok=True)
+    return os.path.join(config.JOB_SPOOL_DIR, f"{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}")
+
+
+def enqueue_job(db: Session, user_id: int, kind: str, payload: dict) -> Job:
+    """Add a job to the queue; the caller returns its ID straight away"""
+    now = datetime.utcnow()
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        status="queued",
+        payload=json.dumps(payload),
+        stage="queued",
+        progress=json.dumps([{"stage": "queued", "started_at": now.isoformat(), "seconds": None}]),
+        max_attempts=config.JOB_MAX_ATTEMPTS,
+        run_after=now,
+        created_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def claim_job(db: Session, worker_id: str) -> Optional[Job]:
+    """
+    Take the next due job off the queue for this worker
+    
+    The status check in the UPDATE makes the claim atomic, so two workers
+    can never run the same job.
+    """
+    while True:
+        now = datetime.utcnow()
+        job_id = db.query(Job.id).filter(
+            Job.status == "queued",
+            Job.run_after <= now
+        ).order_by(Job.run_after, Job.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        
+        claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+            Job.status: "running",
+            Job.locked_by: worker_id,
+            Job.locked_at: now,
+            Job.attempts: Job.attempts + 1,
+            Job.started_at: func.coalesce(Job.started_at, now)
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            record_stage(job_id, worker_id, "started")
+            return db.query(Job).filter(Job.id == job_id).first()
+
+
+def requeue_stale_jobs(db: Session, worker_id: str) -> int:
+    """
+    Retry (or fail) running jobs whose worker stopped sending heartbeats
+    
+    Each stale job's lock is taken over with an UPDATE that re-checks it is
+    still stale, so only one worker requeues it and a worker that was merely
+    slow finds it no longer holds the lock.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=config.JOB_LOCK_TIMEOUT_SECONDS)
+    stale_ids = [job_id for job_id, in db.query(Job.id).filter(Job.status == "running", Job.locked_at < cutoff)]
+    requeued = 0
+    for job_id in stale_ids:
+        taken = db.query(Job).filter(
+            Job.id == job_id,
+            Job.status == "running",
+            Job.locked_at < cutoff
+        ).update({Job.locked_by: worker_id, Job.locked_at: datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        if taken:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            fail_job(db, job, "The worker running this job stopped responding.", retry=True, worker_id=worker_id)
+            requeued += 1
+    return requeued
+
+
+def _heartbeat(job_id: int, worker_id: str, stop: threading.Event):
+    """
+    Refresh a running job's lock until stopped, so long stages (transcription,
+    AI calls) are not mistaken for a dead worker
+    
+    Uses its own session; the job's session belongs to the worker thread.
+    """
+    while not stop.wait(config.JOB_HEARTBEAT_SECONDS):
+        db = SessionLocal()
+        try:
+            held = db.query(Job).filter(
+                Job.id == job_id,
+                Job.status == "running",
+                Job.locked_by == worker_id
+            ).update({Job.locked_at: datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+            if not held:
+                return
+        except Exception as e:
+            print(f"WARNING: Heartbeat for job {job_id} failed: {str(e)}")
+        finally:
+            db.close()
+
+
+def _holds_lock(db: Session, job: Job, worker_id: str) -> bool:
+    """Whether this worker still owns the job (it may have been requeued as stale)"""
+    db.refresh(job)
+    if job.status == "running" and job.locked_by == worker_id:
+        return True
+    print(f"WARNING: Worker {worker_id} no longer holds job {job.id}; leaving it to {job.locked_by or 'the queue'}")
+    return False
+
+
+def _close_stage(stages: list, now: datetime):
+    """Record how long the current stage took"""
+    if stages and stages[-1]["seconds"] is None:
+        started_at = datetime.fromisoformat(stages[-1]["started_at"])
+        stages[-1]["seconds"] = round((now - started_at).total_seconds(), 3)
+
+
+def record_stage(job_id: int, worker_id: str, stage: str):
+    """
+    Start a new stage, closing the timing of the previous one; also refreshes the job's lock
+    
+    Uses its own session, like the heartbeat, so the stage is committed
+    without committing the handler's unfinished writes.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(Job).filter(
+            Job.id == job_id,
+            Job.status == "running",
+            Job.locked_by == worker_id
+        ).first()
+        if job is None:
+            return
+        now = datetime.utcnow()
+        stages = json.loads(job.progress or "[]")
+        _close_stage(stages, now)
+        stages.append({"stage": stage, "started_at": now.isoformat(), "seconds": None})
+        job.stage = stage
+        job.progress = json.dumps(stages)
+        job.locked_at = now
+        db.commit()
+    except Exception as e:
+        print(f"WARNING: Could not record stage {stage} for job {job_id}: {str(e)}")
+    finally:
+        db.close()
+
+
+def _finish(job: Job, status: str, now: datetime):
+    """Mark a job finished and delete its spooled upload; callers check they hold the lock first"""
+    stages = json.loads(job.progress or "[]")
+    _close_stage(stages, now)
+    job.progress = json.dumps(stages)
+    job.status = status
+    job.stage = status
+    job.finished_at = now
+    job.locked_by = None
+    
+    path = json.loads(job.payload).get("path")
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+def finish_job(db: Session, job: Job, result: dict, worker_id: str):
+    """Store a job's result"""
+    if not _holds_lock(db, job, worker_id):
+        return
+    job.result = json.dumps(result)
+    job.error = None
+    _finish(job, "succeeded", datetime.utcnow())
+    db.commit()
+
+
+def fail_job(db: Session, job: Job, error: str, retry: bool, worker_id: str):
+    """
+    Record a failure, requeueing the job with exponential backoff while attempts remain
+    
+    Client errors (retry=False) fail straight away. Nothing changes unless
+    worker_id still holds the job's lock.
+    """
+    if not _holds_lock(db, job, worker_id):
+        return
+    now = datetime.utcnow()
+    job.error = error
+    if retry and job.attempts < job.max_attempts:
+        delay = config.JOB_RETRY_BACKOFF_SECONDS * 2 ** max(job.attempts - 1, 0)
+        stages = json.loads(job.progress or "[]")
+        _close_stage(stages, now)
+        stages.append({"stage": "waiting_to_retry", "started_at": now.isoformat(), "seconds": None})
+        job.progress = json.dumps(stages)
+        job.status = "queued"
+        job.stage = "waiting_to_retry"
+        job.run_after = now + timedelta(seconds=delay)
+        job.locked_by = None
+        print(f"Job {job.id} failed (attempt {job.attempts}/{job.max_attempts}), retrying in {delay}s: {error}")
+    else:
+        _finish(job, "failed", now)
+        print(f"Job {job.id} failed: {error}")
+    db.commit()
+
+
+def _run_generate_paper(db: Session, user: User, payload: dict, progress, saved):
+    return generate_curriculum_paper(db, user, PaperGenerationRequest(**payload), progress=progress, saved=saved)
+
+
+def _run_document_paper(db: Session, user: User, payload: dict, progress, saved):
+    with open(payload["path"], "rb") as f:
+        content = f.read()
+    return document_paper_from_bytes(
+        db, user, payload["filename"], content,
+        payload["num_mcqs"], payload["num_short_questions"], payload["marks_per_mcq"], payload["marks_per_short"],
+        page_range=payload.get("page_range"), sections=payload.get("sections"), subject=payload.get("subject"),
+        progress=progress, saved=saved
+    )
+
+
+def _run_media_paper(db: Session, user: User, payload: dict, progress, saved):
+    return media_paper_from_file(
+        db, user, payload["path"], payload["filename"], payload["media_hash"],
+        payload["num_mcqs"], payload["num_short_questions"], payload["marks_per_mcq"], payload["marks_per_short"],
+        trim_silence=payload.get("trim_silence", False),
+        progress=progress, saved=saved
+    )
+
+
+def _run_evaluate_paper(db: Session, user: User, payload: dict, progress, saved):
+    return evaluate_submission(db, user, EvaluationRequest(**payload), progress=progress, saved=saved)
+
+
+JOB_HANDLERS = {
+    "generate_paper": _run_generate_paper,
+    "document_paper": _run_document_paper,
+    "media_paper": _run_media_paper,
+    "evaluate_paper": _run_evaluate_paper,
+}
+
+
+def _store_result(job: Job, response):
+    """Saved callback: the result is committed together with the paper or evaluation"""
+    job.result = json.dumps(response.model_dump(mode="json"))
+
+
+def _saved_result(db: Session, job: Job) -> Optional[dict]:
+    """The result an earlier attempt committed with its paper or evaluation, if any"""
+    db.refresh(job)
+    return json.loads(job.result) if job.result else None
+
+
+def run_job(db: Session, job: Job):
+    """
+    Run a claimed job and record its result or failure
+    
+    The handler's output is committed together with the job's result, so a
+    retry after a later failure finishes with that result instead of
+    creating a second paper or evaluation.
+    """
+    worker_id = job.locked_by
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job.id, worker_id, stop), daemon=True)
+    heartbeat.start()
+    try:
+        result = _saved_result(db, job)
+        if result is None:
+            handler = JOB_HANDLERS.get(job.kind)
+            user = db.query(User).filter(User.id == job.user_id).first()
+            if not handler or not user:
+                raise HTTPException(status_code=400, detail=f"Job {job.id} cannot be run")
+            
+            response = handler(
+                db, user, json.loads(job.payload),
+                lambda stage: record_stage(job.id, worker_id, stage),
+                lambda response: _store_result(job, response)
+            )
+            result = response.model_dump(mode="json")
+        finish_job(db, job, result, worker_id)
+        
+    except HTTPException as e:
+        db.rollback()
+        _fail_unless_saved(db, job, str(e.detail), e.status_code >= 500, worker_id)
+    except Exception as e:
+        db.rollback()
+        print(traceback.format_exc())
+        _fail_unless_saved(db, job, str(e), True, worker_id)
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def _fail_unless_saved(db: Session, job: Job, error: str, retry: bool, worker_id: str):
+    """Fail the job, unless its output was already committed (then it succeeded)"""
+    result = _saved_result(db, job)
+    if result is not None:
+        finish_job(db, job, result, worker_id)
+    else:
+        # Server-side errors (e.g. the AI service failing) are worth retrying; bad input is not
+        fail_job(db, job, error, retry=retry, worker_id=worker_id)
+
+
+def job_to_dict(job: Job, include_result: bool = True) -> dict:
+    """API representation of a job, with stage timings"""
+    data = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "stages": json.loads(job.progress or "[]"),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+    if include_result:
+        data["result"] = json.loads(job.result) if job.result else None
+    return data
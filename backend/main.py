@@ -1,26 +1,63 @@
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Header
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session, defer
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
 import json
-from datetime import datetime, timedelta
-from typing import Optional
+import asyncio
+import shutil
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+from typing import Optional, List
 
-from database import get_db, Paper, Evaluation, User
+from database import (
+    get_async_db, SessionLocal, AsyncSessionLocal, async_engine,
+    Paper, Evaluation, User, Document, Job, PaperQuestion, BankQuestion, ArchivedPaper, ArchivedEvaluation
+)
 from schemas_new import (
     UserCreate, UserLogin, UserResponse, Token, DashboardStats,
     PaperGenerationRequest, PaperGenerationResponse, Question,
     EvaluationRequest, EvaluationResponse, QuestionFeedback, Answer,
-    DocumentPaperRequest, DocumentPaperResponse, MediaPaperRequest, MediaPaperResponse
+    DocumentPaperRequest, DocumentPaperResponse, MediaPaperRequest, MediaPaperResponse,
+    LibraryPaperRequest
+)
+from document_utils import (
+    read_upload, expand_zip_archive, extract_documents_parallel, combine_documents, SUPPORTED_DOCUMENT_FORMATS
+)
+from media_utils import save_media_upload
+from document_store import add_to_library, load_text, ensure_library_indexed
+import retrieval_index
+import paper_index
+import minhash_index
+import vector_index
+import archive
+import export
+from transcript_store import get_transcript
+from question_store import load_questions
+from user_stats import get_user_stats, get_progress_timeseries, percentage_of, BUCKETS
+from pagination import paginate_async, page_size
+from jobs import enqueue_job, spool_path, job_to_dict, FINISHED_STATUSES
+from paper_service import (
+    generate_curriculum_paper, create_document_paper, document_paper_from_bytes,
+    create_media_paper, media_paper_from_file, evaluate_submission, calculate_grade
 )
-from openai_service import generate_paper_with_ai, evaluate_paper_with_ai, generate_paper_from_document, generate_paper_from_media_transcript
-from document_utils import extract_text_from_file, validate_document_length
-from media_utils import transcribe_media_file, validate_transcript_length, get_media_info
 from auth import get_password_hash, verify_password, create_access_token, decode_access_token
+import config
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Pooled aiosqlite connections each hold a thread open until closed
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Oxford Curriculum Paper Generator & Evaluator API",
     description="Generate and evaluate examination papers following Oxford Curriculum standards",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -33,7 +70,28 @@ app.add_middleware(
 )
 
 
-def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)):
+async def run_blocking(fn, *args, **kwargs):
+    """Run blocking work (AI calls, local index files, password hashing) on a worker thread"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: fn(*args, **kwargs))
+
+
+async def run_with_session(fn, *args, **kwargs):
+    """
+    Run synchronous service code that takes a Session as its first argument
+    on a worker thread, with a Session of its own
+    """
+    def call():
+        db = SessionLocal()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+    
+    return await run_blocking(call)
+
+
+async def get_current_user(authorization: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
     """Get current authenticated user from JWT token"""
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -48,7 +106,7 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
     
-    user = db.query(User).filter(User.id == int(user_id)).first()
+    user = await db.get(User, int(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
@@ -68,28 +126,47 @@ def read_root():
             "papers": {
                 "generate_paper": "/api/generate_paper",
                 "generate_from_document": "/api/generate_paper_from_document",
+                "generate_from_documents": "/api/generate_paper_from_documents",
+                "documents": "/api/documents",
+                "generate_from_library_document": "/api/documents/{document_id}/generate_paper",
+                "generate_from_library": "/api/generate_paper_from_library",
                 "generate_from_media": "/api/generate_paper_from_media",
+                "generate_from_cached_media": "/api/media/{media_hash}/generate_paper",
+                "search_papers": "/api/papers/search",
+                "similar_questions": "/api/questions/similar",
+                "more_like_question": "/api/evaluations/{evaluation_id}/questions/{question_number}/similar",
                 "get_paper": "/api/papers/{paper_id}",
-                "evaluate": "/api/evaluate_paper"
+                "evaluate": "/api/evaluate_paper",
+                "get_evaluation": "/api/evaluations/{evaluation_id}",
+                "export": "/api/export/{papers|evaluations}"
+            },
+            "jobs": {
+                "submit_generate_paper": "/api/jobs/generate_paper",
+                "submit_generate_from_document": "/api/jobs/generate_paper_from_document",
+                "submit_generate_from_media": "/api/jobs/generate_paper_from_media",
+                "submit_evaluate": "/api/jobs/evaluate_paper",
+                "status": "/api/jobs/{job_id}",
+                "events": "/api/jobs/{job_id}/events"
             },
-            "dashboard": "/api/dashboard"
+            "dashboard": "/api/dashboard",
+            "progress": "/api/progress/timeseries"
         }
     }
 
 
 @app.post("/api/auth/signup", response_model=Token)
-async def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(
+    existing_user = (await db.execute(select(User.id).where(
         (User.email == user.email) | (User.username == user.username)
-    ).first()
+    ))).first()
     
     if existing_user:
         raise HTTPException(status_code=400, detail="Email or username already registered")
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_blocking(get_password_hash, user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -98,8 +175,8 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Create access token
     access_token = create_access_token(data={"sub": str(db_user.id)})
@@ -112,12 +189,12 @@ async def signup(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @app.post("/api/auth/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user and return JWT token"""
     # Find user
-    db_user = db.query(User).filter(User.email == user.email).first()
+    db_user = (await db.execute(select(User).where(User.email == user.email))).scalar_one_or_none()
     
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    if not db_user or not await run_blocking(verify_password, user.password, db_user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
     
     # Create access token
@@ -136,23 +213,58 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return UserResponse.model_validate(current_user)
 
 
+@app.get("/api/papers/search")
+async def search_papers(
+    q: Optional[str] = None,
+    subject: Optional[str] = None,
+    grade: Optional[str] = None,
+    paper_type: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Full-text search over the current user's papers with facet counts
+    
+    Matches chapter, topic, document name and question text. Without q the
+    papers are listed newest first. Page with limit and offset.
+    """
+    # Pick up papers saved before the index existed
+    await run_with_session(paper_index.ensure_papers_indexed, current_user.id)
+    
+    result = await run_blocking(
+        paper_index.search,
+        current_user.id,
+        q,
+        filters={"subject": subject, "grade": grade, "paper_type": paper_type},
+        limit=page_size(limit),
+        offset=max(offset, 0)
+    )
+    result["count"] = len(result["papers"])
+    result["offset"] = max(offset, 0)
+    return result
+
+
 @app.get("/api/papers/{paper_id}")
 async def get_paper(
     paper_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get a specific paper by ID"""
-    paper = db.query(Paper).filter(
+    """Get a specific paper by ID, live or archived"""
+    paper = (await db.execute(select(Paper).options(defer(Paper.questions)).where(
         Paper.id == paper_id,
         Paper.user_id == current_user.id
-    ).first()
+    ))).scalar_one_or_none()
     
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
-    
-    # Parse questions from JSON
-    questions = json.loads(paper.questions)
+    if paper:
+        # Questions come from the questions table rather than the JSON blob
+        questions = await db.run_sync(load_questions, paper)
+    else:
+        paper = await db.get(ArchivedPaper, paper_id)
+        if not paper or paper.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Paper not found")
+        questions = json.loads(paper.questions)
     
     # Format response
     from schemas_new import Question
@@ -174,26 +286,29 @@ async def get_paper(
         "chapter": paper.chapter,
         "topic": paper.topic,
         "document_name": paper.document_name,
+        "document_id": paper.document_id,
+        "media_hash": paper.media_hash,
         "paper_type": paper.paper_type,
         "questions": formatted_questions,
         "total_marks": paper.total_marks,
-        "created_at": paper.created_at
+        "created_at": paper.created_at,
+        "archived": isinstance(paper, ArchivedPaper)
     }
 
 
 @app.get("/api/dashboard", response_model=DashboardStats)
-async def get_dashboard(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_dashboard(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Get user dashboard with progress tracking"""
-    # Get user's papers and evaluations
-    papers = db.query(Paper).filter(Paper.user_id == current_user.id).all()
-    evaluations = db.query(Evaluation).filter(Evaluation.user_id == current_user.id).all()
-    
-    # Calculate statistics
-    total_papers = len(papers)
-    total_evaluations = len(evaluations)
-    average_score = sum(e.score / e.total_marks * 100 for e in evaluations) / len(evaluations) if evaluations else 0
+    # Totals, subject averages and grades come from the user's stats rollups
+    stats = await db.run_sync(get_user_stats, current_user.id)
     
     # Recent papers
+    papers = (await db.execute(
+        select(
+            Paper.id, Paper.paper_type, Paper.grade, Paper.subject, Paper.chapter, Paper.document_name,
+            Paper.total_marks, Paper.created_at
+        ).where(Paper.user_id == current_user.id).order_by(Paper.created_at.desc()).limit(10)
+    )).all()
     recent_papers = [
         {
             "id": p.id,
@@ -205,63 +320,67 @@ async def get_dashboard(current_user: User = Depends(get_current_user), db: Sess
             "total_marks": p.total_marks,
             "created_at": p.created_at.isoformat()
         }
-        for p in sorted(papers, key=lambda x: x.created_at, reverse=True)[:10]
+        for p in papers
     ]
     
     # Recent evaluations with paper details
+    evaluations = (await db.execute(
+        select(Evaluation.id, Evaluation.paper_id, Evaluation.score, Evaluation.total_marks, Evaluation.evaluated_at).where(
+            Evaluation.user_id == current_user.id
+        ).order_by(Evaluation.evaluated_at.desc()).limit(10)
+    )).all()
     recent_evaluations = [
         {
             "id": e.id,
             "paper_id": e.paper_id,
             "score": e.score,
             "total_marks": e.total_marks,
-            "percentage": round((e.score / e.total_marks) * 100, 2),
-            "grade": calculate_grade((e.score / e.total_marks) * 100),
+            "percentage": round(percentage_of(e.score, e.total_marks), 2),
+            "grade": calculate_grade(percentage_of(e.score, e.total_marks)),
             "evaluated_at": e.evaluated_at.isoformat()
         }
-        for e in sorted(evaluations, key=lambda x: x.evaluated_at, reverse=True)[:10]
-    ]
-    
-    # Subject performance
-    subject_scores = {}
-    for e in evaluations:
-        paper = db.query(Paper).filter(Paper.id == e.paper_id).first()
-        if paper and paper.subject:
-            if paper.subject not in subject_scores:
-                subject_scores[paper.subject] = {"total": 0, "count": 0}
-            subject_scores[paper.subject]["total"] += (e.score / e.total_marks) * 100
-            subject_scores[paper.subject]["count"] += 1
-    
-    subject_performance = [
-        {
-            "subject": subject,
-            "average_score": round(scores["total"] / scores["count"], 2)
-        }
-        for subject, scores in subject_scores.items()
+        for e in evaluations
     ]
     
-    # Grade distribution
-    grade_dist = {}
-    for e in evaluations:
-        grade = calculate_grade((e.score / e.total_marks) * 100)
-        grade_dist[grade] = grade_dist.get(grade, 0) + 1
-    
     return DashboardStats(
-        total_papers=total_papers,
-        total_evaluations=total_evaluations,
-        average_score=round(average_score, 2),
+        total_papers=stats["total_papers"],
+        total_evaluations=stats["total_evaluations"],
+        average_score=round(stats["average_score"], 2),
         recent_papers=recent_papers,
         recent_evaluations=recent_evaluations,
-        subject_performance=subject_performance,
-        grade_distribution=grade_dist
+        subject_performance=stats["subject_performance"],
+        grade_distribution=stats["grade_distribution"]
+    )
+
+
+@app.get("/api/progress/timeseries")
+async def get_progress(
+    bucket: str = "week",
+    subject: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    points: Optional[int] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Average score over time per day, week or month, overall and by subject
+    
+    Read from daily rollups. Long ranges are merged into at most points
+    points per series (buckets_per_point says how many buckets each covers).
+    """
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Bucket must be one of: {', '.join(BUCKETS)}")
+    
+    # Bucketing and merging run on a worker thread, off the event loop
+    return await run_with_session(
+        get_progress_timeseries, current_user.id, bucket, subject=subject, start=start, end=end, points=points
     )
 
 
 @app.post("/api/generate_paper", response_model=PaperGenerationResponse)
 async def generate_paper(
     request: PaperGenerationRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Generate an examination paper following Oxford Curriculum pattern
@@ -272,55 +391,7 @@ async def generate_paper(
     - **topic**: Optional specific topic within the chapter
     """
     try:
-        # Generate paper using OpenAI
-        paper_data = generate_paper_with_ai(
-            grade=request.grade,
-            subject=request.subject,
-            chapter=request.chapter,
-            topic=request.topic
-        )
-        
-        # Calculate total marks
-        total_marks = sum(q.get("marks", 0) for q in paper_data["questions"])
-        
-        # Save to database
-        db_paper = Paper(
-            user_id=current_user.id,
-            grade=request.grade,
-            paper_type="curriculum",
-            subject=request.subject,
-            chapter=request.chapter,
-            topic=request.topic,
-            questions=json.dumps(paper_data["questions"]),
-            total_marks=total_marks
-        )
-        db.add(db_paper)
-        db.commit()
-        db.refresh(db_paper)
-        
-        # Format response
-        questions = [
-            Question(
-                question_number=q["question_number"],
-                question_type=q["question_type"],
-                question_text=q["question_text"],
-                marks=q["marks"],
-                options=q.get("options")
-            )
-            for q in paper_data["questions"]
-        ]
-        
-        return PaperGenerationResponse(
-            paper_id=db_paper.id,
-            grade=db_paper.grade,
-            subject=db_paper.subject,
-            chapter=db_paper.chapter,
-            topic=db_paper.topic,
-            questions=questions,
-            total_marks=total_marks,
-            instructions=paper_data.get("instructions", "Answer all questions."),
-            created_at=db_paper.created_at
-        )
+        return await run_with_session(generate_curriculum_paper, current_user, request)
         
     except Exception as e:
         import traceback
@@ -336,8 +407,10 @@ async def generate_paper_from_document_endpoint(
     num_short_questions: int = Form(0, ge=0, description="Number of short answer questions"),
     marks_per_mcq: int = Form(2, ge=1, description="Marks per MCQ"),
     marks_per_short: int = Form(5, ge=1, description="Marks per short answer"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    page_range: Optional[str] = Form(None, description="Pages to use, e.g. '40-55' or '1-3,7' (PDF only)"),
+    sections: Optional[str] = Form(None, description="Comma-separated section headings to use (PDF only)"),
+    subject: Optional[str] = Form(None, description="Subject to file the document under in the library"),
+    current_user: User = Depends(get_current_user)
 ):
     """
     Generate an examination paper based on uploaded document content
@@ -347,6 +420,9 @@ async def generate_paper_from_document_endpoint(
     - **num_short_questions**: Number of Short Answer Questions (0 to skip)
     - **marks_per_mcq**: Marks for each MCQ (default: 2)
     - **marks_per_short**: Marks for each short answer (default: 5)
+    - **page_range**: Optional pages to use from a PDF (e.g. '40-55')
+    - **sections**: Optional comma-separated section headings from the PDF outline
+    - **subject**: Optional subject the document is filed under in your library
     
     You must specify at least one question type (MCQs or Short Questions)
     """
@@ -358,64 +434,287 @@ async def generate_paper_from_document_endpoint(
                 detail="Please specify at least one question type (num_mcqs or num_short_questions)"
             )
         
-        # Extract text from document
-        document_text = await extract_text_from_file(file)
+        content = await file.read()
+        return await run_with_session(
+            document_paper_from_bytes, current_user, file.filename, content,
+            num_mcqs, num_short_questions, marks_per_mcq, marks_per_short,
+            page_range=page_range, sections=sections, subject=subject
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in generate_paper_from_document: {str(e)}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating paper from document: {str(e)}")
+
+
+@app.post("/api/generate_paper_from_documents", response_model=DocumentPaperResponse)
+async def generate_paper_from_documents_endpoint(
+    files: List[UploadFile] = File(..., description="Document files (PDF, DOCX, TXT) and/or ZIP archives of them"),
+    num_mcqs: int = Form(0, ge=0, description="Number of MCQ questions"),
+    num_short_questions: int = Form(0, ge=0, description="Number of short answer questions"),
+    marks_per_mcq: int = Form(2, ge=1, description="Marks per MCQ"),
+    marks_per_short: int = Form(5, ge=1, description="Marks per short answer"),
+    subject: Optional[str] = Form(None, description="Subject to file the documents under in the library"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Generate a single examination paper across several documents
+    
+    - **files**: Upload several documents (PDF, DOCX, or TXT) and/or ZIP archives of them
+    - **num_mcqs**: Number of Multiple Choice Questions (0 to skip)
+    - **num_short_questions**: Number of Short Answer Questions (0 to skip)
+    - **marks_per_mcq**: Marks for each MCQ (default: 2)
+    - **marks_per_short**: Marks for each short answer (default: 5)
+    - **subject**: Optional subject the documents are filed under in your library
+    
+    Identical files are only used once. Documents are extracted in parallel and
+    their combined text is budgeted so every document is represented.
+    """
+    try:
+        # Validate at least one question type
+        if num_mcqs == 0 and num_short_questions == 0:
+            raise HTTPException(
+                status_code=400, 
+                detail="Please specify at least one question type (num_mcqs or num_short_questions)"
+            )
+        
+        # Refuse too many files before reading any of them
+        if len(files) > config.MAX_DOCUMENT_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many documents ({len(files)}). Maximum is {config.MAX_DOCUMENT_FILES}."
+            )
         
-        # Validate document length
-        validate_document_length(document_text)
+        # One size budget covers all uploads together, with archives counted as expanded
+        max_bytes = config.MAX_DOCUMENT_UPLOAD_MB * 1024 * 1024
+        total_bytes = 0
         
-        # Generate paper using OpenAI
-        paper_data = generate_paper_from_document(
-            document_text=document_text,
-            num_mcqs=num_mcqs,
-            num_short_questions=num_short_questions,
-            marks_per_mcq=marks_per_mcq,
-            marks_per_short=marks_per_short
-        )
+        # Read uploads, expand archives and skip identical files by content hash
+        documents = []
+        duplicate_files = []
+        seen_hashes = set()
+        file_count = 0
+        for upload in files:
+            try:
+                content, content_hash = await read_upload(upload, max_bytes - total_bytes)
+            except HTTPException:
+                if total_bytes == 0:
+                    raise
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"The uploads are too large together. Maximum total size is {config.MAX_DOCUMENT_UPLOAD_MB}MB."
+                )
+            if upload.filename.lower().endswith('.zip'):
+                members = expand_zip_archive(
+                    upload.filename, content, max_bytes - total_bytes,
+                    max_files=config.MAX_DOCUMENT_FILES - file_count
+                )
+            else:
+                members = [(upload.filename, content, content_hash)]
+            file_count += len(members)
+            total_bytes += sum(len(data) for _, data, _ in members)
+            
+            for name, data, content_hash in members:
+                if not name.lower().endswith(SUPPORTED_DOCUMENT_FORMATS):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Unsupported file format: {name}. Please upload PDF, DOCX, TXT, or ZIP files."
+                    )
+                if content_hash in seen_hashes:
+                    duplicate_files.append(name)
+                    continue
+                seen_hashes.add(content_hash)
+                documents.append((name, data))
         
-        # Calculate total marks
-        total_marks = sum(q.get("marks", 0) for q in paper_data["questions"])
+        # Extract and normalize all documents in parallel
+        extracted = await extract_documents_parallel(documents)
         
-        # Save to database
-        db_paper = Paper(
-            user_id=current_user.id,
-            document_name=file.filename,
-            paper_type="document",
-            questions=json.dumps(paper_data["questions"]),
-            total_marks=total_marks
+        document_names = [name for name, _, _ in extracted]
+        document_text = combine_documents(
+            [(name, text) for name, text, _ in extracted],
+            config.DOCUMENT_PROMPT_CHARS
         )
-        db.add(db_paper)
-        db.commit()
-        db.refresh(db_paper)
+        text_stats = {
+            key: sum(stats[key] for _, _, stats in extracted)
+            for key in extracted[0][2]
+        }
+        print(f"Combined {len(extracted)} documents ({len(duplicate_files)} duplicates skipped): "
+              f"saved {text_stats['chars_saved']} chars (~{text_stats['tokens_saved']} tokens)")
+        
+        document_name = ", ".join(document_names)
+        if len(document_name) > 500:
+            document_name = document_name[:497] + "..."
         
-        # Format response
-        questions = [
-            Question(
-                question_number=q["question_number"],
-                question_type=q["question_type"],
-                question_text=q["question_text"],
-                marks=q["marks"],
-                options=q.get("options")
+        def create(session: Session):
+            # Keep each document in the user's library for later papers
+            for name, text, _ in extracted:
+                add_to_library(session, current_user.id, name, text, subject=subject)
+            
+            return create_document_paper(
+                session, current_user, document_text, document_name,
+                num_mcqs, num_short_questions, marks_per_mcq, marks_per_short,
+                instructions="Answer all questions based on the documents.",
+                text_stats=text_stats,
+                source_documents=document_names,
+                duplicate_files=duplicate_files
             )
-            for q in paper_data["questions"]
+        
+        return await run_with_session(create)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in generate_paper_from_documents: {str(e)}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating paper from documents: {str(e)}")
+
+
+@app.get("/api/documents")
+async def get_documents(
+    subject: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the current user's document library, optionally for one subject"""
+    query = select(
+        Document.id, Document.filename, Document.subject, Document.char_count, Document.created_at
+    ).where(Document.user_id == current_user.id)
+    if subject:
+        query = query.where(Document.subject == subject)
+    documents = (await db.execute(query.order_by(Document.created_at.desc()))).all()
+    return {
+        "count": len(documents),
+        "documents": [
+            {
+                "id": d.id,
+                "filename": d.filename,
+                "subject": d.subject,
+                "char_count": d.char_count,
+                "created_at": d.created_at
+            }
+            for d in documents
         ]
+    }
+
+
+@app.post("/api/documents/{document_id}/generate_paper", response_model=DocumentPaperResponse)
+async def generate_paper_from_library_document(
+    document_id: int,
+    request: DocumentPaperRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Generate a new paper from a document already in the user's library
+    
+    The stored text is used directly, so no upload or extraction is needed.
+    """
+    try:
+        if request.num_mcqs == 0 and request.num_short_questions == 0:
+            raise HTTPException(
+                status_code=400, 
+                detail="Please specify at least one question type (num_mcqs or num_short_questions)"
+            )
+        
+        document = (await db.execute(select(Document).where(
+            Document.id == document_id,
+            Document.user_id == current_user.id
+        ))).scalar_one_or_none()
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        document_text = await run_blocking(load_text, document.text_hash)
         
-        return DocumentPaperResponse(
-            paper_id=db_paper.id,
-            document_name=file.filename,
-            questions=questions,
-            total_marks=total_marks,
-            instructions=paper_data.get("instructions", "Answer all questions based on the document."),
-            created_at=db_paper.created_at
+        return await run_with_session(
+            create_document_paper, current_user, document_text, document.filename,
+            request.num_mcqs, request.num_short_questions, request.marks_per_mcq, request.marks_per_short,
+            document_id=document.id
         )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in generate_paper_from_library_document: {str(e)}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating paper from library document: {str(e)}")
+
+
+@app.post("/api/generate_paper_from_library", response_model=DocumentPaperResponse)
+async def generate_paper_from_library(
+    request: LibraryPaperRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Generate a topic-targeted paper from the most relevant parts of the user's library
+    
+    - **query**: Topic to focus on (e.g. 'photosynthesis')
+    - **subject**: Optional subject to search within (e.g. 'Biology')
+    - **document_ids**: Optional library documents to search within
+    
+    Only the best-matching chunks (BM25) are sent to the AI, so the prompt stays
+    small however large the library grows.
+    """
+    try:
+        if request.num_mcqs == 0 and request.num_short_questions == 0:
+            raise HTTPException(
+                status_code=400, 
+                detail="Please specify at least one question type (num_mcqs or num_short_questions)"
+            )
+        
+        # Pick up library documents added before the index existed
+        await run_with_session(ensure_library_indexed, current_user.id)
+        
+        document_ids = request.document_ids
+        if request.subject:
+            subject_ids = list((await db.execute(select(Document.id).where(
+                Document.user_id == current_user.id,
+                Document.subject == request.subject
+            ))).scalars())
+            document_ids = [d for d in document_ids if d in subject_ids] if document_ids else subject_ids
+        
+        chunks = await run_blocking(
+            retrieval_index.search, current_user.id, request.query, limit=50, document_ids=document_ids
+        )
+        if not chunks:
+            raise HTTPException(status_code=404, detail=f"Nothing about '{request.query}' was found in your documents.")
+        
+        # Take the best chunks that fit the prompt budget, then restore document order
+        selected = []
+        used = 0
+        for chunk in chunks:
+            if used + len(chunk["text"]) > config.DOCUMENT_PROMPT_CHARS:
+                continue
+            selected.append(chunk)
+            used += len(chunk["text"]) + 2
+        selected.sort(key=lambda c: (c["document_id"], c["position"]))
+        
+        filenames = dict((await db.execute(
+            select(Document.id, Document.filename).where(Document.id.in_({c["document_id"] for c in selected}))
+        )).all())
+        source_documents = list(dict.fromkeys(filenames[c["document_id"]] for c in selected))
+        document_text = "\n\n".join(c["text"] for c in selected)
+        print(f"Retrieved {len(selected)} chunks from {len(source_documents)} documents for '{request.query}'")
         
+        return await run_with_session(
+            create_document_paper, current_user, document_text, f"{request.query} (from {len(source_documents)} documents)",
+            request.num_mcqs, request.num_short_questions, request.marks_per_mcq, request.marks_per_short,
+            instructions="Answer all questions based on your documents.",
+            source_documents=source_documents
+        )
+    
     except HTTPException:
         raise
     except Exception as e:
         import traceback
-        print(f"ERROR in generate_paper_from_document: {str(e)}")
+        print(f"ERROR in generate_paper_from_library: {str(e)}")
         print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Error generating paper from document: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating paper from library: {str(e)}")
 
 
 @app.post("/api/generate_paper_from_media", response_model=MediaPaperResponse)
@@ -425,8 +724,8 @@ async def generate_paper_from_media_endpoint(
     num_short_questions: int = Form(0, ge=0, description="Number of short answer questions"),
     marks_per_mcq: int = Form(2, ge=1, description="Marks per MCQ"),
     marks_per_short: int = Form(5, ge=1, description="Marks per short answer"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    trim_silence: bool = Form(config.MEDIA_TRIM_SILENCE, description="Cut silence and dead air before transcription"),
+    current_user: User = Depends(get_current_user)
 ):
     """
     Generate an examination paper based on uploaded audio/video content
@@ -436,9 +735,10 @@ async def generate_paper_from_media_endpoint(
     - **num_short_questions**: Number of Short Answer Questions (0 to skip)
     - **marks_per_mcq**: Marks for each MCQ (default: 2)
     - **marks_per_short**: Marks for each short answer (default: 5)
+    - **trim_silence**: Cut silence and dead air out before transcription (needs ffmpeg)
     
     You must specify at least one question type (MCQs or Short Questions)
-    Maximum file size: 25MB
+    Maximum file size: 500MB (long recordings are transcribed in parallel segments)
     """
     try:
         # Validate at least one question type
@@ -448,70 +748,76 @@ async def generate_paper_from_media_endpoint(
                 detail="Please specify at least one question type (num_mcqs or num_short_questions)"
             )
         
-        # Get media info
-        media_info = get_media_info(file.filename)
-        
-        # Transcribe audio/video to text using Whisper API
-        transcript = await transcribe_media_file(file)
-        
-        # Validate transcript length
-        validate_transcript_length(transcript)
-        
-        # Generate paper using OpenAI
-        paper_data = generate_paper_from_media_transcript(
-            transcript=transcript,
-            num_mcqs=num_mcqs,
-            num_short_questions=num_short_questions,
-            marks_per_mcq=marks_per_mcq,
-            marks_per_short=marks_per_short
-        )
+        # Stream the upload to disk once; its hash is the transcript cache key
+        media_path, media_hash = await save_media_upload(file)
+        try:
+            # Transcription takes minutes for long recordings, so keep it off the event loop
+            return await run_with_session(
+                media_paper_from_file, current_user, media_path, file.filename, media_hash,
+                num_mcqs, num_short_questions, marks_per_mcq, marks_per_short,
+                trim_silence=trim_silence
+            )
+        finally:
+            os.unlink(media_path)
         
-        # Calculate total marks
-        total_marks = sum(q.get("marks", 0) for q in paper_data["questions"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"ERROR in generate_paper_from_media: {str(e)}")
+        print(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error generating paper from media: {str(e)}")
+
+
+@app.post("/api/media/{media_hash}/generate_paper", response_model=MediaPaperResponse)
+async def generate_paper_from_cached_media(
+    media_hash: str,
+    request: MediaPaperRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Generate another paper from a recording you have used before, without re-uploading
+    
+    - **media_hash**: The media_hash returned with an earlier media paper
+    
+    The stored transcript is reused, so nothing is transcribed again.
+    """
+    try:
+        if request.num_mcqs == 0 and request.num_short_questions == 0:
+            raise HTTPException(
+                status_code=400, 
+                detail="Please specify at least one question type (num_mcqs or num_short_questions)"
+            )
         
-        # Save to database
-        db_paper = Paper(
-            user_id=current_user.id,
-            document_name=file.filename,  # Store media filename
-            paper_type="media",  # New paper type for audio/video
-            questions=json.dumps(paper_data["questions"]),
-            total_marks=total_marks
-        )
-        db.add(db_paper)
-        db.commit()
-        db.refresh(db_paper)
+        # Only recordings the user has generated papers from can be reused
+        source_paper = (await db.execute(
+            select(Paper.document_name).where(
+                Paper.user_id == current_user.id,
+                Paper.media_hash == media_hash
+            ).order_by(Paper.created_at.desc()).limit(1)
+        )).first()
+        if not source_paper:
+            raise HTTPException(status_code=404, detail="Recording not found")
         
-        # Format response
-        questions = [
-            Question(
-                question_number=q["question_number"],
-                question_type=q["question_type"],
-                question_text=q["question_text"],
-                marks=q["marks"],
-                options=q.get("options")
+        cached = await db.run_sync(get_transcript, media_hash)
+        if not cached:
+            raise HTTPException(
+                status_code=404,
+                detail="The transcript of this recording is no longer stored. Please upload it again."
             )
-            for q in paper_data["questions"]
-        ]
         
-        # Create transcript preview (first 200 characters)
-        transcript_preview = transcript[:200] + "..." if len(transcript) > 200 else transcript
-        
-        return MediaPaperResponse(
-            paper_id=db_paper.id,
-            media_name=file.filename,
-            media_type=media_info["media_type"],
-            transcript_preview=transcript_preview,
-            questions=questions,
-            total_marks=total_marks,
-            instructions=paper_data.get("instructions", "Answer all questions based on the audio/video content."),
-            created_at=db_paper.created_at
+        return await run_with_session(
+            create_media_paper, current_user, cached.transcript, source_paper.document_name, media_hash,
+            request.num_mcqs, request.num_short_questions, request.marks_per_mcq, request.marks_per_short,
+            media_stats=json.loads(cached.media_stats or "{}"), transcript_cached=True
         )
         
     except HTTPException:
         raise
     except Exception as e:
         import traceback
-        print(f"ERROR in generate_paper_from_media: {str(e)}")
+        print(f"ERROR in generate_paper_from_cached_media: {str(e)}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error generating paper from media: {str(e)}")
 
@@ -519,8 +825,7 @@ async def generate_paper_from_media_endpoint(
 @app.post("/api/evaluate_paper", response_model=EvaluationResponse)
 async def evaluate_paper(
     request: EvaluationRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Evaluate a student's answers for a generated paper
@@ -529,105 +834,7 @@ async def evaluate_paper(
     - **answers**: List of student answers with question numbers
     """
     try:
-        # Fetch the paper from database
-        paper = db.query(Paper).filter(Paper.id == request.paper_id).first()
-        if not paper:
-            raise HTTPException(status_code=404, detail="Paper not found")
-        
-        # Verify paper belongs to current user
-        if paper.user_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Access denied: This paper belongs to another user")
-        
-        questions = json.loads(paper.questions)
-        
-        # Convert student answers to dict for easier lookup
-        student_answers_dict = {
-            ans.question_number: ans.answer 
-            for ans in request.answers
-        }
-        
-        print(f"Evaluating paper {request.paper_id} with {len(questions)} questions")
-        print(f"Student provided answers for {len(student_answers_dict)} questions")
-        print(f"Question types: {[q['question_type'] for q in questions]}")
-        
-        # Evaluate using OpenAI
-        evaluation_data = evaluate_paper_with_ai(questions, student_answers_dict)
-        
-        print(f"Received feedback for {len(evaluation_data['question_feedback'])} questions")
-        
-        # Validate that all questions were evaluated
-        evaluated_q_numbers = {fb["question_number"] for fb in evaluation_data["question_feedback"]}
-        all_q_numbers = {q["question_number"] for q in questions}
-        
-        if evaluated_q_numbers != all_q_numbers:
-            missing = all_q_numbers - evaluated_q_numbers
-            print(f"WARNING: Not all questions were evaluated. Missing: {missing}")
-            # Add zero marks for missing questions
-            for q_num in missing:
-                question = next(q for q in questions if q["question_number"] == q_num)
-                evaluation_data["question_feedback"].append({
-                    "question_number": q_num,
-                    "marks_obtained": 0.0,
-                    "marks_total": question["marks"],
-                    "feedback": "No evaluation provided for this question.",
-                    "correct_answer": question.get("correct_answer", "N/A")
-                })
-        
-        # Calculate total score - ensure we sum all feedback items
-        total_score = 0.0
-        for fb in evaluation_data["question_feedback"]:
-            marks = fb.get("marks_obtained", 0)
-            if marks is None:
-                marks = 0.0
-            total_score += float(marks)
-        
-        print(f"Total score calculated: {total_score} out of {paper.total_marks}")
-        
-        # Calculate percentage and grade
-        if paper.total_marks > 0:
-            percentage = (total_score / paper.total_marks) * 100
-        else:
-            percentage = 0.0
-            
-        grade_letter = calculate_grade(percentage)
-        
-        # Save evaluation to database
-        db_evaluation = Evaluation(
-            user_id=current_user.id,
-            paper_id=request.paper_id,
-            student_answers=json.dumps(student_answers_dict),
-            score=total_score,
-            total_marks=paper.total_marks,
-            feedback=json.dumps(evaluation_data["question_feedback"])
-        )
-        db.add(db_evaluation)
-        db.commit()
-        db.refresh(db_evaluation)
-        
-        # Format response
-        feedback_list = [
-            QuestionFeedback(
-                question_number=fb["question_number"],
-                student_answer=student_answers_dict.get(fb["question_number"], "Not answered"),
-                marks_obtained=fb["marks_obtained"],
-                marks_total=fb["marks_total"],
-                feedback=fb["feedback"],
-                correct_answer=fb.get("correct_answer")
-            )
-            for fb in evaluation_data["question_feedback"]
-        ]
-        
-        return EvaluationResponse(
-            evaluation_id=db_evaluation.id,
-            paper_id=request.paper_id,
-            total_score=float(total_score),
-            total_marks=paper.total_marks,
-            percentage=round(float(percentage), 2),
-            grade_letter=grade_letter,
-            feedback=feedback_list,
-            overall_feedback=evaluation_data.get("overall_feedback", ""),
-            evaluated_at=db_evaluation.evaluated_at
-        )
+        return await run_with_session(evaluate_submission, current_user, request)
         
     except HTTPException:
         raise
@@ -635,30 +842,209 @@ async def evaluate_paper(
         raise HTTPException(status_code=500, detail=f"Error evaluating paper: {str(e)}")
 
 
-def calculate_grade(percentage: float) -> str:
-    """Calculate letter grade based on Oxford grading system"""
-    if percentage >= 90:
-        return "A*"
-    elif percentage >= 80:
-        return "A"
-    elif percentage >= 70:
-        return "B"
-    elif percentage >= 60:
-        return "C"
-    elif percentage >= 50:
-        return "D"
-    elif percentage >= 40:
-        return "E"
-    else:
-        return "U"  # Ungraded
+# ---------------------------------------------------------------------------
+# Background jobs: submit returns a job ID at once and a worker (worker.py) runs
+# the request; poll GET /api/jobs/{job_id} or stream /api/jobs/{job_id}/events
+# ---------------------------------------------------------------------------
+
+def job_submitted(job: Job) -> dict:
+    """Response for a newly queued job"""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }
+
+
+@app.post("/api/jobs/generate_paper")
+async def submit_generate_paper(
+    request: PaperGenerationRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue a curriculum paper (same fields as /api/generate_paper)"""
+    job = await db.run_sync(enqueue_job, current_user.id, "generate_paper", request.model_dump())
+    return job_submitted(job)
+
+
+@app.post("/api/jobs/generate_paper_from_document")
+async def submit_generate_paper_from_document(
+    file: UploadFile = File(..., description="Document file (PDF, DOCX, or TXT)"),
+    num_mcqs: int = Form(0, ge=0, description="Number of MCQ questions"),
+    num_short_questions: int = Form(0, ge=0, description="Number of short answer questions"),
+    marks_per_mcq: int = Form(2, ge=1, description="Marks per MCQ"),
+    marks_per_short: int = Form(5, ge=1, description="Marks per short answer"),
+    page_range: Optional[str] = Form(None, description="Pages to use, e.g. '40-55' or '1-3,7' (PDF only)"),
+    sections: Optional[str] = Form(None, description="Comma-separated section headings to use (PDF only)"),
+    subject: Optional[str] = Form(None, description="Subject to file the document under in the library"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue a paper from a document (same fields as /api/generate_paper_from_document)"""
+    if num_mcqs == 0 and num_short_questions == 0:
+        raise HTTPException(
+            status_code=400, 
+            detail="Please specify at least one question type (num_mcqs or num_short_questions)"
+        )
+    if not file.filename.lower().endswith(SUPPORTED_DOCUMENT_FORMATS):
+        raise HTTPException(status_code=400, detail="Unsupported file format. Please upload PDF, DOCX, or TXT files.")
+    
+    content, _ = await read_upload(file, config.MAX_DOCUMENT_UPLOAD_MB * 1024 * 1024)
+    path = spool_path(file.filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    
+    job = await db.run_sync(enqueue_job, current_user.id, "document_paper", {
+        "path": path,
+        "filename": file.filename,
+        "num_mcqs": num_mcqs,
+        "num_short_questions": num_short_questions,
+        "marks_per_mcq": marks_per_mcq,
+        "marks_per_short": marks_per_short,
+        "page_range": page_range,
+        "sections": sections,
+        "subject": subject
+    })
+    return job_submitted(job)
+
+
+@app.post("/api/jobs/generate_paper_from_media")
+async def submit_generate_paper_from_media(
+    file: UploadFile = File(..., description="Media file (Audio: MP3, WAV, M4A | Video: MP4, AVI, MOV)"),
+    num_mcqs: int = Form(0, ge=0, description="Number of MCQ questions"),
+    num_short_questions: int = Form(0, ge=0, description="Number of short answer questions"),
+    marks_per_mcq: int = Form(2, ge=1, description="Marks per MCQ"),
+    marks_per_short: int = Form(5, ge=1, description="Marks per short answer"),
+    trim_silence: bool = Form(config.MEDIA_TRIM_SILENCE, description="Cut silence and dead air before transcription"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue a paper from a recording (same fields as /api/generate_paper_from_media)"""
+    if num_mcqs == 0 and num_short_questions == 0:
+        raise HTTPException(
+            status_code=400, 
+            detail="Please specify at least one question type (num_mcqs or num_short_questions)"
+        )
+    
+    media_path, media_hash = await save_media_upload(file)
+    path = spool_path(file.filename)
+    shutil.move(media_path, path)
+    
+    job = await db.run_sync(enqueue_job, current_user.id, "media_paper", {
+        "path": path,
+        "filename": file.filename,
+        "media_hash": media_hash,
+        "num_mcqs": num_mcqs,
+        "num_short_questions": num_short_questions,
+        "marks_per_mcq": marks_per_mcq,
+        "marks_per_short": marks_per_short,
+        "trim_silence": trim_silence
+    })
+    return job_submitted(job)
+
+
+@app.post("/api/jobs/evaluate_paper")
+async def submit_evaluate_paper(
+    request: EvaluationRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Queue an evaluation (same fields as /api/evaluate_paper)"""
+    paper = (await db.execute(
+        select(Paper.id).where(Paper.id == request.paper_id, Paper.user_id == current_user.id)
+    )).first()
+    if not paper:
+        raise HTTPException(status_code=404, detail="Paper not found")
+    
+    job = await db.run_sync(enqueue_job, current_user.id, "evaluate_paper", request.model_dump())
+    return job_submitted(job)
+
+
+async def get_user_job(db: AsyncSession, job_id: int, user_id: int) -> Job:
+    """Fetch one of the user's jobs or raise 404"""
+    job = (await db.execute(select(Job).where(Job.id == job_id, Job.user_id == user_id))).scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Get a job's status, stage timings and (once it has succeeded) its result
+    
+    The result has the same shape as the matching synchronous endpoint's response.
+    """
+    return job_to_dict(await get_user_job(db, job_id, current_user.id))
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: int, current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """
+    Server-sent events for a job: a 'progress' event whenever its stage changes,
+    then a final 'succeeded' or 'failed' event carrying the full job
+    """
+    await get_user_job(db, job_id, current_user.id)
+    
+    async def events():
+        last_seen = None
+        while True:
+            # A fresh session each time so changes committed by the worker are seen
+            async with AsyncSessionLocal() as session:
+                job = await session.get(Job, job_id)
+                finished = job.status in FINISHED_STATUSES
+                data = job_to_dict(job, include_result=finished)
+            
+            if finished:
+                yield f"event: {data['status']}\ndata: {json.dumps(data)}\n\n"
+                return
+            if (data["status"], data["stage"], data["attempts"]) != last_seen:
+                last_seen = (data["status"], data["stage"], data["attempts"])
+                yield f"event: progress\ndata: {json.dumps(data)}\n\n"
+            await asyncio.sleep(config.JOB_POLL_SECONDS / 2)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @app.get("/api/papers")
-async def get_all_papers(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get all papers for current user"""
-    papers = db.query(Paper).filter(Paper.user_id == current_user.id).order_by(Paper.created_at.desc()).all()
+async def get_all_papers(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    subject: Optional[str] = None,
+    grade: Optional[str] = None,
+    paper_type: Optional[str] = None,
+    archived: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get the current user's papers, newest first, one page at a time
+    
+    Pass the returned next_cursor to fetch the following page. Only the list
+    columns are loaded, never the stored questions. Set archived to list
+    archived papers instead.
+    """
+    table = ArchivedPaper if archived else Paper
+    query = select(
+        table.id, table.grade, table.subject, table.chapter, table.topic, table.document_name,
+        table.paper_type, table.total_marks, table.created_at
+    ).where(table.user_id == current_user.id)
+    if subject:
+        query = query.where(table.subject == subject)
+    if grade:
+        query = query.where(table.grade == grade)
+    if paper_type:
+        query = query.where(table.paper_type == paper_type)
+    
+    try:
+        papers, next_cursor = await paginate_async(db, query, table.created_at, table.id, cursor, page_size(limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     return {
         "count": len(papers),
+        "next_cursor": next_cursor,
         "papers": [
             {
                 "id": p.id,
@@ -666,6 +1052,8 @@ async def get_all_papers(current_user: User = Depends(get_current_user), db: Ses
                 "subject": p.subject,
                 "chapter": p.chapter,
                 "topic": p.topic,
+                "document_name": p.document_name,
+                "paper_type": p.paper_type,
                 "total_marks": p.total_marks,
                 "created_at": p.created_at
             }
@@ -675,18 +1063,62 @@ async def get_all_papers(current_user: User = Depends(get_current_user), db: Ses
 
 
 @app.get("/api/evaluations")
-async def get_all_evaluations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Get all evaluations for current user"""
-    evaluations = db.query(Evaluation).filter(Evaluation.user_id == current_user.id).order_by(Evaluation.evaluated_at.desc()).all()
+async def get_all_evaluations(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    paper_id: Optional[int] = None,
+    subject: Optional[str] = None,
+    grade: Optional[str] = None,
+    paper_type: Optional[str] = None,
+    archived: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get the current user's evaluations, newest first, one page at a time
+    
+    Pass the returned next_cursor to fetch the following page. Answers and
+    feedback are not loaded. subject, grade and paper_type filter on the
+    evaluated paper, live or archived. Set archived to list archived
+    evaluations instead.
+    """
+    table = ArchivedEvaluation if archived else Evaluation
+    query = select(
+        table.id, table.paper_id, table.score, table.total_marks, table.evaluated_at
+    ).where(table.user_id == current_user.id)
+    if paper_id:
+        query = query.where(table.paper_id == paper_id)
+    if subject or grade or paper_type:
+        # The paper may be live or archived (IDs never overlap)
+        query = query.outerjoin(Paper, Paper.id == table.paper_id).outerjoin(
+            ArchivedPaper, ArchivedPaper.id == table.paper_id
+        )
+        if subject:
+            # Archived evaluations keep their paper's subject
+            paper_subject = table.subject if archived else func.coalesce(Paper.subject, ArchivedPaper.subject)
+            query = query.where(paper_subject == subject)
+        if grade:
+            query = query.where(func.coalesce(Paper.grade, ArchivedPaper.grade) == grade)
+        if paper_type:
+            query = query.where(func.coalesce(Paper.paper_type, ArchivedPaper.paper_type) == paper_type)
+    
+    try:
+        evaluations, next_cursor = await paginate_async(
+            db, query, table.evaluated_at, table.id, cursor, page_size(limit)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     return {
         "count": len(evaluations),
+        "next_cursor": next_cursor,
         "evaluations": [
             {
                 "id": e.id,
                 "paper_id": e.paper_id,
                 "score": e.score,
                 "total_marks": e.total_marks,
-                "percentage": round((e.score / e.total_marks) * 100, 2),
+                "percentage": round(percentage_of(e.score, e.total_marks), 2),
                 "evaluated_at": e.evaluated_at
             }
             for e in evaluations
@@ -694,6 +1126,189 @@ async def get_all_evaluations(current_user: User = Depends(get_current_user), db
     }
 
 
+@app.get("/api/evaluations/{evaluation_id}")
+async def get_evaluation(
+    evaluation_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a specific evaluation by ID, live or archived, with answers and feedback"""
+    evaluation = (await db.execute(select(Evaluation).where(
+        Evaluation.id == evaluation_id,
+        Evaluation.user_id == current_user.id
+    ))).scalar_one_or_none()
+    if not evaluation:
+        evaluation = await db.get(ArchivedEvaluation, evaluation_id)
+        if not evaluation or evaluation.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Evaluation not found")
+    
+    percentage = percentage_of(evaluation.score, evaluation.total_marks)
+    return {
+        "id": evaluation.id,
+        "paper_id": evaluation.paper_id,
+        "score": evaluation.score,
+        "total_marks": evaluation.total_marks,
+        "percentage": round(percentage, 2),
+        "grade": calculate_grade(percentage),
+        "student_answers": json.loads(evaluation.student_answers),
+        "feedback": json.loads(evaluation.feedback),
+        "evaluated_at": evaluation.evaluated_at,
+        "archived": isinstance(evaluation, ArchivedEvaluation)
+    }
+
+
+@app.get("/api/export/{kind}")
+async def export_history(
+    kind: str,
+    format: str = "ndjson",
+    details: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Download all of the current user's papers or evaluations, archived ones
+    included, as NDJSON, CSV or Parquet
+    
+    The file is streamed as rows are read, so it can be any size. Set details
+    to include questions, or answers and feedback.
+    """
+    if kind not in export.KINDS:
+        raise HTTPException(status_code=404, detail="Export must be of papers or evaluations")
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(export.FORMATS)}")
+    if format == "parquet" and export.pyarrow is None:
+        raise HTTPException(status_code=501, detail="Parquet export needs the pyarrow package on the server")
+    
+    media_type, extension = export.FORMATS[format]
+    return StreamingResponse(
+        export.stream_export(current_user.id, kind, format, details),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}.{extension}"'}
+    )
+
+
+@app.get("/api/questions/similar")
+async def get_similar_questions(
+    text: Optional[str] = None,
+    paper_id: Optional[int] = None,
+    question_number: Optional[int] = None,
+    limit: int = 10,
+    threshold: Optional[float] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Find near-duplicate questions in the question bank
+    
+    Pass the question text, or paper_id and question_number of one of your
+    papers' questions. Results are ordered by estimated Jaccard similarity.
+    """
+    if not text and paper_id and question_number:
+        row = (await db.execute(select(PaperQuestion.text).join(Paper, Paper.id == PaperQuestion.paper_id).where(
+            Paper.id == paper_id,
+            Paper.user_id == current_user.id,
+            PaperQuestion.number == question_number
+        ))).first()
+        if row:
+            text = row.text
+        else:
+            question = await db.run_sync(archive.archived_paper_question, paper_id, current_user.id, question_number)
+            if not question:
+                raise HTTPException(status_code=404, detail="Question not found")
+            text = question["question_text"]
+    if not text:
+        raise HTTPException(status_code=400, detail="Provide text, or paper_id and question_number")
+    
+    matches = await run_blocking(
+        minhash_index.query,
+        text,
+        threshold=threshold if threshold is not None else minhash_index.DUPLICATE_THRESHOLD,
+        limit=max(1, min(limit, 50))
+    )
+    rows = {
+        q.id: q for q in (await db.execute(
+            select(BankQuestion).where(BankQuestion.id.in_([question_id for question_id, _ in matches]))
+        )).scalars()
+    } if matches else {}
+    
+    return {
+        "query": text,
+        "count": len(rows),
+        "questions": [
+            {
+                "id": question_id,
+                "grade": rows[question_id].grade,
+                "subject": rows[question_id].subject,
+                "chapter": rows[question_id].chapter,
+                "question_type": rows[question_id].question_type,
+                "marks": rows[question_id].marks,
+                "question_text": rows[question_id].text,
+                "similarity": round(score, 3)
+            }
+            for question_id, score in matches if question_id in rows
+        ]
+    }
+
+
+@app.get("/api/evaluations/{evaluation_id}/questions/{question_number}/similar")
+async def get_more_like_question(
+    evaluation_id: int,
+    question_number: int,
+    k: int = 5,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Banked questions most like one question of an evaluated paper
+    
+    Served from the local vector index, ordered by cosine similarity of
+    TF-IDF vectors. Answers are left out so the questions can be practised.
+    """
+    row = (await db.execute(select(PaperQuestion.text, PaperQuestion.bank_question_id).join(
+        Evaluation, Evaluation.paper_id == PaperQuestion.paper_id
+    ).where(
+        Evaluation.id == evaluation_id,
+        Evaluation.user_id == current_user.id,
+        PaperQuestion.number == question_number
+    ))).first()
+    if row:
+        text, bank_question_id = row.text, row.bank_question_id
+    else:
+        question = await db.run_sync(
+            archive.archived_evaluation_question, evaluation_id, current_user.id, question_number
+        )
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
+        text, bank_question_id = question["question_text"], question.get("bank_question_id")
+    
+    exclude = [bank_question_id] if bank_question_id else []
+    matches = await run_blocking(vector_index.search, text, k=max(1, min(k, 50)), exclude=exclude)
+    rows = {
+        q.id: q for q in (await db.execute(
+            select(BankQuestion).where(BankQuestion.id.in_([question_id for question_id, _ in matches]))
+        )).scalars()
+    } if matches else {}
+    
+    return {
+        "evaluation_id": evaluation_id,
+        "question_number": question_number,
+        "questions": [
+            {
+                "id": question_id,
+                "grade": rows[question_id].grade,
+                "subject": rows[question_id].subject,
+                "chapter": rows[question_id].chapter,
+                "topic": rows[question_id].topic,
+                "question_type": rows[question_id].question_type,
+                "marks": rows[question_id].marks,
+                "question_text": rows[question_id].text,
+                "options": json.loads(rows[question_id].options) if rows[question_id].options else None,
+                "similarity": score
+            }
+            for question_id, score in matches if question_id in rows
+        ]
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     import sys
@@ -2,9 +2,15 @@
 Media Processing Utilities
 Handles audio/video file processing and transcription for paper generation
 """
-import io
 import os
+import re
+import hashlib
+import difflib
 import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 from fastapi import UploadFile, HTTPException
 from openai import OpenAI
 import config
@@ -16,83 +22,374 @@ SUPPORTED_AUDIO_FORMATS = ['.mp3', '.wav', '.m4a', '.ogg', '.flac', '.webm']
 SUPPORTED_VIDEO_FORMATS = ['.mp4', '.avi', '.mov', '.mkv', '.mpeg', '.mpg', '.wmv']
 ALL_SUPPORTED_FORMATS = SUPPORTED_AUDIO_FORMATS + SUPPORTED_VIDEO_FORMATS
 
-# Maximum file size (25MB - Whisper API limit)
+# Maximum size of one transcription request (25MB - Whisper API limit)
 MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB in bytes
 
+# Maximum upload size; longer recordings are split into segments before transcription
+MAX_UPLOAD_SIZE = config.MAX_MEDIA_UPLOAD_MB * 1024 * 1024
 
-async def validate_media_file(file: UploadFile) -> bool:
-    """
-    Validate that the uploaded file is a supported media format and within size limits
+# Uploads are copied to disk in chunks of this size
+MEDIA_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Recordings are reduced to 16 kHz mono Opus speech audio before upload
+# (about 11MB per hour, whatever the source format)
+AUDIO_EXTENSION = ".ogg"
+AUDIO_ENCODE_ARGS = ["-vn", "-ac", "1", "-ar", "16000", "-c:a", "libopus", "-b:a", "24k", "-application", "voip"]
+
+# Segments are cut in the quietest gap near the target length
+SILENCE_NOISE = "-30dB"
+SILENCE_MIN_SECONDS = 0.4
+SILENCE_SEARCH_SHARE = 0.25
+SILENCE_RE = re.compile(r"silence_(start|end): (-?[\d.]+)")
+DURATION_RE = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+
+# Shared by every request so the number of Whisper calls in flight stays bounded
+_transcription_slots = threading.BoundedSemaphore(config.TRANSCRIPTION_CONCURRENCY)
+
+
+def validate_media_file(filename: str) -> bool:
     """
-    filename = file.filename.lower()
+    Validate that the uploaded file is a supported media format
     
-    # Check file extension
-    file_ext = os.path.splitext(filename)[1]
+    The size limit is enforced while the upload is saved (see save_media_upload).
+    """
+    file_ext = os.path.splitext(filename.lower())[1]
     if file_ext not in ALL_SUPPORTED_FORMATS:
         raise HTTPException(
             status_code=400,
             detail=f"Unsupported file format. Supported formats: {', '.join(ALL_SUPPORTED_FORMATS)}"
         )
     
-    # Read file to check size
-    content = await file.read()
-    file_size = len(content)
+    return True
+
+
+async def save_media_upload(file: UploadFile) -> Tuple[str, str]:
+    """
+    Stream an upload to a temporary file in one pass and return (path, sha256)
     
-    # Reset file pointer for later use
-    await file.seek(0)
+    Only one chunk is held in memory at a time. The size limit is checked as
+    chunks arrive, so oversized files are rejected without reading them fully.
+    The caller deletes the file when done.
+    """
+    validate_media_file(file.filename)
     
-    if file_size > MAX_FILE_SIZE:
-        size_mb = file_size / (1024 * 1024)
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large ({size_mb:.2f}MB). Maximum size is 25MB."
-        )
+    file_ext = os.path.splitext(file.filename)[1]
+    digest = hashlib.sha256()
+    file_size = 0
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_ext)
+    try:
+        with temp_file:
+            while True:
+                chunk = await file.read(MEDIA_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                if file_size > MAX_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)}MB."
+                    )
+                digest.update(chunk)
+                temp_file.write(chunk)
+    except BaseException:
+        os.unlink(temp_file.name)
+        raise
     
-    return True
+    return temp_file.name, digest.hexdigest()
 
 
-async def transcribe_media_file(file: UploadFile) -> str:
+def _transcribe_request(path: str) -> str:
+    """Send one file to the Whisper API, waiting for a free transcription slot"""
+    with _transcription_slots:
+        with open(path, 'rb') as audio_file:
+            return client.audio.transcriptions.create(
+                model="whisper-1",
+                file=audio_file,
+                response_format="text"
+            )
+
+
+def _parse_duration(ffmpeg_output: str) -> float:
+    """Read the 'Duration: HH:MM:SS.ss' line ffmpeg prints for its input"""
+    match = DURATION_RE.search(ffmpeg_output)
+    if not match:
+        raise ValueError(f"ffmpeg could not read the media file: {ffmpeg_output.strip()[-300:]}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def get_media_duration(path: str) -> float:
+    """Duration of a recording in seconds, read from the container by ffprobe"""
+    result = subprocess.run(
+        [config.FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", path],
+        capture_output=True, text=True, errors="replace"
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        raise ValueError(f"ffprobe could not read the media file: {result.stderr.strip()[-300:]}")
+
+
+def extract_audio(path: str, output_path: str):
+    """Extract the audio track of a recording as compact 16 kHz mono speech audio"""
+    result = subprocess.run(
+        [config.FFMPEG_PATH, "-hide_banner", "-nostats", "-loglevel", "error", "-y",
+         "-i", path, *AUDIO_ENCODE_ARGS, output_path],
+        capture_output=True, text=True, errors="replace"
+    )
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg could not extract the audio track: {result.stderr.strip()[-300:]}")
+
+
+def detect_silences(path: str, min_seconds: float = SILENCE_MIN_SECONDS) -> Tuple[float, List[Tuple[float, float]]]:
+    """
+    Find the silent gaps in a recording with ffmpeg's silencedetect filter
+    
+    Returns the duration in seconds and a list of (start, end) silences.
+    """
+    result = subprocess.run(
+        [config.FFMPEG_PATH, "-hide_banner", "-nostats", "-i", path, "-vn",
+         "-af", f"silencedetect=noise={SILENCE_NOISE}:d={min_seconds}", "-f", "null", "-"],
+        capture_output=True, text=True, errors="replace"
+    )
+    duration = _parse_duration(result.stderr)
+    
+    silences = []
+    start = None
+    for kind, value in SILENCE_RE.findall(result.stderr):
+        if kind == "start":
+            start = max(float(value), 0.0)
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    if start is not None:
+        silences.append((start, duration))
+    return duration, silences
+
+
+def plan_segments(duration: float, silences: List[Tuple[float, float]],
+                  segment_seconds: float, overlap_seconds: float) -> List[Tuple[float, float]]:
+    """
+    Split a recording into (start, end) segments of about segment_seconds
+    
+    Each cut is placed in the middle of the latest silence in the last quarter
+    of the segment (or at the target length if there is none), and every
+    segment after the first starts overlap_seconds before the previous cut so
+    no words are lost at the boundary.
     """
-    Transcribe audio/video file to text using OpenAI Whisper API
+    cuts = []
+    position = 0.0
+    while duration - position > segment_seconds:
+        target = position + segment_seconds
+        earliest = target - segment_seconds * SILENCE_SEARCH_SHARE
+        gaps = [(start + end) / 2 for start, end in silences if earliest <= (start + end) / 2 <= target]
+        position = max(gaps) if gaps else target
+        cuts.append(position)
+    
+    bounds = [0.0] + cuts + [duration]
+    return [
+        (max(0.0, bounds[i] - overlap_seconds) if i else 0.0, bounds[i + 1])
+        for i in range(len(bounds) - 1)
+    ]
+
+
+def speech_regions(duration: float, silences: List[Tuple[float, float]], padding: float) -> List[Tuple[float, float]]:
+    """The (start, end) stretches of a recording between silences, padded on each side"""
+    regions = []
+    position = 0.0
+    for start, end in silences:
+        if start + padding > position:
+            regions.append((position, start + padding))
+        position = max(position, end - padding)
+    if duration - position > padding:
+        regions.append((position, duration))
+    return regions
+
+
+def trim_silence(path: str, output_path: str) -> Tuple[float, float, list]:
+    """
+    Cut silence and dead air longer than TRIM_SILENCE_MIN_SECONDS out of a recording
+    
+    Returns the duration before and after trimming and a time map of
+    [trimmed_start, original_start, length] entries, one per kept stretch,
+    for map_to_original.
     """
+    duration, silences = detect_silences(path, config.TRIM_SILENCE_MIN_SECONDS)
+    regions = speech_regions(duration, silences, config.TRIM_SILENCE_PADDING_SECONDS)
+    
+    time_map = []
+    position = 0.0
+    for start, end in regions:
+        time_map.append([round(position, 3), round(start, 3), round(end - start, 3)])
+        position += end - start
+    if not regions:
+        return duration, 0.0, time_map
+    
+    # The selection can be long, so it is passed to ffmpeg as a filter script
+    selection = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in regions)
+    script_path = f"{output_path}.filter"
+    with open(script_path, "w") as f:
+        f.write(f"aselect='{selection}',asetpts=N/SR/TB")
     try:
-        # Validate file first
-        await validate_media_file(file)
-        
-        # Read file content
-        content = await file.read()
-        filename = file.filename
+        result = subprocess.run(
+            [config.FFMPEG_PATH, "-hide_banner", "-nostats", "-loglevel", "error", "-y",
+             "-i", path, "-filter_script:a", script_path, *AUDIO_ENCODE_ARGS, output_path],
+            capture_output=True, text=True, errors="replace"
+        )
+    finally:
+        os.unlink(script_path)
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg could not trim silence: {result.stderr.strip()[-300:]}")
+    return duration, position, time_map
+
+
+def map_to_original(time_map: list, seconds: float) -> float:
+    """Map a position in trimmed audio back to the same moment in the original recording"""
+    for trimmed_start, original_start, length in reversed(time_map):
+        if seconds >= trimmed_start:
+            return original_start + min(seconds - trimmed_start, length)
+    return seconds
+
+
+def extract_segment(path: str, start: float, end: float, output_path: str):
+    """Cut one segment of a recording into a compact audio file"""
+    result = subprocess.run(
+        [config.FFMPEG_PATH, "-hide_banner", "-nostats", "-loglevel", "error", "-y",
+         "-ss", f"{start:.3f}", "-i", path, "-t", f"{end - start:.3f}", *AUDIO_ENCODE_ARGS, output_path],
+        capture_output=True, text=True, errors="replace"
+    )
+    if result.returncode != 0:
+        raise ValueError(f"ffmpeg could not cut segment {start:.0f}-{end:.0f}s: {result.stderr.strip()[-300:]}")
+
+
+def _words(text: str) -> List[str]:
+    """Lowercase words without punctuation, for comparing segment boundaries"""
+    return [re.sub(r"[^\w']", "", word.lower()) for word in text.split()]
+
+
+def stitch_transcripts(transcripts: List[str], window: int = 40, min_match: int = 3) -> str:
+    """
+    Join segment transcripts, removing the words repeated in each overlap
+    
+    The end of each transcript is matched against the start of the next; the
+    longest common run of at least min_match words is kept only once.
+    """
+    stitched = []
+    for text in transcripts:
+        words = text.split()
+        if not words:
+            continue
+        if stitched:
+            tail = stitched[-window:]
+            matcher = difflib.SequenceMatcher(None, _words(" ".join(tail)), _words(" ".join(words[:window])), autojunk=False)
+            match = matcher.find_longest_match(0, len(tail), 0, min(window, len(words)))
+            if match.size >= min_match:
+                # Keep the earlier copy of the overlap and drop everything after it
+                del stitched[len(stitched) - len(tail) + match.a + match.size:]
+                words = words[match.b + match.size:]
+        stitched.extend(words)
+    return " ".join(stitched)
+
+
+def transcribe_segments(path: str) -> str:
+    """
+    Transcribe a long recording as overlapping segments in parallel
+    
+    Segments are cut at silences with ffmpeg, transcribed concurrently (bounded
+    by TRANSCRIPTION_CONCURRENCY across all requests) and stitched back in order.
+    """
+    duration, silences = detect_silences(path)
+    segments = plan_segments(
+        duration, silences, config.TRANSCRIPTION_SEGMENT_SECONDS, config.TRANSCRIPTION_OVERLAP_SECONDS
+    )
+    print(f"Transcribing {duration / 60:.1f} minutes as {len(segments)} segments")
+    
+    with tempfile.TemporaryDirectory() as segment_dir:
+        def transcribe_segment(index: int) -> str:
+            start, end = segments[index]
+            segment_path = os.path.join(segment_dir, f"segment_{index:04d}{AUDIO_EXTENSION}")
+            extract_segment(path, start, end, segment_path)
+            return _transcribe_request(segment_path)
         
-        # Create a temporary file with the correct extension
-        file_ext = os.path.splitext(filename)[1]
+        with ThreadPoolExecutor(max_workers=config.TRANSCRIPTION_CONCURRENCY) as executor:
+            transcripts = list(executor.map(transcribe_segment, range(len(segments))))
+    
+    return stitch_transcripts(transcripts)
+
+
+def transcribe_audio(path: str, duration: float, trim: bool = False) -> Tuple[str, dict]:
+    """
+    Reduce a recording to compact speech audio and transcribe it
+    
+    Only the extracted audio is uploaded; it is split into parallel segments
+    when it is longer than one segment or too large for a single request.
+    With trim, silence and dead air are cut out first. Returns the transcript
+    and media stats (durations, percentage removed and the time map).
+    """
+    media_stats = {"duration_seconds": round(duration, 1), "transcribed_seconds": round(duration, 1)}
+    with tempfile.TemporaryDirectory() as work_dir:
+        audio_path = os.path.join(work_dir, f"audio{AUDIO_EXTENSION}")
+        extract_audio(path, audio_path)
+        print(f"Extracted audio: {os.path.getsize(path) / (1024 * 1024):.1f}MB -> {os.path.getsize(audio_path) / (1024 * 1024):.1f}MB")
         
-        # For video files, we'll pass directly to Whisper
-        # Whisper API can handle video files and extract audio automatically
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        if trim:
+            trimmed_path = os.path.join(work_dir, f"trimmed{AUDIO_EXTENSION}")
+            original_duration, duration, time_map = trim_silence(audio_path, trimmed_path)
+            removed_percent = round(100 * (1 - duration / original_duration), 1) if original_duration else 0.0
+            media_stats.update({
+                "transcribed_seconds": round(duration, 1),
+                "removed_percent": removed_percent,
+                "time_map": time_map
+            })
+            print(f"Trimmed silence: {original_duration:.0f}s -> {duration:.0f}s ({removed_percent}% removed)")
+            if not time_map:
+                return "", media_stats
+            audio_path = trimmed_path
         
+        if os.path.getsize(audio_path) > MAX_FILE_SIZE or duration > config.TRANSCRIPTION_SEGMENT_SECONDS:
+            return transcribe_segments(audio_path), media_stats
+        return _transcribe_request(audio_path), media_stats
+
+
+def transcribe_media_path(path: str, trim: bool = False) -> Tuple[str, dict]:
+    """
+    Transcribe an audio/video file on disk to text using OpenAI Whisper API
+    
+    The duration is checked before anything is uploaded, then the audio track is
+    extracted and downsampled with ffmpeg (and optionally trimmed of silence).
+    Without ffmpeg/ffprobe the file is sent as it is, which only works within
+    Whisper's 25MB limit. Returns the transcript and media stats.
+    """
+    try:
         try:
-            # Transcribe using OpenAI Whisper API
-            with open(temp_file_path, 'rb') as audio_file:
-                transcript = client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
-                )
-            
-            if not transcript or not transcript.strip():
+            duration = get_media_duration(path)
+        except FileNotFoundError:
+            duration = None
+        
+        if duration is None:
+            if os.path.getsize(path) > MAX_FILE_SIZE:
                 raise HTTPException(
                     status_code=400,
-                    detail="No speech detected in the media file. Please upload a file with clear audio content."
+                    detail=f"Files over {MAX_FILE_SIZE // (1024 * 1024)}MB need ffmpeg installed on the server."
                 )
-            
-            return transcript.strip()
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            # Whisper API can handle video files and extract audio automatically
+            transcript, media_stats = _transcribe_request(path), {}
+        elif duration > config.MAX_MEDIA_MINUTES * 60:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Recording is too long ({duration / 60:.0f} minutes). Maximum length is {config.MAX_MEDIA_MINUTES} minutes."
+            )
+        else:
+            transcript, media_stats = transcribe_audio(path, duration, trim)
+        
+        if not transcript or not transcript.strip():
+            raise HTTPException(
+                status_code=400,
+                detail="No speech detected in the media file. Please upload a file with clear audio content."
+            )
+        
+        return transcript.strip(), media_stats
     
     except HTTPException:
         raise
@@ -103,6 +400,20 @@ async def transcribe_media_file(file: UploadFile) -> str:
         )
 
 
+async def transcribe_media_file(file: UploadFile) -> str:
+    """
+    Transcribe an uploaded audio/video file to text using OpenAI Whisper API
+    """
+    temp_file_path, _ = await save_media_upload(file)
+    try:
+        transcript, _ = transcribe_media_path(temp_file_path)
+        return transcript
+    finally:
+        # Clean up temporary file
+        if os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+
+
 def validate_transcript_length(text: str, max_chars: int = 15000) -> bool:
     """
     Validate that transcript is not too long for processing
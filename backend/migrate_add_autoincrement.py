@@ -0,0 +1,83 @@
+"""
+Database migration to make paper, evaluation and question bank IDs AUTOINCREMENT
+Without it SQLite reuses the largest deleted rowid, so a new paper could take
+the ID of one that was just archived, and a banked question the ID of one whose
+insert was rolled back (leaving its vector behind in the vector index). Rebuilds
+the tables with AUTOINCREMENT and starts their sequences above every live and
+archived ID.
+"""
+import sqlite3
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable, CreateIndex
+from database import Paper, Evaluation, BankQuestion
+
+# (live table, archive table or None)
+TABLES = [
+    (Paper.__table__, "archived_papers"),
+    (Evaluation.__table__, "archived_evaluations"),
+    (BankQuestion.__table__, None)
+]
+
+def _max_id(cursor, table: str) -> int:
+    if table is None:
+        return 0
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if not exists:
+        return 0
+    return cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+
+def migrate_add_autoincrement():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        conn.execute("PRAGMA foreign_keys = OFF")
+        cursor = conn.cursor()
+        dialect = sqlite.dialect()
+        
+        print("Starting migration to make paper, evaluation and question bank IDs AUTOINCREMENT...")
+        
+        for table, archive_table in TABLES:
+            name = table.name
+            sql = cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+            if sql is None:
+                print(f"- {name} table not found, skipping")
+                continue
+            
+            if "AUTOINCREMENT" in sql[0].upper():
+                print(f"✓ {name} already uses AUTOINCREMENT")
+            else:
+                # Copy into a new table, then swap it in (SQLite cannot alter a primary key)
+                existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({name})")}
+                columns = ", ".join(column.name for column in table.columns if column.name in existing)
+                create = str(CreateTable(table).compile(dialect=dialect))
+                cursor.execute(create.replace(f"CREATE TABLE {name} (", f"CREATE TABLE {name}_new (", 1))
+                cursor.execute(f"INSERT INTO {name}_new ({columns}) SELECT {columns} FROM {name}")
+                cursor.execute(f"DROP TABLE {name}")
+                cursor.execute(f"ALTER TABLE {name}_new RENAME TO {name}")
+                for index in table.indexes:
+                    cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+                print(f"✓ Rebuilt {name} with AUTOINCREMENT")
+            
+            # New IDs start above every ID handed out so far, archived ones included
+            high = max(_max_id(cursor, name), _max_id(cursor, archive_table))
+            current = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (name,)).fetchone()
+            if current is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, high))
+            elif current[0] < high:
+                cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (high, name))
+            print(f"✓ {name} IDs continue after {max(high, current[0] if current else 0)}")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("Paper, evaluation and question bank IDs are never reused.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_add_autoincrement()
@@ -0,0 +1,62 @@
+"""
+Database migration to add the document library
+Creates the documents table and links papers to it
+"""
+import sqlite3
+
+def migrate_add_documents():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        cursor = conn.cursor()
+        
+        print("Starting migration to add document library...")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                subject TEXT,
+                text_hash TEXT NOT NULL,
+                char_count INTEGER NOT NULL,
+                created_at TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_documents_user_id ON documents (user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_documents_text_hash ON documents (text_hash)")
+        print("✓ Created documents table")
+        
+        # Databases migrated before subjects were added need the column
+        cursor.execute("PRAGMA table_info(documents)")
+        document_columns = [col[1] for col in cursor.fetchall()]
+        if 'subject' not in document_columns:
+            cursor.execute("ALTER TABLE documents ADD COLUMN subject TEXT")
+            print("✓ Added subject column to documents")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_documents_subject ON documents (subject)")
+        
+        # Check if document_id column exists in papers table
+        cursor.execute("PRAGMA table_info(papers)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'document_id' not in columns:
+            cursor.execute("ALTER TABLE papers ADD COLUMN document_id INTEGER REFERENCES documents(id)")
+            print("✓ Added document_id column to papers")
+        else:
+            print("✓ document_id column already exists")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("Papers generated from now on keep their source document in the library.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_add_documents()
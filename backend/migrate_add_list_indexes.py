@@ -0,0 +1,36 @@
+"""
+Database migration to add the list endpoint indexes
+Creates composite indexes so paper and evaluation lists page by date per user
+"""
+import sqlite3
+
+def migrate_add_list_indexes():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        cursor = conn.cursor()
+        
+        print("Starting migration to add list indexes...")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_papers_user_created ON papers (user_id, created_at, id)")
+        print("✓ Created ix_papers_user_created index")
+        
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_evaluations_user_evaluated ON evaluations (user_id, evaluated_at, id)")
+        print("✓ Created ix_evaluations_user_evaluated index")
+        
+        cursor.execute("ANALYZE")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("Paper and evaluation lists are now paginated from an index.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_add_list_indexes()
@@ -0,0 +1,57 @@
+"""
+Database migration to add the transcript cache
+Creates the media_transcripts table and links media papers to their recording
+"""
+import sqlite3
+
+def migrate_add_media_cache():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        cursor = conn.cursor()
+        
+        print("Starting migration to add transcript cache...")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS media_transcripts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                media_hash TEXT NOT NULL,
+                trimmed BOOLEAN NOT NULL DEFAULT 0,
+                media_type TEXT,
+                transcript TEXT NOT NULL,
+                media_stats TEXT,
+                char_count INTEGER NOT NULL,
+                created_at TIMESTAMP,
+                last_used_at TIMESTAMP,
+                CONSTRAINT uq_media_transcripts_hash_trimmed UNIQUE (media_hash, trimmed)
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_transcripts_media_hash ON media_transcripts (media_hash)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_media_transcripts_last_used_at ON media_transcripts (last_used_at)")
+        print("✓ Created media_transcripts table")
+        
+        # Check if media_hash column exists in papers table
+        cursor.execute("PRAGMA table_info(papers)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if 'media_hash' not in columns:
+            cursor.execute("ALTER TABLE papers ADD COLUMN media_hash TEXT")
+            print("✓ Added media_hash column to papers")
+        else:
+            print("✓ media_hash column already exists")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_papers_media_hash ON papers (media_hash)")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("Transcripts of uploaded recordings are now reused.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_add_media_cache()
@@ -0,0 +1,67 @@
+"""
+Database migration to add the question bank
+Creates the question_bank table and links paper questions to banked questions
+"""
+import sqlite3
+
+def migrate_add_question_bank():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        cursor = conn.cursor()
+        
+        print("Starting migration to add question bank...")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS question_bank (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_hash VARCHAR(64) NOT NULL UNIQUE,
+                grade VARCHAR(50) NOT NULL,
+                subject VARCHAR(100) NOT NULL,
+                chapter VARCHAR(200) NOT NULL,
+                topic VARCHAR(200) NOT NULL DEFAULT '',
+                question_type VARCHAR(50) NOT NULL,
+                marks INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                options TEXT,
+                answer TEXT,
+                use_count INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_question_bank_id ON question_bank (id)")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ix_question_bank_lookup
+            ON question_bank (grade, subject, chapter, question_type, marks)
+        """)
+        print("✓ Created question_bank table")
+        
+        # Check if bank_question_id column exists in questions table
+        cursor.execute("PRAGMA table_info(questions)")
+        columns = [col[1] for col in cursor.fetchall()]
+        
+        if not columns:
+            print("❌ questions table not found - run migrate_add_questions.py first")
+            conn.close()
+            return
+        if 'bank_question_id' not in columns:
+            cursor.execute("ALTER TABLE questions ADD COLUMN bank_question_id INTEGER REFERENCES question_bank (id)")
+            print("✓ Added bank_question_id column to questions")
+        else:
+            print("✓ bank_question_id column already exists")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_questions_bank_question_id ON questions (bank_question_id)")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("Run 'python question_bank.py --backfill' to bank questions from existing papers.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_add_question_bank()
@@ -0,0 +1,98 @@
+"""
+Database migration to add the questions table
+Creates the normalized questions table and backfills it from each paper's
+questions JSON in batches, so large databases never load every blob at once
+"""
+import json
+import sqlite3
+from compression import decompress_text
+
+BATCH_SIZE = 500
+
+def migrate_add_questions():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        cursor = conn.cursor()
+        
+        print("Starting migration to add questions table...")
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                paper_id INTEGER NOT NULL REFERENCES papers (id),
+                number INTEGER NOT NULL,
+                question_type VARCHAR(50) NOT NULL,
+                marks INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                options TEXT,
+                answer TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_questions_id ON questions (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_questions_paper_number ON questions (paper_id, number)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_questions_question_type ON questions (question_type)")
+        conn.commit()
+        print("✓ Created questions table")
+        
+        # Walk papers in id order, one batch at a time, skipping any already backfilled
+        last_id = 0
+        papers_done = 0
+        questions_done = 0
+        skipped = 0
+        while True:
+            rows = cursor.execute("""
+                SELECT p.id, p.questions FROM papers p
+                WHERE p.id > ? AND NOT EXISTS (SELECT 1 FROM questions q WHERE q.paper_id = p.id)
+                ORDER BY p.id LIMIT ?
+            """, (last_id, BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            
+            question_rows = []
+            for paper_id, blob in rows:
+                try:
+                    questions = json.loads(decompress_text(blob))
+                except (TypeError, ValueError):
+                    skipped += 1
+                    continue
+                for q in questions:
+                    options = q.get("options")
+                    answer = q.get("correct_answer")
+                    question_rows.append((
+                        paper_id,
+                        int(q["question_number"]),
+                        str(q.get("question_type", "")),
+                        int(q.get("marks", 0)),
+                        str(q.get("question_text", "")),
+                        json.dumps(options) if options else None,
+                        str(answer) if answer is not None else None
+                    ))
+                papers_done += 1
+            
+            cursor.executemany("""
+                INSERT INTO questions (paper_id, number, question_type, marks, text, options, answer)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, question_rows)
+            conn.commit()
+            questions_done += len(question_rows)
+            last_id = rows[-1][0]
+            print(f"  ... backfilled {papers_done} papers")
+        
+        print(f"✓ Backfilled {questions_done} questions from {papers_done} papers")
+        if skipped:
+            print(f"⚠ Skipped {skipped} papers with unreadable questions JSON")
+        
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("Papers and evaluations now read questions from the questions table.")
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_add_questions()
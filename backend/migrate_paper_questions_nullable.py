@@ -0,0 +1,56 @@
+"""
+Database migration to make the papers questions JSON column nullable
+New papers keep their questions only in the questions table, so the JSON
+blob is left empty. SQLite cannot drop NOT NULL in place, so the papers
+table is rebuilt, keeping its AUTOINCREMENT sequence.
+"""
+import sqlite3
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateTable, CreateIndex
+from database import Paper
+
+def migrate_paper_questions_nullable():
+    conn = None
+    try:
+        conn = sqlite3.connect('oxford_papers.db')
+        conn.execute("PRAGMA foreign_keys = OFF")
+        cursor = conn.cursor()
+        dialect = sqlite.dialect()
+        table = Paper.__table__
+        
+        print("Starting migration to make papers.questions nullable...")
+        
+        columns = {row[1]: row for row in cursor.execute("PRAGMA table_info(papers)")}
+        if not columns:
+            print("- papers table not found, skipping")
+        elif not columns["questions"][3]:
+            print("✓ papers.questions is already nullable")
+        else:
+            # Copy into a new table, then swap it in; the sequence is restored afterwards
+            sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'papers'").fetchone()
+            names = ", ".join(column.name for column in table.columns if column.name in columns)
+            create = str(CreateTable(table).compile(dialect=dialect))
+            cursor.execute(create.replace("CREATE TABLE papers (", "CREATE TABLE papers_new (", 1))
+            cursor.execute(f"INSERT INTO papers_new ({names}) SELECT {names} FROM papers")
+            cursor.execute("DROP TABLE papers")
+            cursor.execute("ALTER TABLE papers_new RENAME TO papers")
+            for index in table.indexes:
+                cursor.execute(str(CreateIndex(index).compile(dialect=dialect)))
+            if sequence is not None:
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'papers'", (sequence[0],))
+            print("✓ Rebuilt papers with a nullable questions column")
+        
+        conn.commit()
+        conn.close()
+        
+        print("\n✅ Database migration completed successfully!")
+        print("New papers are stored in the questions table only.")
+    
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        if conn:
+            conn.rollback()
+            conn.close()
+
+if __name__ == "__main__":
+    migrate_paper_questions_nullable()
@@ -0,0 +1,271 @@
+"""
+Near-Duplicate Question Index
+MinHash signatures of question text with LSH banding, stored in a local SQLite
+file and updated incrementally as questions are banked, so paraphrased repeats
+are found with a handful of index seeks however large the bank grows
+
+Usage:
+    python minhash_index.py --rebuild    # index every question in the bank
+"""
+import os
+import zlib
+import random
+import sqlite3
+import struct
+import hashlib
+import argparse
+import threading
+from array import array
+from typing import Iterable, List, Optional, Sequence, Tuple
+from retrieval_index import tokenize
+import config
+
+INDEX_PATH = config.MINHASH_INDEX_PATH
+DUPLICATE_THRESHOLD = config.NEAR_DUPLICATE_THRESHOLD
+
+# 16 bands of 4 rows: pairs above ~0.5 estimated Jaccard almost always share a bucket
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+MAX_CANDIDATES = 500
+
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_local = threading.local()
+
+
+def shingles(text: str) -> set:
+    """Word unigrams and bigrams of the normalized text"""
+    tokens = tokenize(text)
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+def signature(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of a question, or None if it has no words to compare"""
+    hashes = [zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(text)]
+    if not hashes:
+        return None
+    return tuple(min(((a * h + b) % _PRIME) & _MASK for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+
+def scope_key(*tags: Optional[str]) -> int:
+    """Integer key for a grade/subject/chapter scope so lookups can stay within it"""
+    joined = "\n".join(" ".join(str(tag).split()).lower() if tag else "" for tag in tags)
+    return int.from_bytes(hashlib.blake2b(joined.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def _bands(sig: Sequence[int]):
+    for band in range(BANDS):
+        rows = struct.pack(f"<{ROWS}I", *sig[band * ROWS:(band + 1) * ROWS])
+        yield band, int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), "big", signed=True)
+
+
+def _connect() -> sqlite3.Connection:
+    """The calling thread's connection to the index (created on first use)"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(INDEX_PATH)), exist_ok=True)
+        conn = sqlite3.connect(INDEX_PATH, timeout=30)
+        conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS signatures (
+                question_id INTEGER PRIMARY KEY,
+                scope INTEGER NOT NULL,
+                signature BLOB NOT NULL
+            );
+        """)
+        _create_buckets(conn)
+        _local.conn = conn
+    return conn
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _create_buckets(conn: sqlite3.Connection) -> None:
+    """
+    Create the LSH buckets table, keyed by scope within each bucket so scoped
+    lookups seek straight to their own questions
+
+    Indexes built before buckets carried the scope are converted in place.
+    """
+    if "scope" in _columns(conn, "buckets"):
+        return
+    with conn:
+        # Another process may have got here first
+        conn.execute("BEGIN IMMEDIATE")
+        columns = _columns(conn, "buckets")
+        if "scope" in columns:
+            return
+        conn.execute("""
+            CREATE TABLE buckets_new (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                scope INTEGER NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, scope, question_id)
+            ) WITHOUT ROWID
+        """)
+        if columns:
+            conn.execute("""
+                INSERT INTO buckets_new (band, bucket, scope, question_id)
+                SELECT b.band, b.bucket, s.scope, b.question_id
+                FROM buckets b JOIN signatures s ON s.question_id = b.question_id
+            """)
+            conn.execute("DROP TABLE buckets")
+        conn.execute("ALTER TABLE buckets_new RENAME TO buckets")
+
+
+def add_questions(items: Iterable[Tuple[int, str, int]]) -> int:
+    """
+    Index (question_id, text, scope) items in one transaction
+
+    Questions already in the index are replaced. Returns the number indexed.
+    """
+    conn = _connect()
+    count = 0
+    with conn:
+        for question_id, text, scope in items:
+            sig = signature(text)
+            if sig is None:
+                continue
+            previous = conn.execute(
+                "SELECT scope, signature FROM signatures WHERE question_id = ?", (question_id,)
+            ).fetchone()
+            if previous:
+                conn.executemany(
+                    "DELETE FROM buckets WHERE band = ? AND bucket = ? AND scope = ? AND question_id = ?",
+                    [(band, bucket, previous[0], question_id) for band, bucket in _bands(array("I", previous[1]))]
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO signatures (question_id, scope, signature) VALUES (?, ?, ?)",
+                (question_id, scope, array("I", sig).tobytes())
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO buckets (band, bucket, scope, question_id) VALUES (?, ?, ?, ?)",
+                [(band, bucket, scope, question_id) for band, bucket in _bands(sig)]
+            )
+            count += 1
+    return count
+
+
+def query(
+    text: Optional[str] = None,
+    sig: Optional[Sequence[int]] = None,
+    scope: Optional[int] = None,
+    threshold: float = DUPLICATE_THRESHOLD,
+    limit: int = 10
+) -> List[Tuple[int, float]]:
+    """
+    Indexed questions similar to text (or a precomputed signature), most similar first
+
+    Returns (question_id, estimated Jaccard) pairs at or above threshold,
+    optionally only those indexed under scope. The scope is applied in each
+    bucket seek, so other scopes never use up the candidate cap.
+    """
+    if sig is None:
+        sig = signature(text or "")
+    if sig is None:
+        return []
+
+    conn = _connect()
+    # One primary-key seek per band
+    candidate_ids = set()
+    for band, bucket in _bands(sig):
+        if scope is None:
+            rows = conn.execute(
+                "SELECT question_id FROM buckets WHERE band = ? AND bucket = ? LIMIT ?", (band, bucket, MAX_CANDIDATES)
+            )
+        else:
+            rows = conn.execute(
+                "SELECT question_id FROM buckets WHERE band = ? AND bucket = ? AND scope = ? LIMIT ?",
+                (band, bucket, scope, MAX_CANDIDATES)
+            )
+        candidate_ids.update(row[0] for row in rows)
+        if len(candidate_ids) >= MAX_CANDIDATES:
+            break
+    if not candidate_ids:
+        return []
+
+    matches = []
+    rows = conn.execute(
+        f"SELECT question_id, signature FROM signatures WHERE question_id IN ({', '.join('?' * len(candidate_ids))})",
+        list(candidate_ids)
+    )
+    for question_id, blob in rows:
+        score = similarity(sig, array("I", blob))
+        if score >= threshold:
+            matches.append((question_id, score))
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches[:limit]
+
+
+def filter_near_duplicates(
+    questions: List[dict],
+    existing: Optional[List[dict]] = None,
+    threshold: float = DUPLICATE_THRESHOLD
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Split questions into (kept, dropped), dropping any that paraphrase an
+    earlier question or one of the existing questions
+
+    Compares signatures pairwise, which is cheap at the size of one paper.
+    """
+    seen = [sig for sig in (signature(q.get("question_text", "")) for q in existing or []) if sig]
+    kept, dropped = [], []
+    for question in questions:
+        sig = signature(question.get("question_text", ""))
+        if sig and any(similarity(sig, other) >= threshold for other in seen):
+            dropped.append(question)
+            continue
+        if sig:
+            seen.append(sig)
+        kept.append(question)
+    return kept, dropped
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Index every question in the bank"""
+    from database import SessionLocal, BankQuestion
+    db = SessionLocal()
+    try:
+        indexed = 0
+        last_id = 0
+        while True:
+            rows = db.query(
+                BankQuestion.id, BankQuestion.text, BankQuestion.grade, BankQuestion.subject, BankQuestion.chapter
+            ).filter(BankQuestion.id > last_id).order_by(BankQuestion.id).limit(batch_size).all()
+            if not rows:
+                return indexed
+            indexed += add_questions(
+                (row.id, row.text, scope_key(row.grade, row.subject, row.chapter)) for row in rows
+            )
+            last_id = rows[-1].id
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the near-duplicate question index")
+    parser.add_argument("--rebuild", action="store_true", help="Index every question in the bank")
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    print(f"✅ Indexed {rebuild()} questions")
+
+
+if __name__ == "__main__":
+    main()
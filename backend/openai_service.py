@@ -96,6 +96,84 @@ Make sure questions are curriculum-appropriate, challenging, and test understand
         raise Exception(f"Error generating paper with AI: {str(e)}")
 
 
+def generate_questions_with_ai(grade: str, subject: str, chapter: str, counts: dict, topic: str = None,
+                               avoid: list = None) -> list:
+    """Generate only the questions a paper assembled from the question bank is missing"""
+    
+    topic_info = f" focusing on {topic}" if topic else ""
+    section_formats = {
+        "MCQ": "Multiple Choice Questions, 2 marks each, each with 4 options (A, B, C, D)",
+        "Short Answer": "Short answer questions, 5 marks each, requiring brief explanations or calculations",
+        "Long Answer": "Long answer questions, 10 marks each, requiring detailed explanations or problem-solving"
+    }
+    requested = "\n".join(
+        f"   - EXACTLY {count} {section_formats[question_type]} (question_type \"{question_type}\")"
+        for question_type, count in counts.items() if count > 0
+    )
+    avoid_info = ""
+    if avoid:
+        avoid_list = "\n".join(f"- {text}" for text in avoid)
+        avoid_info = f"\n\nThe paper already contains these questions. Do NOT repeat or closely paraphrase them:\n{avoid_list}"
+    
+    prompt = f"""Generate additional examination questions following the Oxford Curriculum pattern for:
+Grade: {grade}
+Subject: {subject}
+Chapter: {chapter}{topic_info}
+
+Generate ONLY these questions:
+{requested}{avoid_info}
+
+Return the response in this EXACT JSON format:
+{{
+  "questions": [
+    {{
+      "question_number": 1,
+      "question_type": "MCQ",
+      "question_text": "Question text here",
+      "marks": 2,
+      "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
+      "correct_answer": "A) Option 1"
+    }},
+    {{
+      "question_number": 2,
+      "question_type": "Short Answer",
+      "question_text": "Question text here",
+      "marks": 5,
+      "correct_answer": "Expected answer or key points"
+    }}
+  ]
+}}
+
+Make sure questions are curriculum-appropriate, challenging, and test understanding at multiple cognitive levels."""
+
+    try:
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are an expert Oxford curriculum examination paper creator. Generate well-structured, academically rigorous questions. You MUST generate ALL questions as specified. Always respond with valid JSON only."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=4096
+        )
+        
+        content = response.choices[0].message.content.strip()
+        
+        # Clean up the response if it has markdown code blocks
+        if content.startswith("```json"):
+            content = content[7:]
+        if content.startswith("```"):
+            content = content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        content = content.strip()
+        
+        return json.loads(content)["questions"]
+        
+    except Exception as e:
+        raise Exception(f"Error generating questions with AI: {str(e)}")
+
+
 def evaluate_paper_with_ai(questions: list, student_answers: dict) -> dict:
     """Evaluate student answers using OpenAI"""
     
@@ -133,7 +211,7 @@ def evaluate_paper_with_ai(questions: list, student_answers: dict) -> dict:
             evaluation_details.append(f"""
 Question {q_num} ({q['marks']} marks) - MCQ:
 Question: {q['question_text']}
-Options: {', '.join(q.get('options', []))}
+Options: {', '.join(q.get('options') or [])}
 Correct Answer: {correct_ans_letter}
 Student's Answer: {student_ans_letter}
 """)
@@ -282,7 +360,7 @@ def generate_paper_from_document(document_text: str, num_mcqs: int, num_short_qu
     prompt = f"""You are an expert examination paper creator. Based on the following document content, generate examination questions.
 
 DOCUMENT CONTENT:
-{document_text[:10000]}
+{document_text[:config.DOCUMENT_PROMPT_CHARS]}
 
 REQUIREMENTS:
 Generate EXACTLY the following questions based on the document content:
@@ -0,0 +1,67 @@
+"""
+Keyset Pagination
+Opaque cursors over (timestamp, id) so list endpoints seek straight to the next
+page through a composite index instead of counting past earlier rows
+"""
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import config
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Clamp a requested page size to the configured bounds"""
+    if not limit or limit < 1:
+        return config.LIST_PAGE_SIZE
+    return min(limit, config.LIST_MAX_PAGE_SIZE)
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Cursor pointing just past the given row"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Parse a cursor from encode_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _page_statement(query, timestamp_column, id_column, cursor: Optional[str], limit: int):
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(timestamp_column, id_column) < tuple_(timestamp, row_id))
+    return query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1)
+
+
+def _split_page(rows, timestamp_column, id_column, limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
+
+
+def paginate(query, timestamp_column, id_column, cursor: Optional[str], limit: int):
+    """
+    Fetch one page of a query, newest first
+    
+    Returns (rows, next_cursor); next_cursor is None on the last page. The
+    query's rows must expose the timestamp and id columns by name.
+    """
+    rows = _page_statement(query, timestamp_column, id_column, cursor, limit).all()
+    return _split_page(rows, timestamp_column, id_column, limit)
+
+
+async def paginate_async(db: AsyncSession, statement, timestamp_column, id_column, cursor: Optional[str], limit: int):
+    """paginate() for a select() statement run on an AsyncSession"""
+    result = await db.execute(_page_statement(statement, timestamp_column, id_column, cursor, limit))
+    return _split_page(result.all(), timestamp_column, id_column, limit)
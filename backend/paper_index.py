@@ -0,0 +1,208 @@
+"""
+Paper Search Index
+Per-user SQLite FTS5 index over saved papers' chapter, topic, document name and
+question text, with faceted counts by subject, grade and paper type
+"""
+import os
+import re
+import json
+import sqlite3
+from typing import Optional, List
+from sqlalchemy.orm import Session, selectinload
+from database import Paper, ArchivedPaper
+from question_store import paper_questions
+import config
+
+INDEX_DIR = config.PAPER_SEARCH_DIR
+
+FACETS = ("subject", "grade", "paper_type")
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _connect(user_id: int) -> sqlite3.Connection:
+    """Open (and create if needed) the user's paper index file"""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(INDEX_DIR, f"papers_{user_id}.db"), timeout=30)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS papers (
+            paper_id INTEGER PRIMARY KEY,
+            subject TEXT,
+            grade TEXT,
+            paper_type TEXT,
+            chapter TEXT,
+            topic TEXT,
+            document_name TEXT,
+            total_marks INTEGER,
+            created_at TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_papers_created ON papers (created_at, paper_id);
+        CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+            chapter, topic, document_name, questions,
+            tokenize = 'porter unicode61'
+        );
+    """)
+    return conn
+
+
+def _question_text(paper) -> str:
+    """Flatten a paper's questions (rows, or the JSON of archived and older papers) into searchable text"""
+    try:
+        questions = paper_questions(paper) if isinstance(paper, Paper) else json.loads(paper.questions)
+    except (TypeError, ValueError):
+        return ""
+    parts = []
+    for q in questions:
+        parts.append(str(q.get("question_text", "")))
+        parts.extend(str(option) for option in q.get("options") or [])
+    return "\n".join(parts)
+
+
+def _insert(conn: sqlite3.Connection, paper) -> None:
+    """Index a Paper or ArchivedPaper (they share these columns)"""
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO papers
+            (paper_id, subject, grade, paper_type, chapter, topic, document_name, total_marks, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (paper.id, paper.subject, paper.grade, paper.paper_type, paper.chapter, paper.topic,
+         paper.document_name, paper.total_marks, paper.created_at.isoformat())
+    )
+    conn.execute("DELETE FROM papers_fts WHERE rowid = ?", (paper.id,))
+    conn.execute(
+        "INSERT INTO papers_fts (rowid, chapter, topic, document_name, questions) VALUES (?, ?, ?, ?, ?)",
+        (paper.id, paper.chapter or "", paper.topic or "", paper.document_name or "", _question_text(paper))
+    )
+
+
+def add_paper(paper: Paper) -> None:
+    """Add or replace one saved paper in its owner's index"""
+    conn = _connect(paper.user_id)
+    try:
+        with conn:
+            _insert(conn, paper)
+    finally:
+        conn.close()
+
+
+def ensure_papers_indexed(db: Session, user_id: int, batch_size: int = 200) -> int:
+    """
+    Index any of the user's papers that are not in the search index yet
+
+    Counts are compared first so an up-to-date index costs one query. Returns
+    the number of papers added.
+    """
+    conn = _connect(user_id)
+    try:
+        # Archived papers stay in the index, so they are still found
+        indexed_count = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        if indexed_count == (
+            db.query(Paper.id).filter(Paper.user_id == user_id).count()
+            + db.query(ArchivedPaper.id).filter(ArchivedPaper.user_id == user_id).count()
+        ):
+            return 0
+
+        # Papers archived before they were indexed are indexed from the archive
+        indexed = {row[0] for row in conn.execute("SELECT paper_id FROM papers")}
+        added = 0
+        with conn:
+            for table in (Paper, ArchivedPaper):
+                missing = [
+                    row[0] for row in db.query(table.id).filter(table.user_id == user_id)
+                    if row[0] not in indexed
+                ]
+                for start in range(0, len(missing), batch_size):
+                    batch = db.query(table).filter(table.id.in_(missing[start:start + batch_size]))
+                    if table is Paper:
+                        batch = batch.options(selectinload(Paper.question_rows))
+                    for paper in batch:
+                        _insert(conn, paper)
+                added += len(missing)
+        return added
+    finally:
+        conn.close()
+
+
+def _match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix"""
+    words = WORD_RE.findall(query)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search(
+    user_id: int,
+    query: Optional[str] = None,
+    filters: Optional[dict] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> dict:
+    """
+    Search the user's papers, best match first (newest first without a query)
+
+    Facet counts for each field ignore that field's own filter, so the other
+    values stay selectable. Returns total, facets and one page of papers.
+    """
+    filters = {field: value for field, value in (filters or {}).items() if field in FACETS and value}
+    match = _match_expression(query or "")
+
+    conn = _connect(user_id)
+    try:
+        def where(skip: Optional[str] = None, with_match: bool = True):
+            clauses, params = [], []
+            if match and with_match:
+                clauses.append("p.paper_id IN (SELECT rowid FROM papers_fts WHERE papers_fts MATCH ?)")
+                params.append(match)
+            for field, value in filters.items():
+                if field != skip:
+                    clauses.append(f"p.{field} = ?")
+                    params.append(value)
+            return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+        clause, params = where()
+        total = conn.execute(f"SELECT COUNT(*) FROM papers p{clause}", params).fetchone()[0]
+
+        facets = {}
+        for field in FACETS:
+            facet_clause, facet_params = where(skip=field)
+            rows = conn.execute(
+                f"""
+                SELECT p.{field}, COUNT(*) FROM papers p{facet_clause}
+                GROUP BY p.{field} ORDER BY COUNT(*) DESC, p.{field}
+                """,
+                facet_params
+            )
+            facets[field] = [{"value": value, "count": count} for value, count in rows if value]
+
+        if match:
+            filter_clause, filter_params = where(with_match=False)
+            rows = conn.execute(
+                f"""
+                SELECT p.*, bm25(papers_fts, 3.0, 3.0, 2.0, 1.0) AS rank
+                FROM papers_fts JOIN papers p ON p.paper_id = papers_fts.rowid
+                WHERE papers_fts MATCH ?{filter_clause.replace(" WHERE ", " AND ", 1)}
+                ORDER BY rank, p.created_at DESC
+                LIMIT ? OFFSET ?
+                """,
+                [match] + filter_params + [limit, offset]
+            )
+        else:
+            rows = conn.execute(
+                f"SELECT p.*, NULL AS rank FROM papers p{clause} ORDER BY p.created_at DESC, p.paper_id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            )
+        columns = [column[0] for column in rows.description]
+        papers: List[dict] = []
+        for row in rows:
+            paper = dict(zip(columns, row))
+            paper["id"] = paper.pop("paper_id")
+            rank = paper.pop("rank")
+            paper["score"] = round(-rank, 4) if rank is not None else None
+            papers.append(paper)
+
+        return {"total": total, "facets": facets, "papers": papers}
+    finally:
+        conn.close()
@@ -0,0 +1,631 @@
+"""
+Paper Service
+Paper generation and evaluation shared by the API endpoints and the job workers
+"""
+import json
+from collections import Counter
+from typing import Callable, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy.orm import Session, defer
+
+from database import Paper, Evaluation, User, ArchivedPaper
+from schemas_new import (
+    PaperGenerationRequest, PaperGenerationResponse, Question,
+    EvaluationRequest, EvaluationResponse, QuestionFeedback,
+    DocumentPaperResponse, MediaPaperResponse
+)
+from openai_service import (
+    generate_paper_with_ai, generate_questions_with_ai, evaluate_paper_with_ai,
+    generate_paper_from_document, generate_paper_from_media_transcript
+)
+from document_utils import extract_text_from_bytes, validate_document_length
+from media_utils import transcribe_media_path, validate_transcript_length, get_media_info
+from text_normalizer import normalize_text
+from document_store import add_to_library
+from transcript_store import get_transcript, save_transcript
+from user_stats import record_paper, record_evaluation
+from question_store import attach_questions, load_questions
+from archive import restore_paper
+from question_bank import (
+    draw_questions, record_draws, shortfall, bank_question_dict, arrange_questions, bank_questions, seen_paraphrases,
+    without_bank_ids, DEFAULT_INSTRUCTIONS, SECTION_MARKS
+)
+from minhash_index import filter_near_duplicates
+import paper_index
+import config
+
+# AI calls made to fill the bank's shortfall before a short section fails the paper
+SHORTFALL_ATTEMPTS = 2
+
+# Called with the name of each stage as it starts, e.g. "transcribing"
+ProgressCallback = Optional[Callable[[str], None]]
+
+# Called with the API response just before the paper or evaluation is committed
+SavedCallback = Optional[Callable[[BaseModel], None]]
+
+
+def _report(progress: ProgressCallback, stage: str):
+    """Tell the caller (usually a background job) which stage has started"""
+    if progress:
+        progress(stage)
+
+
+def _saved(saved: SavedCallback, response: BaseModel):
+    """Hand the response to the caller (usually a background job) inside the saving transaction"""
+    if saved:
+        saved(response)
+
+
+def _index_paper(paper: Paper):
+    """Add a saved paper to the search index; a failure must not lose the paper"""
+    try:
+        paper_index.add_paper(paper)
+    except Exception as e:
+        # Papers missing from the index are picked up by ensure_papers_indexed
+        print(f"WARNING: Could not index paper {paper.id}: {str(e)}")
+
+
+def _replace_near_duplicates(db: Session, user_id: int, request: PaperGenerationRequest, questions: list) -> list:
+    """
+    Swap generated questions that paraphrase another question in the paper, or
+    one the student has already had, for fresh ones (asking the AI once)
+    
+    Banked questions come first and are always kept. Where replacements run
+    short, the original questions stay so the paper keeps its layout.
+    """
+    kept, dropped = filter_near_duplicates(questions)
+    kept += [q for q in dropped if q.get("question_type") not in SECTION_MARKS]
+    dropped = [q for q in dropped if q.get("question_type") in SECTION_MARKS]
+    generated = [q for q in kept if not q.get("bank_question_id") and q.get("question_type") in SECTION_MARKS]
+    repeats = seen_paraphrases(db, user_id, request.grade, request.subject, request.chapter, generated)
+    if repeats:
+        repeat_ids = {id(q) for q in repeats}
+        kept = [q for q in kept if id(q) not in repeat_ids]
+        dropped += repeats
+    if not dropped:
+        return questions
+    
+    counts = Counter(q["question_type"] for q in dropped)
+    try:
+        fresh = generate_questions_with_ai(
+            grade=request.grade,
+            subject=request.subject,
+            chapter=request.chapter,
+            counts=dict(counts),
+            topic=request.topic,
+            avoid=[q["question_text"] for q in kept + dropped]
+        )
+    except Exception as e:
+        print(f"WARNING: Could not replace near-duplicate questions: {str(e)}")
+        return questions
+    fresh, _ = filter_near_duplicates(fresh, existing=kept)
+    
+    result = list(kept)
+    replaced = 0
+    for question_type, count in counts.items():
+        replacements = [q for q in fresh if q.get("question_type") == question_type][:count]
+        originals = [q for q in dropped if q["question_type"] == question_type]
+        result += replacements + originals[:count - len(replacements)]
+        replaced += len(replacements)
+    print(f"Replaced {replaced} of {len(dropped)} near-duplicate questions")
+    return arrange_questions(result)
+
+
+def _generate_shortfall(request: PaperGenerationRequest, missing: dict, questions: list) -> list:
+    """
+    Generate exactly the missing number of questions for each section
+
+    Extra questions are dropped and sections that come back short are asked
+    for again; raises a 502 if any is still short after SHORTFALL_ATTEMPTS calls.
+    """
+    generated = []
+    needed = dict(missing)
+    for _ in range(SHORTFALL_ATTEMPTS):
+        counts = {question_type: count for question_type, count in needed.items() if count > 0}
+        if not counts:
+            break
+        fresh = generate_questions_with_ai(
+            grade=request.grade,
+            subject=request.subject,
+            chapter=request.chapter,
+            counts=counts,
+            topic=request.topic,
+            avoid=[q["question_text"] for q in questions + generated]
+        )
+        for question_type, count in counts.items():
+            section = [q for q in fresh if q.get("question_type") == question_type][:count]
+            generated += section
+            needed[question_type] -= len(section)
+    
+    short = {question_type: count for question_type, count in needed.items() if count > 0}
+    if short:
+        raise HTTPException(
+            status_code=502,
+            detail=f"The AI service returned too few questions for: {', '.join(f'{t} ({n} missing)' for t, n in short.items())}"
+        )
+    return generated
+
+
+def generate_curriculum_paper(
+    db: Session,
+    current_user: User,
+    request: PaperGenerationRequest,
+    progress: ProgressCallback = None,
+    saved: SavedCallback = None
+) -> PaperGenerationResponse:
+    """Generate a curriculum paper, save it and build the API response"""
+    _report(progress, "assembling")
+    
+    # Reuse banked questions the student has not seen; the AI only writes the shortfall
+    picked = draw_questions(db, current_user.id, request.grade, request.subject, request.chapter, request.topic)
+    missing = shortfall(picked)
+    if not any(picked.values()):
+        _report(progress, "generating")
+        paper_data = generate_paper_with_ai(
+            grade=request.grade,
+            subject=request.subject,
+            chapter=request.chapter,
+            topic=request.topic
+        )
+    else:
+        questions = [bank_question_dict(row) for rows in picked.values() for row in rows]
+        if any(missing.values()):
+            _report(progress, "generating")
+            questions += _generate_shortfall(request, missing, questions)
+        paper_data = {"instructions": DEFAULT_INSTRUCTIONS, "questions": arrange_questions(questions)}
+    print(f"Assembled paper: {sum(len(rows) for rows in picked.values())} banked questions, {sum(missing.values())} generated")
+    
+    # Generated questions that only paraphrase another one are swapped for fresh ones
+    paper_data["questions"] = _replace_near_duplicates(db, current_user.id, request, paper_data["questions"])
+    
+    # Stages are recorded in their own commits, so every write below waits for the save
+    _report(progress, "saving")
+    
+    record_draws(db, picked)
+    
+    # Bank newly generated questions (duplicates are skipped) so later papers can reuse them
+    bank_questions(db, request.grade, request.subject, request.chapter, request.topic, paper_data["questions"])
+    
+    # Calculate total marks
+    total_marks = sum(q.get("marks", 0) for q in paper_data["questions"])
+    
+    # Save to database, counting the paper in the user's stats in the same transaction
+    record_paper(db, current_user.id)
+    db_paper = Paper(
+        user_id=current_user.id,
+        grade=request.grade,
+        paper_type="curriculum",
+        subject=request.subject,
+        chapter=request.chapter,
+        topic=request.topic,
+        total_marks=total_marks
+    )
+    attach_questions(db_paper, paper_data["questions"])
+    db.add(db_paper)
+    db.flush()
+    
+    # Format response
+    questions = [
+        Question(
+            question_number=q["question_number"],
+            question_type=q["question_type"],
+            question_text=q["question_text"],
+            marks=q["marks"],
+            options=q.get("options")
+        )
+        for q in paper_data["questions"]
+    ]
+    
+    response = PaperGenerationResponse(
+        paper_id=db_paper.id,
+        grade=db_paper.grade,
+        subject=db_paper.subject,
+        chapter=db_paper.chapter,
+        topic=db_paper.topic,
+        questions=questions,
+        total_marks=total_marks,
+        instructions=paper_data.get("instructions", "Answer all questions."),
+        created_at=db_paper.created_at
+    )
+    
+    # A background job stores this response in the same commit
+    _saved(saved, response)
+    db.commit()
+    _index_paper(db_paper)
+    return response
+
+
+def create_document_paper(
+    db: Session,
+    current_user: User,
+    document_text: str,
+    document_name: str,
+    num_mcqs: int,
+    num_short_questions: int,
+    marks_per_mcq: int,
+    marks_per_short: int,
+    document_id: Optional[int] = None,
+    instructions: str = "Answer all questions based on the document.",
+    progress: ProgressCallback = None,
+    saved: SavedCallback = None,
+    **response_fields
+) -> DocumentPaperResponse:
+    """Generate a paper from document text, save it and build the API response"""
+    _report(progress, "generating")
+    
+    # Generate paper using OpenAI
+    paper_data = generate_paper_from_document(
+        document_text=document_text,
+        num_mcqs=num_mcqs,
+        num_short_questions=num_short_questions,
+        marks_per_mcq=marks_per_mcq,
+        marks_per_short=marks_per_short
+    )
+    
+    _report(progress, "saving")
+    
+    # Calculate total marks
+    total_marks = sum(q.get("marks", 0) for q in paper_data["questions"])
+    
+    # Save to database, counting the paper in the user's stats in the same transaction
+    record_paper(db, current_user.id)
+    db_paper = Paper(
+        user_id=current_user.id,
+        document_name=document_name,
+        document_id=document_id,
+        paper_type="document",
+        total_marks=total_marks
+    )
+    attach_questions(db_paper, paper_data["questions"])
+    db.add(db_paper)
+    db.flush()
+    
+    # Format response
+    questions = [
+        Question(
+            question_number=q["question_number"],
+            question_type=q["question_type"],
+            question_text=q["question_text"],
+            marks=q["marks"],
+            options=q.get("options")
+        )
+        for q in paper_data["questions"]
+    ]
+    
+    response = DocumentPaperResponse(
+        paper_id=db_paper.id,
+        document_name=document_name,
+        document_id=document_id,
+        questions=questions,
+        total_marks=total_marks,
+        instructions=paper_data.get("instructions", instructions),
+        created_at=db_paper.created_at,
+        **response_fields
+    )
+    
+    # A background job stores this response in the same commit
+    _saved(saved, response)
+    db.commit()
+    _index_paper(db_paper)
+    return response
+
+
+def document_paper_from_bytes(
+    db: Session,
+    current_user: User,
+    filename: str,
+    content: bytes,
+    num_mcqs: int,
+    num_short_questions: int,
+    marks_per_mcq: int,
+    marks_per_short: int,
+    page_range: Optional[str] = None,
+    sections: Optional[str] = None,
+    subject: Optional[str] = None,
+    progress: ProgressCallback = None,
+    saved: SavedCallback = None
+) -> DocumentPaperResponse:
+    """Extract an uploaded document, add it to the library and generate a paper from it"""
+    _report(progress, "extracting")
+    
+    # Extract text from document (only the requested pages for PDFs)
+    try:
+        document_text = extract_text_from_bytes(filename, content, page_range, sections)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error reading file: {str(e)}")
+    
+    # Strip headers, footers, page numbers and other layout noise before prompting
+    document_text, text_stats = normalize_text(document_text)
+    print(f"Normalized {filename}: saved {text_stats['chars_saved']} chars (~{text_stats['tokens_saved']} tokens)")
+    
+    # Validate document length
+    validate_document_length(document_text)
+    
+    # Keep the extracted text in the user's library so later papers skip the upload
+    library_name = filename
+    if page_range:
+        library_name += f" (pages {page_range})"
+    if sections:
+        library_name += f" ({sections})"
+    document = add_to_library(db, current_user.id, library_name, document_text, subject=subject)
+    
+    return create_document_paper(
+        db, current_user, document_text, filename,
+        num_mcqs, num_short_questions, marks_per_mcq, marks_per_short,
+        document_id=document.id,
+        progress=progress,
+        saved=saved,
+        text_stats=text_stats
+    )
+
+
+def create_media_paper(
+    db: Session,
+    current_user: User,
+    transcript: str,
+    media_name: str,
+    media_hash: str,
+    num_mcqs: int,
+    num_short_questions: int,
+    marks_per_mcq: int,
+    marks_per_short: int,
+    progress: ProgressCallback = None,
+    saved: SavedCallback = None,
+    **response_fields
+) -> MediaPaperResponse:
+    """Generate a paper from a recording's transcript, save it and build the API response"""
+    media_info = get_media_info(media_name)
+    
+    # Collapse whitespace and other noise before prompting
+    transcript, text_stats = normalize_text(transcript)
+    
+    # Validate transcript length
+    validate_transcript_length(transcript, config.MAX_TRANSCRIPT_CHARS)
+    
+    _report(progress, "generating")
+    
+    # Generate paper using OpenAI
+    paper_data = generate_paper_from_media_transcript(
+        transcript=transcript,
+        num_mcqs=num_mcqs,
+        num_short_questions=num_short_questions,
+        marks_per_mcq=marks_per_mcq,
+        marks_per_short=marks_per_short
+    )
+    
+    _report(progress, "saving")
+    
+    # Calculate total marks
+    total_marks = sum(q.get("marks", 0) for q in paper_data["questions"])
+    
+    # Save to database, counting the paper in the user's stats in the same transaction
+    record_paper(db, current_user.id)
+    db_paper = Paper(
+        user_id=current_user.id,
+        document_name=media_name,  # Store media filename
+        media_hash=media_hash,
+        paper_type="media",  # New paper type for audio/video
+        total_marks=total_marks
+    )
+    attach_questions(db_paper, paper_data["questions"])
+    db.add(db_paper)
+    db.flush()
+    
+    # Format response
+    questions = [
+        Question(
+            question_number=q["question_number"],
+            question_type=q["question_type"],
+            question_text=q["question_text"],
+            marks=q["marks"],
+            options=q.get("options")
+        )
+        for q in paper_data["questions"]
+    ]
+    
+    # Create transcript preview (first 200 characters)
+    transcript_preview = transcript[:200] + "..." if len(transcript) > 200 else transcript
+    
+    response = MediaPaperResponse(
+        paper_id=db_paper.id,
+        media_name=media_name,
+        media_type=media_info["media_type"],
+        media_hash=media_hash,
+        transcript_preview=transcript_preview,
+        questions=questions,
+        total_marks=total_marks,
+        instructions=paper_data.get("instructions", "Answer all questions based on the audio/video content."),
+        created_at=db_paper.created_at,
+        text_stats=text_stats,
+        **response_fields
+    )
+    
+    # A background job stores this response in the same commit
+    _saved(saved, response)
+    db.commit()
+    _index_paper(db_paper)
+    return response
+
+
+def media_paper_from_file(
+    db: Session,
+    current_user: User,
+    media_path: str,
+    media_name: str,
+    media_hash: str,
+    num_mcqs: int,
+    num_short_questions: int,
+    marks_per_mcq: int,
+    marks_per_short: int,
+    trim_silence: bool = False,
+    progress: ProgressCallback = None,
+    saved: SavedCallback = None
+) -> MediaPaperResponse:
+    """
+    Transcribe a saved recording (or reuse its cached transcript) and generate a paper
+    
+    The file at media_path is left for the caller to delete.
+    """
+    cached = get_transcript(db, media_hash, trim_silence)
+    if cached:
+        print(f"Reusing cached transcript for {media_name} (sha256 {media_hash[:12]})")
+        transcript, media_stats = cached.transcript, json.loads(cached.media_stats or "{}")
+    else:
+        _report(progress, "transcribing")
+        transcript, media_stats = transcribe_media_path(media_path, trim_silence)
+        save_transcript(db, media_hash, trim_silence, get_media_info(media_name)["media_type"], transcript, media_stats)
+    
+    return create_media_paper(
+        db, current_user, transcript, media_name, media_hash,
+        num_mcqs, num_short_questions, marks_per_mcq, marks_per_short,
+        progress=progress,
+        saved=saved,
+        media_stats=media_stats, transcript_cached=bool(cached)
+    )
+
+
+def evaluate_submission(
+    db: Session,
+    current_user: User,
+    request: EvaluationRequest,
+    progress: ProgressCallback = None,
+    saved: SavedCallback = None
+) -> EvaluationResponse:
+    """Evaluate a student's answers for a paper, save the evaluation and build the API response"""
+    # Fetch the paper from database
+    paper = db.query(Paper).options(defer(Paper.questions)).filter(Paper.id == request.paper_id).first()
+    archived = db.get(ArchivedPaper, request.paper_id) if not paper else None
+    if not paper and not archived:
+        raise HTTPException(status_code=404, detail="Paper not found")
+    
+    # Verify paper belongs to current user
+    if (paper or archived).user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied: This paper belongs to another user")
+    
+    if paper:
+        questions = load_questions(db, paper)
+    else:
+        questions = without_bank_ids(json.loads(archived.questions))
+    
+    # Convert student answers to dict for easier lookup
+    student_answers_dict = {
+        ans.question_number: ans.answer 
+        for ans in request.answers
+    }
+    
+    print(f"Evaluating paper {request.paper_id} with {len(questions)} questions")
+    print(f"Student provided answers for {len(student_answers_dict)} questions")
+    print(f"Question types: {[q['question_type'] for q in questions]}")
+    
+    _report(progress, "evaluating")
+    
+    # Evaluate using OpenAI
+    evaluation_data = evaluate_paper_with_ai(questions, student_answers_dict)
+    
+    print(f"Received feedback for {len(evaluation_data['question_feedback'])} questions")
+    
+    _report(progress, "saving")
+    
+    if archived:
+        # Attempting an archived paper moves it back (committed with the evaluation)
+        paper = restore_paper(db, archived.id)
+    
+    # Validate that all questions were evaluated
+    evaluated_q_numbers = {fb["question_number"] for fb in evaluation_data["question_feedback"]}
+    all_q_numbers = {q["question_number"] for q in questions}
+    
+    if evaluated_q_numbers != all_q_numbers:
+        missing = all_q_numbers - evaluated_q_numbers
+        print(f"WARNING: Not all questions were evaluated. Missing: {missing}")
+        # Add zero marks for missing questions
+        for q_num in missing:
+            question = next(q for q in questions if q["question_number"] == q_num)
+            evaluation_data["question_feedback"].append({
+                "question_number": q_num,
+                "marks_obtained": 0.0,
+                "marks_total": question["marks"],
+                "feedback": "No evaluation provided for this question.",
+                "correct_answer": question.get("correct_answer", "N/A")
+            })
+    
+    # Calculate total score - ensure we sum all feedback items
+    total_score = 0.0
+    for fb in evaluation_data["question_feedback"]:
+        marks = fb.get("marks_obtained", 0)
+        if marks is None:
+            marks = 0.0
+        total_score += float(marks)
+    
+    print(f"Total score calculated: {total_score} out of {paper.total_marks}")
+    
+    # Calculate percentage and grade
+    if paper.total_marks > 0:
+        percentage = (total_score / paper.total_marks) * 100
+    else:
+        percentage = 0.0
+        
+    grade_letter = calculate_grade(percentage)
+    
+    # Save evaluation to database, updating the user's stats in the same transaction
+    record_evaluation(db, current_user.id, paper.subject, total_score, paper.total_marks, grade_letter)
+    db_evaluation = Evaluation(
+        user_id=current_user.id,
+        paper_id=request.paper_id,
+        student_answers=json.dumps(student_answers_dict),
+        score=total_score,
+        total_marks=paper.total_marks,
+        feedback=json.dumps(evaluation_data["question_feedback"])
+    )
+    db.add(db_evaluation)
+    db.flush()
+    
+    # Format response
+    feedback_list = [
+        QuestionFeedback(
+            question_number=fb["question_number"],
+            student_answer=student_answers_dict.get(fb["question_number"], "Not answered"),
+            marks_obtained=fb["marks_obtained"],
+            marks_total=fb["marks_total"],
+            feedback=fb["feedback"],
+            correct_answer=fb.get("correct_answer")
+        )
+        for fb in evaluation_data["question_feedback"]
+    ]
+    
+    response = EvaluationResponse(
+        evaluation_id=db_evaluation.id,
+        paper_id=request.paper_id,
+        total_score=float(total_score),
+        total_marks=paper.total_marks,
+        percentage=round(float(percentage), 2),
+        grade_letter=grade_letter,
+        feedback=feedback_list,
+        overall_feedback=evaluation_data.get("overall_feedback", ""),
+        evaluated_at=db_evaluation.evaluated_at
+    )
+    
+    # A background job stores this response in the same commit
+    _saved(saved, response)
+    db.commit()
+    return response
+
+
+def calculate_grade(percentage: float) -> str:
+    """Calculate letter grade based on Oxford grading system"""
+    if percentage >= 90:
+        return "A*"
+    elif percentage >= 80:
+        return "A"
+    elif percentage >= 70:
+        return "B"
+    elif percentage >= 60:
+        return "C"
+    elif percentage >= 50:
+        return "D"
+    elif percentage >= 40:
+        return "E"
+    else:
+        return "U"  # Ungraded
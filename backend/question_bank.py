@@ -0,0 +1,334 @@
+"""
+Question Bank
+Deduplicated curriculum questions tagged by grade, subject, chapter, type and
+marks, so papers can be assembled from questions the student has not seen and
+the AI only writes the shortfall
+
+Usage:
+    python question_bank.py --backfill    # bank the questions of existing curriculum papers
+"""
+import re
+import json
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session, defer
+from sqlalchemy.dialects import sqlite, postgresql
+
+from database import Paper, PaperQuestion, BankQuestion, ArchivedSeenQuestion
+from question_store import question_dict
+import minhash_index
+import vector_index
+
+# Curriculum paper layout: (question type, count, marks each), in paper order
+PAPER_LAYOUT = (("MCQ", 10, 2), ("Short Answer", 6, 5), ("Long Answer", 4, 10))
+SECTION_MARKS = {question_type: marks for question_type, _, marks in PAPER_LAYOUT}
+
+DEFAULT_INSTRUCTIONS = (
+    "Answer all questions. Section A: 10 multiple choice questions (2 marks each). "
+    "Section B: 6 short answer questions (5 marks each). "
+    "Section C: 4 long answer questions (10 marks each). Total: 100 marks. Time: 3 hours."
+)
+
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+INSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _tag(value: Optional[str]) -> str:
+    """Tags compare case- and whitespace-insensitively"""
+    return " ".join(str(value).split()).lower() if value else ""
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[^\w]+", " ", str(text).lower()).strip()
+
+
+def content_hash(tags: dict, question: dict) -> str:
+    """Hash of a question's tags, type and normalized text and options"""
+    options = " | ".join(_normalize(option) for option in question.get("options") or [])
+    key = "\n".join([
+        tags["grade"], tags["subject"], tags["chapter"],
+        question["question_type"], _normalize(question["question_text"]), options
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def is_bankable(question: dict) -> bool:
+    """Only complete questions that fit the curriculum layout are banked"""
+    question_type = question.get("question_type")
+    if question_type not in SECTION_MARKS or question.get("marks") != SECTION_MARKS[question_type]:
+        return False
+    if not str(question.get("question_text", "")).strip() or not question.get("correct_answer"):
+        return False
+    return question_type != "MCQ" or len(question.get("options") or []) == 4
+
+
+def bank_questions(
+    db: Session,
+    grade: str,
+    subject: str,
+    chapter: str,
+    topic: Optional[str],
+    questions: List[dict]
+) -> int:
+    """
+    Add questions to the bank, skipping duplicates, and set each banked
+    question's "bank_question_id" in place
+
+    Runs in the caller's transaction. Returns the number of new bank entries.
+    """
+    tags = {"grade": _tag(grade), "subject": _tag(subject), "chapter": _tag(chapter)}
+    hashed = {}
+    for question in questions:
+        if is_bankable(question):
+            hashed.setdefault(content_hash(tags, question), []).append(question)
+    if not hashed:
+        return 0
+
+    existing = dict(
+        db.query(BankQuestion.content_hash, BankQuestion.id).filter(BankQuestion.content_hash.in_(list(hashed)))
+    )
+    scope = minhash_index.scope_key(grade, subject, chapter)
+    aliases = {}
+    accepted = []
+    rows = []
+    for question_hash, duplicates in hashed.items():
+        if question_hash in existing:
+            continue
+        question = duplicates[0]
+
+        # Paraphrases of a banked question, or of one banked just now, share its entry
+        sig = minhash_index.signature(question["question_text"])
+        if sig:
+            match_id = _near_duplicate_in_bank(db, sig, scope)
+            if match_id:
+                existing[question_hash] = match_id
+                continue
+            twin = next((
+                other_hash for other_hash, other in accepted
+                if minhash_index.similarity(sig, other) >= minhash_index.DUPLICATE_THRESHOLD
+            ), None)
+            if twin:
+                aliases[question_hash] = twin
+                continue
+            accepted.append((question_hash, sig))
+
+        options = question.get("options")
+        rows.append({
+            "content_hash": question_hash,
+            **tags,
+            "topic": _tag(topic),
+            "question_type": question["question_type"],
+            "marks": question["marks"],
+            "text": str(question["question_text"]),
+            "options": json.dumps(options) if options else None,
+            "answer": str(question["correct_answer"]),
+            "use_count": 0
+        })
+
+    if rows:
+        insert = INSERT_DIALECTS.get(db.get_bind().dialect.name)
+        if insert is not None:
+            # Another request may bank the same question concurrently
+            db.execute(insert(BankQuestion.__table__).values(rows).on_conflict_do_nothing(index_elements=["content_hash"]))
+        else:
+            db.add_all(BankQuestion(**row) for row in rows)
+            db.flush()
+        existing.update(
+            db.query(BankQuestion.content_hash, BankQuestion.id).filter(
+                BankQuestion.content_hash.in_([row["content_hash"] for row in rows])
+            )
+        )
+        try:
+            minhash_index.add_questions((existing[row["content_hash"]], row["text"], scope) for row in rows)
+        except Exception as e:
+            # Questions missing from the index are picked up by 'python minhash_index.py --rebuild'
+            print(f"WARNING: Could not index banked questions: {str(e)}")
+        try:
+            vector_index.add_questions((existing[row["content_hash"]], row["text"]) for row in rows)
+        except Exception as e:
+            # Picked up by the next 'python vector_index.py --build'
+            print(f"WARNING: Could not vectorize banked questions: {str(e)}")
+
+    for question_hash, twin in aliases.items():
+        existing[question_hash] = existing.get(twin)
+    for question_hash, duplicates in hashed.items():
+        for question in duplicates:
+            question["bank_question_id"] = existing.get(question_hash)
+    return len(rows)
+
+
+def _near_duplicate_in_bank(db: Session, sig, scope: int) -> Optional[int]:
+    """ID of a banked question in the same scope that paraphrases sig, if any"""
+    try:
+        matches = minhash_index.query(sig=sig, scope=scope, limit=5)
+    except Exception as e:
+        print(f"WARNING: Near-duplicate lookup failed: {str(e)}")
+        return None
+    if not matches:
+        return None
+    # The index can hold IDs from rolled-back transactions, so confirm the row exists
+    ids = [question_id for question_id, _ in matches]
+    found = {row[0] for row in db.query(BankQuestion.id).filter(BankQuestion.id.in_(ids))}
+    return next((question_id for question_id in ids if question_id in found), None)
+
+
+def _seen_bank_ids(db: Session, user_id: int, candidate_ids=None):
+    """Query of the bank IDs of questions in the user's papers, archived ones included"""
+    live = db.query(PaperQuestion.bank_question_id).join(Paper, Paper.id == PaperQuestion.paper_id).filter(
+        Paper.user_id == user_id,
+        PaperQuestion.bank_question_id.isnot(None)
+    )
+    archived = db.query(ArchivedSeenQuestion.bank_question_id).filter(ArchivedSeenQuestion.user_id == user_id)
+    if candidate_ids is not None:
+        live = live.filter(PaperQuestion.bank_question_id.in_(candidate_ids))
+        archived = archived.filter(ArchivedSeenQuestion.bank_question_id.in_(candidate_ids))
+    return live.union(archived)
+
+
+def draw_questions(
+    db: Session,
+    user_id: int,
+    grade: str,
+    subject: str,
+    chapter: str,
+    topic: Optional[str] = None
+) -> Dict[str, List[BankQuestion]]:
+    """
+    Pick banked questions for each section of a curriculum paper
+
+    Questions from the user's earlier papers are excluded and the least-used
+    questions are preferred. Sections may come back short. Read-only; call
+    record_draws when the paper is saved.
+    """
+    seen = _seen_bank_ids(db, user_id)
+    picked = {}
+    for question_type, count, marks in PAPER_LAYOUT:
+        query = db.query(BankQuestion).filter(
+            BankQuestion.grade == _tag(grade),
+            BankQuestion.subject == _tag(subject),
+            BankQuestion.chapter == _tag(chapter),
+            BankQuestion.question_type == question_type,
+            BankQuestion.marks == marks,
+            BankQuestion.id.notin_(seen)
+        )
+        if topic:
+            query = query.filter(BankQuestion.topic == _tag(topic))
+        picked[question_type] = query.order_by(BankQuestion.use_count, func.random()).limit(count).all()
+    return picked
+
+
+def record_draws(db: Session, picked: Dict[str, List[BankQuestion]]):
+    """Count a saved paper's banked questions as used; runs in the caller's transaction"""
+    drawn_ids = [row.id for rows in picked.values() for row in rows]
+    if drawn_ids:
+        db.query(BankQuestion).filter(BankQuestion.id.in_(drawn_ids)).update(
+            {BankQuestion.use_count: BankQuestion.use_count + 1}, synchronize_session=False
+        )
+
+
+def seen_paraphrases(
+    db: Session,
+    user_id: int,
+    grade: str,
+    subject: str,
+    chapter: str,
+    questions: List[dict]
+) -> List[dict]:
+    """Questions that paraphrase a banked question the user has already had in a paper"""
+    scope = minhash_index.scope_key(grade, subject, chapter)
+    matches = []
+    for question in questions:
+        sig = minhash_index.signature(question.get("question_text", ""))
+        if sig:
+            try:
+                ids = [question_id for question_id, _ in minhash_index.query(sig=sig, scope=scope, limit=5)]
+            except Exception as e:
+                print(f"WARNING: Near-duplicate lookup failed: {str(e)}")
+                return []
+            if ids:
+                matches.append((question, ids))
+    if not matches:
+        return []
+
+    candidate_ids = {question_id for _, ids in matches for question_id in ids}
+    seen = {row[0] for row in _seen_bank_ids(db, user_id, candidate_ids)}
+    return [question for question, ids in matches if seen.intersection(ids)]
+
+
+def shortfall(picked: Dict[str, List[BankQuestion]]) -> Dict[str, int]:
+    """Questions still needed per section after drawing from the bank"""
+    return {question_type: count - len(picked.get(question_type, [])) for question_type, count, _ in PAPER_LAYOUT}
+
+
+def bank_question_dict(row: BankQuestion) -> dict:
+    """Banked question in the shape the AI service generates (numbered later)"""
+    return {
+        "question_number": 0,
+        "question_type": row.question_type,
+        "question_text": row.text,
+        "marks": row.marks,
+        "options": json.loads(row.options) if row.options else None,
+        "correct_answer": row.answer,
+        "bank_question_id": row.id
+    }
+
+
+def without_bank_ids(questions: List[dict]) -> List[dict]:
+    """Questions as saved in a paper's JSON and sent to clients; the bank link stays in the questions table"""
+    return [{key: value for key, value in q.items() if key != "bank_question_id"} for q in questions]
+
+
+def arrange_questions(questions: List[dict]) -> List[dict]:
+    """Order questions by section and number them 1..n"""
+    order = {question_type: index for index, (question_type, _, _) in enumerate(PAPER_LAYOUT)}
+    arranged = sorted(questions, key=lambda q: order.get(q.get("question_type"), len(order)))
+    for number, question in enumerate(arranged, start=1):
+        question["question_number"] = number
+    return arranged
+
+
+def backfill_bank(db: Session, batch_size: int = 200) -> int:
+    """Bank the questions of existing curriculum papers, oldest first, and link their question rows"""
+    added = 0
+    last_id = 0
+    while True:
+        papers = db.query(Paper).options(defer(Paper.questions)).filter(
+            Paper.paper_type == "curriculum",
+            Paper.id > last_id
+        ).order_by(Paper.id).limit(batch_size).all()
+        if not papers:
+            return added
+        last_id = papers[-1].id
+        for paper in papers:
+            rows = [row for row in paper.question_rows if row.bank_question_id is None]
+            if not rows or not (paper.grade and paper.subject and paper.chapter):
+                continue
+            questions = [question_dict(row) for row in rows]
+            added += bank_questions(db, paper.grade, paper.subject, paper.chapter, paper.topic, questions)
+            for row, question in zip(rows, questions):
+                row.bank_question_id = question.get("bank_question_id")
+        db.commit()
+        db.expunge_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the question bank")
+    parser.add_argument("--backfill", action="store_true", help="Bank the questions of existing curriculum papers")
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.print_help()
+        return
+
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        print(f"✅ Banked {backfill_bank(db)} new questions")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Question Storage
+Normalized per-question rows for papers, read instead of parsing the paper's
+questions JSON blob
+"""
+import json
+from typing import List
+from sqlalchemy.orm import Session
+from database import Paper, PaperQuestion
+
+
+def question_row(question: dict) -> PaperQuestion:
+    """Build a question row from a question dict as generated by the AI service"""
+    options = question.get("options")
+    answer = question.get("correct_answer")
+    return PaperQuestion(
+        number=int(question["question_number"]),
+        question_type=str(question.get("question_type", "")),
+        marks=int(question.get("marks", 0)),
+        text=str(question.get("question_text", "")),
+        options=json.dumps(options) if options else None,
+        answer=str(answer) if answer is not None else None,
+        bank_question_id=question.get("bank_question_id")
+    )
+
+
+def question_dict(row: PaperQuestion) -> dict:
+    """Question row in the same shape as the entries of the questions JSON"""
+    return {
+        "question_number": row.number,
+        "question_type": row.question_type,
+        "question_text": row.text,
+        "marks": row.marks,
+        "options": json.loads(row.options) if row.options else None,
+        "correct_answer": row.answer
+    }
+
+
+def attach_questions(paper: Paper, questions: List[dict]) -> None:
+    """Add question rows to a new paper so they are saved in the same commit"""
+    paper.question_rows = [question_row(q) for q in questions]
+
+
+def paper_questions(paper: Paper) -> List[dict]:
+    """Questions of a loaded paper, from its question rows or the JSON blob of older papers"""
+    if paper.question_rows:
+        return [question_dict(row) for row in paper.question_rows]
+    return json.loads(paper.questions or "[]")
+
+
+def load_questions(db: Session, paper: Paper) -> List[dict]:
+    """
+    Questions of a paper, in order, from the questions table
+
+    Papers not yet backfilled by migrate_add_questions.py fall back to the
+    JSON blob; papers saved since have no blob.
+    """
+    rows = db.query(PaperQuestion).filter(PaperQuestion.paper_id == paper.id).order_by(
+        PaperQuestion.number, PaperQuestion.id
+    ).all()
+    if rows:
+        return [question_dict(row) for row in rows]
+    return json.loads(paper.questions or "[]")
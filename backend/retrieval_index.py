@@ -0,0 +1,210 @@
+"""
+Document Retrieval Index
+Per-user BM25 inverted index over chunked library documents, stored in a local
+SQLite file and updated incrementally as documents are added
+"""
+import os
+import re
+import math
+import sqlite3
+import heapq
+from collections import Counter
+from typing import List, Optional
+import config
+
+INDEX_DIR = config.RETRIEVAL_INDEX_DIR
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+CHUNK_CHARS = 800
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = set("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers him his how i if in into is it its itself just me more most my no nor not
+now of off on once only or other our out over own same she should so some such than that the their
+them then there these they this those through to too under until up very was we were what when where
+which while who whom why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed and plurals folded"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS) -> List[str]:
+    """Pack paragraphs into chunks of about chunk_chars, splitting oversized paragraphs"""
+    chunks = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > chunk_chars:
+            split_at = paragraph.rfind(" ", 0, chunk_chars)
+            if split_at <= 0:
+                split_at = chunk_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:split_at].strip())
+            paragraph = paragraph[split_at:].strip()
+        if current and len(current) + len(paragraph) + 1 > chunk_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _connect(user_id: int) -> sqlite3.Connection:
+    """Open (and create if needed) the user's index file"""
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(INDEX_DIR, f"user_{user_id}.db"), timeout=30)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            text TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_chunks_document ON chunks (document_id);
+        CREATE TABLE IF NOT EXISTS postings (
+            term TEXT NOT NULL,
+            chunk_id INTEGER NOT NULL,
+            tf INTEGER NOT NULL,
+            PRIMARY KEY (term, chunk_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS terms (
+            term TEXT PRIMARY KEY,
+            df INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            chunk_count INTEGER NOT NULL,
+            total_length INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO stats (id, chunk_count, total_length) VALUES (1, 0, 0);
+    """)
+    return conn
+
+
+def indexed_document_ids(user_id: int) -> set:
+    """IDs of the library documents already in the user's index"""
+    conn = _connect(user_id)
+    try:
+        return {row[0] for row in conn.execute("SELECT DISTINCT document_id FROM chunks")}
+    finally:
+        conn.close()
+
+
+def add_document(user_id: int, document_id: int, text: str) -> int:
+    """
+    Chunk a document and add it to the user's index in one transaction
+    
+    Documents that are already indexed are skipped. Returns the number of chunks added.
+    """
+    conn = _connect(user_id)
+    try:
+        with conn:
+            if conn.execute("SELECT 1 FROM chunks WHERE document_id = ? LIMIT 1", (document_id,)).fetchone():
+                return 0
+            
+            df_updates = Counter()
+            total_length = 0
+            chunks = chunk_text(text)
+            for position, chunk in enumerate(chunks):
+                term_counts = Counter(tokenize(chunk))
+                length = sum(term_counts.values())
+                cursor = conn.execute(
+                    "INSERT INTO chunks (document_id, position, length, text) VALUES (?, ?, ?, ?)",
+                    (document_id, position, length, chunk)
+                )
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in term_counts.items()]
+                )
+                df_updates.update(term_counts.keys())
+                total_length += length
+            
+            conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                list(df_updates.items())
+            )
+            conn.execute(
+                "UPDATE stats SET chunk_count = chunk_count + ?, total_length = total_length + ? WHERE id = 1",
+                (len(chunks), total_length)
+            )
+            return len(chunks)
+    finally:
+        conn.close()
+
+
+def search(user_id: int, query: str, limit: int = 10, document_ids: Optional[List[int]] = None) -> List[dict]:
+    """
+    Rank the user's chunks against a query with BM25
+    
+    Only postings for the query terms are read, so cost depends on the query
+    rather than the size of the library. Optionally restricted to document_ids.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    
+    conn = _connect(user_id)
+    try:
+        chunk_count, total_length = conn.execute("SELECT chunk_count, total_length FROM stats WHERE id = 1").fetchone()
+        if chunk_count == 0:
+            return []
+        avg_length = total_length / chunk_count
+        
+        allowed = set(document_ids) if document_ids is not None else None
+        scores = Counter()
+        for term in terms:
+            row = conn.execute("SELECT df FROM terms WHERE term = ?", (term,)).fetchone()
+            if not row:
+                continue
+            idf = math.log((chunk_count - row[0] + 0.5) / (row[0] + 0.5) + 1)
+            postings = conn.execute(
+                """
+                SELECT p.chunk_id, p.tf, c.length, c.document_id
+                FROM postings p JOIN chunks c ON c.id = p.chunk_id
+                WHERE p.term = ?
+                """,
+                (term,)
+            )
+            for chunk_id, tf, length, document_id in postings:
+                if allowed is not None and document_id not in allowed:
+                    continue
+                scores[chunk_id] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+        
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        results = []
+        for chunk_id, score in top:
+            document_id, position, text = conn.execute(
+                "SELECT document_id, position, text FROM chunks WHERE id = ?", (chunk_id,)
+            ).fetchone()
+            results.append({
+                "chunk_id": chunk_id,
+                "document_id": document_id,
+                "position": position,
+                "text": text,
+                "score": round(score, 4)
+            })
+        return results
+    finally:
+        conn.close()
@@ -128,13 +128,39 @@ class DocumentPaperRequest(BaseModel):
         }
 
 
+class LibraryPaperRequest(BaseModel):
+    query: str = Field(..., min_length=2, description="Topic to focus on")
+    subject: Optional[str] = Field(None, description="Only search documents filed under this subject")
+    document_ids: Optional[List[int]] = Field(None, description="Only search these library documents")
+    num_mcqs: int = Field(0, ge=0, description="Number of MCQ questions (0 if not needed)")
+    num_short_questions: int = Field(0, ge=0, description="Number of short answer questions (0 if not needed)")
+    marks_per_mcq: int = Field(2, ge=1, description="Marks per MCQ question")
+    marks_per_short: int = Field(5, ge=1, description="Marks per short answer question")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "query": "photosynthesis",
+                "subject": "Biology",
+                "num_mcqs": 10,
+                "num_short_questions": 0,
+                "marks_per_mcq": 2,
+                "marks_per_short": 5
+            }
+        }
+
+
 class DocumentPaperResponse(BaseModel):
     paper_id: int
     document_name: str
+    document_id: Optional[int] = None  # Library document the paper was generated from
     questions: List[Question]
     total_marks: int
     instructions: str
     created_at: datetime
+    text_stats: Optional[Dict[str, int]] = None  # Characters/tokens saved by normalization
+    source_documents: Optional[List[str]] = None  # Multi-document papers only
+    duplicate_files: Optional[List[str]] = None  # Identical uploads that were skipped
 
 
 class DashboardStats(BaseModel):
@@ -168,8 +194,12 @@ class MediaPaperResponse(BaseModel):
     paper_id: int
     media_name: str
     media_type: str  # 'audio' or 'video'
+    media_hash: Optional[str] = None  # Use with /api/media/{media_hash}/generate_paper
     transcript_preview: str
     questions: List[Question]
     total_marks: int
     instructions: str
     created_at: datetime
+    text_stats: Optional[Dict[str, int]] = None  # Characters/tokens saved by normalization
+    media_stats: Optional[Dict[str, Any]] = None  # Durations, % of silence removed and time map
+    transcript_cached: Optional[bool] = None  # Transcript was reused rather than transcribed
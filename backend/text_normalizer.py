@@ -0,0 +1,144 @@
+"""
+Text Normalization
+Strips layout noise from extracted documents and transcripts before prompting
+"""
+import re
+from itertools import groupby
+from collections import Counter
+from typing import Tuple
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Extractors separate pages with a form feed so repeated headers/footers can be found
+PAGE_BREAK = "\f"
+
+# A line at the top or bottom of a page must repeat on at least this share of
+# pages (and 3 pages) to count as a running header/footer
+REPEATED_LINE_MIN_SHARE = 0.5
+REPEATED_LINE_MIN_PAGES = 3
+EDGE_LINES = 3
+
+# Dot leaders only count as a table of contents in a run of this many entries
+TOC_MIN_ENTRIES = 3
+
+PAGE_NUMBER_RE = re.compile(
+    r"^(page\s*)?\d{1,4}(\s*(of|/)\s*\d{1,4})?$|^[-–—]\s*\d{1,4}\s*[-–—]$",
+    re.IGNORECASE
+)
+TOC_HEADING_RE = re.compile(r"^(table of )?contents$", re.IGNORECASE)
+TOC_ENTRY_RE = re.compile(r"(\.\s*){4,}\s*\d{1,4}$|…+\s*\d{1,4}$")
+HYPHEN_BREAK_RE = re.compile(r"(\w)-\n\s*([a-z])")
+SPACES_RE = re.compile(r"[ \t ]+")
+BLANK_LINES_RE = re.compile(r"\n{3,}")
+DIGITS_RE = re.compile(r"\d+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Count prompt tokens with tiktoken if installed, otherwise ~4 characters per token"""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def normalize_text(text: str) -> Tuple[str, dict]:
+    """
+    Normalize extracted text and report what was saved
+
+    Removes lines repeated across pages (running headers/footers), page numbers
+    and table-of-contents entries, joins hyphenated line breaks and collapses
+    whitespace. Page numbers are only looked for at the edges of pages (so
+    text without page breaks keeps lines like "42"), and table-of-contents
+    lines only in runs of entries. Returns the normalized text and a stats dict.
+    """
+    pages = [_clean_lines(page) for page in text.split(PAGE_BREAK)]
+    repeated = _find_repeated_lines(pages)
+    paginated = len(pages) > 1
+
+    kept_pages = []
+    lines_removed = 0
+    for lines in pages:
+        edges = _edge_indexes(lines)
+        toc = _toc_indexes(lines)
+        kept = []
+        for i, line in enumerate(lines):
+            if line and (
+                i in toc
+                or (i in edges and (
+                    _line_key(line) in repeated
+                    or (paginated and PAGE_NUMBER_RE.match(line))
+                ))
+            ):
+                lines_removed += 1
+                continue
+            kept.append(line)
+        kept_pages.append("\n".join(kept))
+
+    normalized = "\n".join(kept_pages)
+    normalized = HYPHEN_BREAK_RE.sub(r"\1\2", normalized)
+    normalized = BLANK_LINES_RE.sub("\n\n", normalized).strip()
+
+    tokens_before = estimate_tokens(text)
+    tokens_after = estimate_tokens(normalized)
+    stats = {
+        "chars_before": len(text),
+        "chars_after": len(normalized),
+        "chars_saved": len(text) - len(normalized),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "lines_removed": lines_removed
+    }
+    return normalized, stats
+
+
+def _clean_lines(page: str) -> list:
+    """Split a page into lines with runs of spaces collapsed and edges trimmed"""
+    return [SPACES_RE.sub(" ", line).strip() for line in page.split("\n")]
+
+
+def _line_key(line: str) -> str:
+    """Key for spotting running headers/footers; digits are masked so 'Page 3' matches 'Page 4'"""
+    return DIGITS_RE.sub("#", line.lower())
+
+
+def _edge_indexes(lines: list) -> set:
+    """Indexes of the first and last few non-empty lines of a page, where headers/footers live"""
+    filled = [i for i, line in enumerate(lines) if line]
+    return set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+
+
+def _is_toc_entry(line: str) -> bool:
+    """A line ending in dot leaders and a page number"""
+    return line[-1].isdigit() and TOC_ENTRY_RE.search(line) is not None
+
+
+def _toc_indexes(lines: list) -> set:
+    """Indexes of runs of at least TOC_MIN_ENTRIES table-of-contents entries, with the heading just above"""
+    filled = [i for i, line in enumerate(lines) if line]
+    found = set()
+    position = 0
+    for is_entry, group in groupby(filled, key=lambda i: _is_toc_entry(lines[i])):
+        group = list(group)
+        if is_entry and len(group) >= TOC_MIN_ENTRIES:
+            found.update(group)
+            if position and TOC_HEADING_RE.match(lines[filled[position - 1]]):
+                found.add(filled[position - 1])
+        position += len(group)
+    return found
+
+
+def _find_repeated_lines(pages: list) -> set:
+    """Find header/footer lines that repeat at the edges of enough pages"""
+    if len(pages) < REPEATED_LINE_MIN_PAGES:
+        return set()
+
+    page_counts = Counter()
+    for lines in pages:
+        page_counts.update({_line_key(lines[i]) for i in _edge_indexes(lines)})
+
+    threshold = max(REPEATED_LINE_MIN_PAGES, int(len(pages) * REPEATED_LINE_MIN_SHARE))
+    return {key for key, count in page_counts.items() if count >= threshold}
@@ -0,0 +1,67 @@
+"""
+Transcript Cache
+Keeps transcripts of uploaded recordings, keyed by the SHA-256 of the media, so
+repeat uploads and new papers from the same recording skip transcription
+"""
+import json
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import MediaTranscript
+import config
+
+
+def get_transcript(db: Session, media_hash: str, trimmed: Optional[bool] = None) -> Optional[MediaTranscript]:
+    """
+    Look up a cached transcript and mark it as recently used
+    
+    With trimmed=None either variant is accepted, most recently used first.
+    """
+    query = db.query(MediaTranscript).filter(MediaTranscript.media_hash == media_hash)
+    if trimmed is not None:
+        query = query.filter(MediaTranscript.trimmed == trimmed)
+    cached = query.order_by(MediaTranscript.last_used_at.desc()).first()
+    if cached:
+        cached.last_used_at = datetime.utcnow()
+        db.commit()
+    return cached
+
+
+def save_transcript(db: Session, media_hash: str, trimmed: bool, media_type: str,
+                    transcript: str, media_stats: dict) -> MediaTranscript:
+    """Cache a transcript, evicting the least recently used ones past TRANSCRIPT_CACHE_ENTRIES"""
+    cached = MediaTranscript(
+        media_hash=media_hash,
+        trimmed=trimmed,
+        media_type=media_type,
+        transcript=transcript,
+        media_stats=json.dumps(media_stats),
+        char_count=len(transcript)
+    )
+    db.add(cached)
+    try:
+        db.commit()
+    except IntegrityError:
+        # The same recording was transcribed by a concurrent request
+        db.rollback()
+        return get_transcript(db, media_hash, trimmed)
+    
+    evict_transcripts(db, config.TRANSCRIPT_CACHE_ENTRIES)
+    return cached
+
+
+def evict_transcripts(db: Session, max_entries: int) -> int:
+    """Delete the least recently used transcripts beyond max_entries"""
+    excess = db.query(MediaTranscript).count() - max_entries
+    if excess <= 0:
+        return 0
+    
+    stale_ids = [
+        row[0] for row in db.query(MediaTranscript.id)
+        .order_by(MediaTranscript.last_used_at.asc())
+        .limit(excess)
+    ]
+    db.query(MediaTranscript).filter(MediaTranscript.id.in_(stale_ids)).delete(synchronize_session=False)
+    db.commit()
+    return len(stale_ids)
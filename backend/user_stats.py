@@ -0,0 +1,336 @@
+"""
+User Statistics Rollups
+Per-user counts, score sums, per-subject aggregates, a grade histogram and
+daily per-subject sums, updated in the same transaction as each paper and
+evaluation so the dashboard and progress charts never have to scan a user's
+history
+
+Usage:
+    python user_stats.py --rebuild            # rebuild every user's stats
+    python user_stats.py --rebuild --user 42
+    python user_stats.py --rebuild --missing  # only users whose daily rows miss evaluations
+"""
+import math
+import argparse
+import itertools
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import sqlite, postgresql
+
+import config
+from database import (
+    Paper, Evaluation, ArchivedPaper, ArchivedEvaluation, UserStats, UserSubjectStats, UserGradeCount, UserDailyStats
+)
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+BUCKETS = ("day", "week", "month")
+
+
+def percentage_of(score: float, total_marks: float) -> float:
+    """Score as a percentage, treating papers worth 0 marks as 0%"""
+    return (score / total_marks) * 100 if total_marks else 0.0
+
+
+def _increment(db: Session, model, keys: dict, changes: dict):
+    """Add changes to an aggregate row, creating the row if it does not exist yet"""
+    table = model.__table__
+    insert = UPSERT_DIALECTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(table).values(**keys, **changes)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: table.c[column] + statement.excluded[column] for column in changes}
+        )
+        db.execute(statement)
+        return
+    
+    updated = db.query(model).filter_by(**keys).update(
+        {getattr(model, column): getattr(model, column) + value for column, value in changes.items()},
+        synchronize_session=False
+    )
+    if not updated:
+        db.add(model(**keys, **changes))
+        db.flush()
+
+
+def _ensure_stats(db: Session, user_id: int):
+    """Build a user's stats from their history the first time they are needed"""
+    if db.get(UserStats, user_id) is None:
+        rebuild_user_stats(db, user_id)
+
+
+def record_paper(db: Session, user_id: int):
+    """
+    Count a new paper; call before adding the Paper and commit them together
+    """
+    _ensure_stats(db, user_id)
+    _increment(db, UserStats, {"user_id": user_id}, {"paper_count": 1})
+
+
+def record_evaluation(db: Session, user_id: int, subject: str, score: float, total_marks: float, grade: str):
+    """
+    Add an evaluation to the user's totals, subject aggregate, grade histogram
+    and today's row; call before adding the Evaluation and commit them together
+    """
+    _ensure_stats(db, user_id)
+    sums = {
+        "evaluation_count": 1,
+        "score_sum": float(score),
+        "total_marks_sum": float(total_marks),
+        "percentage_sum": percentage_of(score, total_marks)
+    }
+    _increment(db, UserStats, {"user_id": user_id}, sums)
+    if subject:
+        _increment(db, UserSubjectStats, {"user_id": user_id, "subject": subject}, sums)
+    _increment(db, UserGradeCount, {"user_id": user_id, "grade": grade}, {"count": 1})
+    _increment(
+        db, UserDailyStats, {"user_id": user_id, "day": datetime.utcnow().date(), "subject": subject or ""}, sums
+    )
+
+
+def rebuild_user_stats(db: Session, user_id: int):
+    """
+    Recompute one user's rollups from their papers and evaluations, archived
+    ones included
+    
+    Only the columns needed are read, in batches, so large histories stay cheap.
+    Runs in the caller's transaction; the caller commits.
+    """
+    from paper_service import calculate_grade
+    
+    db.query(UserSubjectStats).filter(UserSubjectStats.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserGradeCount).filter(UserGradeCount.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserStats).filter(UserStats.user_id == user_id).delete(synchronize_session=False)
+    db.query(UserDailyStats).filter(UserDailyStats.user_id == user_id).delete(synchronize_session=False)
+    
+    stats = UserStats(
+        user_id=user_id,
+        paper_count=(
+            db.query(Paper.id).filter(Paper.user_id == user_id).count()
+            + db.query(ArchivedPaper.id).filter(ArchivedPaper.user_id == user_id).count()
+        ),
+        evaluation_count=0,
+        score_sum=0.0,
+        total_marks_sum=0.0,
+        percentage_sum=0.0
+    )
+    subjects = {}
+    grades = {}
+    days = {}
+    rows = (
+        db.query(Evaluation.score, Evaluation.total_marks, Paper.subject, Evaluation.evaluated_at)
+        .outerjoin(Paper, Paper.id == Evaluation.paper_id)
+        .filter(Evaluation.user_id == user_id)
+        .yield_per(1000)
+    )
+    archived_rows = (
+        db.query(
+            ArchivedEvaluation.score, ArchivedEvaluation.total_marks, ArchivedEvaluation.subject,
+            ArchivedEvaluation.evaluated_at
+        )
+        .filter(ArchivedEvaluation.user_id == user_id)
+        .yield_per(1000)
+    )
+    for score, total_marks, subject, evaluated_at in itertools.chain(rows, archived_rows):
+        percentage = percentage_of(score, total_marks)
+        stats.evaluation_count += 1
+        stats.score_sum += score
+        stats.total_marks_sum += total_marks
+        stats.percentage_sum += percentage
+        if subject:
+            if subject not in subjects:
+                subjects[subject] = UserSubjectStats(
+                    user_id=user_id, subject=subject,
+                    evaluation_count=0, score_sum=0.0, total_marks_sum=0.0, percentage_sum=0.0
+                )
+            subject_stats = subjects[subject]
+            subject_stats.evaluation_count += 1
+            subject_stats.score_sum += score
+            subject_stats.total_marks_sum += total_marks
+            subject_stats.percentage_sum += percentage
+        grade = calculate_grade(percentage)
+        grades[grade] = grades.get(grade, 0) + 1
+        if evaluated_at:
+            key = (evaluated_at.date(), subject or "")
+            if key not in days:
+                days[key] = UserDailyStats(
+                    user_id=user_id, day=key[0], subject=key[1],
+                    evaluation_count=0, score_sum=0.0, total_marks_sum=0.0, percentage_sum=0.0
+                )
+            day_stats = days[key]
+            day_stats.evaluation_count += 1
+            day_stats.score_sum += score
+            day_stats.total_marks_sum += total_marks
+            day_stats.percentage_sum += percentage
+    
+    db.add(stats)
+    db.add_all(subjects.values())
+    db.add_all(UserGradeCount(user_id=user_id, grade=grade, count=count) for grade, count in grades.items())
+    db.add_all(days.values())
+    db.flush()
+
+
+def get_user_stats(db: Session, user_id: int) -> dict:
+    """Read a user's rollups: totals, average score, subject averages and grade histogram"""
+    stats = db.get(UserStats, user_id)
+    if stats is None:
+        rebuild_user_stats(db, user_id)
+        db.commit()
+        stats = db.get(UserStats, user_id)
+    
+    subjects = db.query(UserSubjectStats).filter(UserSubjectStats.user_id == user_id).all()
+    grades = db.query(UserGradeCount).filter(UserGradeCount.user_id == user_id, UserGradeCount.count > 0).all()
+    return {
+        "total_papers": stats.paper_count,
+        "total_evaluations": stats.evaluation_count,
+        "average_score": stats.percentage_sum / stats.evaluation_count if stats.evaluation_count else 0,
+        "subject_performance": [
+            {
+                "subject": s.subject,
+                "average_score": round(s.percentage_sum / s.evaluation_count, 2)
+            }
+            for s in subjects if s.evaluation_count
+        ],
+        "grade_distribution": {g.grade: g.count for g in grades}
+    }
+
+
+def bucket_bounds(day: date, bucket: str):
+    """First and last day of the day, ISO week (Monday first) or month containing day"""
+    if bucket == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if bucket == "month":
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    return day, day
+
+
+def get_progress_timeseries(
+    db: Session,
+    user_id: int,
+    bucket: str = "week",
+    subject: Optional[str] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    points: Optional[int] = None
+) -> dict:
+    """
+    Average score and evaluation count per day, week or month, overall and by
+    subject, read from the daily rollups
+
+    When there are more buckets than points, runs of consecutive buckets are
+    merged (the same runs in every series, sums combined so averages stay
+    exact) to keep each series at most points long. Read-only: users whose
+    history predates the daily rollup are backfilled with --rebuild --missing.
+    """
+    query = db.query(
+        UserDailyStats.day, UserDailyStats.subject, UserDailyStats.evaluation_count, UserDailyStats.percentage_sum
+    ).filter(UserDailyStats.user_id == user_id)
+    if subject:
+        query = query.filter(UserDailyStats.subject == subject)
+    if start:
+        query = query.filter(UserDailyStats.day >= start)
+    if end:
+        query = query.filter(UserDailyStats.day <= end)
+    
+    # (subject or None for overall, bucket start) -> [evaluation count, percentage sum]
+    sums = {}
+    ends = {}
+    for day, day_subject, count, percentage_sum in query:
+        bucket_start, bucket_end = bucket_bounds(day, bucket)
+        ends[bucket_start] = bucket_end
+        for series in [None] + ([day_subject] if day_subject else []):
+            entry = sums.setdefault((series, bucket_start), [0, 0.0])
+            entry[0] += count
+            entry[1] += percentage_sum
+    
+    # Merge the same runs of buckets in every series
+    starts = sorted(ends)
+    points = max(2, min(points or config.PROGRESS_POINTS, config.PROGRESS_MAX_POINTS))
+    group_size = max(1, math.ceil(len(starts) / points))
+    group_of = {bucket_start: starts[index - index % group_size] for index, bucket_start in enumerate(starts)}
+    group_end = {}
+    for bucket_start in starts:
+        group_end[group_of[bucket_start]] = ends[bucket_start]
+    
+    series_points = {}
+    for (series, bucket_start), (count, percentage_sum) in sums.items():
+        entry = series_points.setdefault(series, {}).setdefault(group_of[bucket_start], [0, 0.0])
+        entry[0] += count
+        entry[1] += percentage_sum
+    
+    def as_points(groups: dict) -> list:
+        return [
+            {
+                "start": group_start.isoformat(),
+                "end": group_end[group_start].isoformat(),
+                "evaluations": count,
+                "average_score": round(percentage_sum / count, 2) if count else 0
+            }
+            for group_start, (count, percentage_sum) in sorted(groups.items())
+        ]
+    
+    return {
+        "bucket": bucket,
+        "buckets_per_point": group_size,
+        "overall": as_points(series_points.get(None, {})),
+        "subjects": [
+            {"subject": name, "points": as_points(groups)}
+            for name, groups in sorted(series_points.items(), key=lambda item: item[0] or "") if name is not None
+        ]
+    }
+
+
+def _users_missing_daily_stats(db: Session) -> set:
+    """
+    Users whose daily rows do not cover all their timestamped evaluations
+
+    Catches users whose history predates daily rollups even after they have
+    recorded new evaluations (and so have some daily rows).
+    """
+    expected = {}
+    for table in (Evaluation, ArchivedEvaluation):
+        for user_id, count in db.query(table.user_id, func.count(table.id)).filter(
+            table.evaluated_at.isnot(None)
+        ).group_by(table.user_id):
+            expected[user_id] = expected.get(user_id, 0) + count
+    covered = dict(
+        db.query(UserDailyStats.user_id, func.sum(UserDailyStats.evaluation_count)).group_by(UserDailyStats.user_id)
+    )
+    return {user_id for user_id, count in expected.items() if (covered.get(user_id) or 0) != count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain per-user statistics rollups")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute stats from papers and evaluations")
+    parser.add_argument("--user", type=int, help="Only rebuild this user ID")
+    parser.add_argument("--missing", action="store_true", help="Only rebuild users whose daily rows miss some evaluations")
+    args = parser.parse_args()
+    
+    if not args.rebuild:
+        parser.print_help()
+        return
+    
+    from database import SessionLocal, User
+    db = SessionLocal()
+    try:
+        user_ids = [args.user] if args.user else [row[0] for row in db.query(User.id)]
+        if args.missing:
+            missing = _users_missing_daily_stats(db)
+            user_ids = [user_id for user_id in user_ids if user_id in missing]
+        for user_id in user_ids:
+            rebuild_user_stats(db, user_id)
+            db.commit()
+        print(f"✅ Rebuilt stats for {len(user_ids)} users")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
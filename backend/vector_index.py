@@ -0,0 +1,370 @@
+"""
+Question Vector Index
+Hashed word n-gram TF-IDF vectors of banked questions, stored in a local SQLite
+file and searched in memory with NumPy (brute force over matrix blocks, or an
+inverted-file index over k-means lists once the bank is large). Vectors stay
+float16 in memory and are scored in float32 one block at a time.
+
+Usage:
+    python vector_index.py --build    # refit IDF and lists, re-vectorize the bank
+"""
+import os
+import zlib
+import math
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from retrieval_index import tokenize
+import config
+
+INDEX_PATH = config.VECTOR_INDEX_PATH
+DIM = config.VECTOR_DIM
+
+IDF_BUCKETS = 1 << 20  # Terms are hashed into this many document-frequency buckets
+BLOCK_ROWS = 65536  # Rows read from the vectors table at a time
+SCORE_BLOCK_ROWS = 1024  # float16 rows converted to float32 at a time while scoring (1 MB)
+IVF_MIN_ROWS = 250000  # Below this an exact brute-force scan takes ~100-150 ms
+IVF_PROBES = 24
+KMEANS_SAMPLE = 20000
+KMEANS_ITERATIONS = 10
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def _features(text: str) -> Counter:
+    """Word unigrams and bigrams with their counts"""
+    tokens = tokenize(text)
+    return Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+
+def vectorize(text: str, idf: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    L2-normalized TF-IDF vector of the text, with features hashed into DIM
+    signed dimensions; None if the text has no words to compare
+    """
+    vector = np.zeros(DIM, dtype=np.float32)
+    for feature, count in _features(text).items():
+        h = zlib.crc32(feature.encode("utf-8"))
+        weight = (1 + math.log(count)) * (idf[h & (IDF_BUCKETS - 1)] if idf is not None else 1.0)
+        vector[(h >> 20) % DIM] += -weight if h >> 31 else weight
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
+
+
+VECTORS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        question_id INTEGER PRIMARY KEY,
+        list INTEGER NOT NULL,
+        vector BLOB NOT NULL
+    );
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(INDEX_PATH)), exist_ok=True)
+    conn = sqlite3.connect(INDEX_PATH, timeout=30)
+    conn.executescript("PRAGMA journal_mode = WAL;" + VECTORS_SCHEMA.format(name="vectors") + """
+        CREATE TABLE IF NOT EXISTS model (
+            key TEXT PRIMARY KEY,
+            value BLOB
+        );
+    """)
+    return conn
+
+
+def _load_model(conn: sqlite3.Connection) -> dict:
+    """
+    IDF weights, list centroids and build version written by build(), and the
+    revision bumped when rows are added out of ID order
+    """
+    model = {key: value for key, value in conn.execute("SELECT key, value FROM model")}
+    return {
+        "version": int(model.get("version") or 0),
+        "revision": int(model.get("revision") or 0),
+        "idf": np.frombuffer(model["idf"], dtype=np.float32) if model.get("idf") else None,
+        "centroids": np.frombuffer(model["centroids"], dtype=np.float32).reshape(-1, DIM) if model.get("centroids") else None
+    }
+
+
+def _nearest_list(vector: np.ndarray, centroids: Optional[np.ndarray]) -> int:
+    return int(np.argmax(centroids @ vector)) if centroids is not None else 0
+
+
+def add_questions(items: Iterable[Tuple[int, str]]) -> int:
+    """
+    Vectorize and index (question_id, text) items in one transaction
+
+    Uses the IDF weights and lists of the last build, read in the same write
+    transaction so a concurrent build cannot swap them out underneath. Returns
+    the number indexed.
+    """
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            model = _load_model(conn)
+            rows = []
+            for question_id, text in items:
+                vector = vectorize(text, model["idf"])
+                if vector is not None:
+                    rows.append((question_id, _nearest_list(vector, model["centroids"]), vector.astype(np.float16).tobytes()))
+            if not rows:
+                return 0
+            # Cached matrices only load IDs above the last one they hold, so a
+            # replaced or late (out of order) row makes them reload instead
+            last_id = conn.execute("SELECT COALESCE(MAX(question_id), 0) FROM vectors").fetchone()[0]
+            if min(row[0] for row in rows) <= last_id:
+                conn.execute(
+                    "INSERT OR REPLACE INTO model (key, value) VALUES ('revision', ?)", (str(model["revision"] + 1),)
+                )
+            conn.executemany("INSERT OR REPLACE INTO vectors (question_id, list, vector) VALUES (?, ?, ?)", rows)
+        return len(rows)
+    finally:
+        conn.close()
+
+
+class _Matrix:
+    """Growable in-memory copy of the vectors table, kept in float16 like the stored vectors"""
+
+    def __init__(self, model: dict):
+        self.model = model
+        self.count = 0
+        self.last_id = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.lists = np.zeros(0, dtype=np.int32)
+        self.vectors = np.zeros((0, DIM), dtype=np.float16)
+
+    def append(self, rows: List[tuple]):
+        needed = self.count + len(rows)
+        if needed > len(self.ids):
+            # New arrays, so snapshots taken before keep their rows
+            capacity = max(needed, 2 * len(self.ids), 1024)
+            self.ids = np.resize(self.ids, capacity)
+            self.lists = np.resize(self.lists, capacity)
+            vectors = np.zeros((capacity, DIM), dtype=np.float16)
+            vectors[:self.count] = self.vectors[:self.count]
+            self.vectors = vectors
+        end = self.count + len(rows)
+        self.ids[self.count:end] = [row[0] for row in rows]
+        self.lists[self.count:end] = [row[1] for row in rows]
+        self.vectors[self.count:end] = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.float16).reshape(-1, DIM)
+        self.count = end
+        self.last_id = max(self.last_id, int(self.ids[end - 1]))
+
+    def snapshot(self) -> "_Snapshot":
+        """The rows loaded so far; appends only write past them, so the views stay consistent"""
+        return _Snapshot(self.model, self.ids[:self.count], self.lists[:self.count], self.vectors[:self.count])
+
+
+class _Snapshot(NamedTuple):
+    model: dict
+    ids: np.ndarray
+    lists: np.ndarray
+    vectors: np.ndarray
+
+
+def _matrix() -> _Snapshot:
+    """A consistent snapshot of this process's copy of the index, refreshed with rows added since the last call"""
+    conn = _connect()
+    try:
+        with _lock:
+            model = _load_model(conn)
+            matrix = _cache.get(INDEX_PATH)
+            if matrix is None or (matrix.model["version"], matrix.model["revision"]) != (model["version"], model["revision"]):
+                matrix = _cache[INDEX_PATH] = _Matrix(model)
+            while True:
+                rows = conn.execute(
+                    "SELECT question_id, list, vector FROM vectors WHERE question_id > ? ORDER BY question_id LIMIT ?",
+                    (matrix.last_id, BLOCK_ROWS)
+                ).fetchall()
+                if not rows:
+                    return matrix.snapshot()
+                matrix.append(rows)
+    finally:
+        conn.close()
+
+
+def _scores(vectors: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    """Dot products of float16 rows with the query, converted to float32 a block at a time"""
+    scores = np.empty(len(vectors), dtype=np.float32)
+    buffer = np.empty((SCORE_BLOCK_ROWS, DIM), dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+        block = vectors[start:start + SCORE_BLOCK_ROWS]
+        converted = buffer[:len(block)]
+        converted[...] = block
+        np.matmul(converted, vector, out=scores[start:start + len(block)])
+    return scores
+
+
+def search(
+    text: Optional[str] = None,
+    vector: Optional[np.ndarray] = None,
+    k: int = 10,
+    exclude: Iterable[int] = ()
+) -> List[Tuple[int, float]]:
+    """
+    The k indexed questions most similar to text (or a vector), as
+    (question_id, cosine similarity) pairs, best first
+    """
+    matrix = _matrix()
+    if vector is None:
+        vector = vectorize(text or "", matrix.model["idf"])
+    if vector is None or len(matrix.ids) == 0:
+        return []
+    vector = vector.astype(np.float32)
+
+    exclude = set(exclude)
+    wanted = k + len(exclude)
+    centroids = matrix.model["centroids"]
+    if centroids is not None and len(matrix.ids) >= IVF_MIN_ROWS:
+        # Score only the rows in the lists whose centroids are closest to the query
+        probed = np.zeros(len(centroids), dtype=bool)
+        probes = min(IVF_PROBES, len(centroids))
+        probed[np.argpartition(centroids @ vector, -probes)[-probes:]] = True
+        rows = np.flatnonzero(probed[matrix.lists])
+        scores = _scores(matrix.vectors[rows], vector)
+    else:
+        rows = np.arange(len(matrix.ids))
+        scores = _scores(matrix.vectors, vector)
+
+    if len(scores) > wanted:
+        top = np.argpartition(scores, -wanted)[-wanted:]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(scores[top])[::-1]]
+    results = []
+    for index in top:
+        question_id = int(matrix.ids[rows[index]])
+        if question_id not in exclude and scores[index] > 0:
+            results.append((question_id, round(float(scores[index]), 4)))
+    return results[:k]
+
+
+def _kmeans(vectors: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids of unit vectors"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for index in range(lists):
+            members = vectors[assignment == index]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[index] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+
+def _bank_batches(batch_size: int = 5000):
+    """(question_id, text) rows of the bank in ID order, one batch at a time"""
+    from database import SessionLocal, BankQuestion
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            rows = db.query(BankQuestion.id, BankQuestion.text).filter(
+                BankQuestion.id > last_id
+            ).order_by(BankQuestion.id).limit(batch_size).all()
+            if not rows:
+                return
+            yield [(row.id, row.text) for row in rows]
+            last_id = rows[-1].id
+    finally:
+        db.close()
+
+
+def build(batches: Callable[[], Iterable[List[Tuple[int, str]]]] = _bank_batches) -> int:
+    """
+    Refit IDF weights and k-means lists and re-vectorize every question
+
+    Makes two streaming passes over batches() (the bank by default) and
+    writes the new vectors to a staging table, swapped in at the end. Questions
+    indexed while the build ran (IDs above the last one it read) are carried
+    over with their existing vectors until the next build. Returns the number
+    indexed.
+    """
+    # Pass 1: document frequencies of hashed terms
+    df = np.zeros(IDF_BUCKETS, dtype=np.int64)
+    total = 0
+    for rows in batches():
+        for _, text in rows:
+            df[list({zlib.crc32(feature.encode("utf-8")) & (IDF_BUCKETS - 1) for feature in _features(text)})] += 1
+        total += len(rows)
+    idf = (np.log((1 + total) / (1 + df)) + 1).astype(np.float32)
+
+    # Pass 2: vectors; lists are fitted on a sample of them
+    ids, vectors = [], []
+    last_id = 0
+    for rows in batches():
+        for question_id, text in rows:
+            last_id = max(last_id, question_id)
+            vector = vectorize(text, idf)
+            if vector is not None:
+                ids.append(question_id)
+                vectors.append(vector.astype(np.float16))
+    matrix = np.array(vectors, dtype=np.float16).reshape(-1, DIM)
+    del vectors
+
+    centroids = None
+    assignment = np.zeros(len(ids), dtype=np.int32)
+    if len(ids) >= IVF_MIN_ROWS:
+        lists = int(min(1024, max(16, math.sqrt(len(ids)))))
+        sample = np.random.default_rng(0).choice(len(ids), min(KMEANS_SAMPLE, len(ids)), replace=False)
+        centroids = _kmeans(matrix[sample].astype(np.float32), lists)
+        for start in range(0, len(ids), BLOCK_ROWS):
+            block = matrix[start:start + BLOCK_ROWS].astype(np.float32)
+            assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+    conn = _connect()
+    try:
+        # Staged a block per transaction, so add_questions is not held up meanwhile
+        conn.executescript("DROP TABLE IF EXISTS vectors_staging;" + VECTORS_SCHEMA.format(name="vectors_staging"))
+        for start in range(0, len(ids), BLOCK_ROWS):
+            with conn:
+                conn.executemany(
+                    "INSERT INTO vectors_staging (question_id, list, vector) VALUES (?, ?, ?)",
+                    ((ids[index], int(assignment[index]), matrix[index].tobytes())
+                     for index in range(start, min(start + BLOCK_ROWS, len(ids))))
+                )
+
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            carried = conn.execute(
+                "SELECT question_id, vector FROM vectors WHERE question_id > ? ORDER BY question_id", (last_id,)
+            ).fetchall()
+            conn.executemany(
+                "INSERT INTO vectors_staging (question_id, list, vector) VALUES (?, ?, ?)",
+                ((question_id, _nearest_list(np.frombuffer(vector, dtype=np.float16).astype(np.float32), centroids), vector)
+                 for question_id, vector in carried)
+            )
+            conn.execute("DROP TABLE vectors")
+            conn.execute("ALTER TABLE vectors_staging RENAME TO vectors")
+            conn.executemany("INSERT OR REPLACE INTO model (key, value) VALUES (?, ?)", [
+                ("idf", idf.tobytes()),
+                ("centroids", centroids.tobytes() if centroids is not None else None),
+                ("version", str(_load_model(conn)["version"] + 1))
+            ])
+        return len(ids) + len(carried)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the question vector index")
+    parser.add_argument("--build", action="store_true", help="Refit IDF and lists and re-vectorize the bank")
+    args = parser.parse_args()
+
+    if not args.build:
+        parser.print_help()
+        return
+
+    print(f"✅ Indexed {build()} questions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Background Job Worker
+Runs queued jobs (paper generation, media, documents, evaluation) in worker
+processes separate from the API server
+
+Usage:
+    python worker.py              # JOB_WORKERS processes
+    python worker.py --workers 4
+"""
+import os
+import time
+import socket
+import argparse
+import multiprocessing
+
+import config
+
+
+def run_worker(index: int):
+    """Claim and run jobs until interrupted"""
+    # Imported here so each process opens its own database connections
+    from database import SessionLocal
+    from jobs import claim_job, requeue_stale_jobs, run_job
+    from archive import archive_batch
+    
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    print(f"👷 Worker {worker_id} started")
+    
+    # The first worker also archives old papers and evaluations while idle
+    archive_due = time.monotonic() if index == 0 and config.ARCHIVE_ENABLED else None
+    
+    try:
+        while True:
+            db = SessionLocal()
+            try:
+                requeue_stale_jobs(db, worker_id)
+                job = claim_job(db, worker_id)
+                if job:
+                    print(f"▶️  {worker_id} running job {job.id} ({job.kind}, attempt {job.attempts})")
+                    run_job(db, job)
+                    print(f"⏹️  Job {job.id} {job.status}")
+                elif archive_due is not None and time.monotonic() >= archive_due:
+                    archive_due = time.monotonic() + config.ARCHIVE_INTERVAL_MINUTES * 60
+                    evaluations, papers = archive_batch(db)
+                    if evaluations or papers:
+                        print(f"🗄️  {worker_id} archived {evaluations} evaluations, {papers} papers")
+                    # A full batch means more are waiting; continue on the next idle poll
+                    if max(evaluations, papers) >= config.ARCHIVE_BATCH_SIZE:
+                        archive_due = time.monotonic()
+            except Exception as e:
+                # Keep the worker alive through database hiccups
+                print(f"WARNING: Worker {worker_id} error: {str(e)}")
+                job = None
+            finally:
+                db.close()
+            
+            if not job:
+                time.sleep(config.JOB_POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--workers", type=int, default=config.JOB_WORKERS, help="Number of worker processes")
+    args = parser.parse_args()
+    
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(index,), daemon=True)
+        for index in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping workers...")
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,17 @@ sys.path.append('..')
 import config
 import utils
 
+# Progress messages for background job stages
+JOB_STAGE_LABELS = {
+    "queued": "Waiting for a worker...",
+    "started": "Starting...",
+    "transcribing": "Transcribing the recording...",
+    "assembling": "Picking questions from the question bank...",
+    "generating": "Generating questions...",
+    "saving": "Saving the paper...",
+    "waiting_to_retry": "Hit a temporary problem, retrying shortly..."
+}
+
 st.set_page_config(
     page_title=f"{config.PAGE_TITLE} - Generate Paper",
     page_icon=config.PAGE_ICON,
@@ -404,14 +415,69 @@ if st.session_state.current_paper and st.session_state.get('paper_source') == 'c
 # Tab 2: Generate from Document
 with tab2:
     st.markdown("### Generate Paper from Document")
-    st.markdown("Upload a document (PDF, DOCX, or TXT) and generate questions based on its content.")
+    st.markdown("Upload one or more documents (PDF, DOCX, or TXT) and generate questions based on their content.")
     
-    uploaded_file = st.file_uploader(
-        "📎 Upload Document",
-        type=["pdf", "docx", "txt"],
-        help="Upload a PDF, DOCX, or TXT file"
+    document_source = st.radio(
+        "Document Source",
+        ["📎 Upload New", "📚 My Library"],
+        horizontal=True,
+        help="Documents you upload are kept in your library so you can generate more papers without re-uploading"
     )
     
+    uploaded_files = []
+    library_document = None
+    topic = ""
+    subject = ""
+    if document_source == "📚 My Library":
+        library_result = utils.make_api_request("/api/documents", method="GET")
+        library_documents = library_result["data"]["documents"] if library_result["success"] else []
+        if library_documents:
+            topic = st.text_input(
+                "🎯 Topic Focus (optional)",
+                placeholder="e.g., photosynthesis",
+                help="Search your whole library for this topic and use only the most relevant passages"
+            )
+            if topic.strip():
+                subjects = sorted({d["subject"] for d in library_documents if d.get("subject")})
+                subject = st.selectbox("📚 Search Within Subject", ["All subjects"] + subjects)
+                if subject == "All subjects":
+                    subject = ""
+            else:
+                library_document = st.selectbox(
+                    "📚 Choose a Document",
+                    library_documents,
+                    format_func=lambda d: f"{d['filename']} ({d['char_count']:,} characters, added {utils.format_date(d['created_at'])})"
+                )
+        else:
+            st.info("Your library is empty. Upload a document to add it.")
+    else:
+        uploaded_files = st.file_uploader(
+            "📎 Upload Documents",
+            type=["pdf", "docx", "txt", "zip"],
+            accept_multiple_files=True,
+            help="Upload PDF, DOCX, or TXT files, or a ZIP archive of them. Several files make one combined paper."
+        )
+        subject = st.text_input(
+            "📚 Subject (optional)",
+            placeholder="e.g., Biology",
+            help="File the documents under this subject in your library"
+        )
+    
+    with st.expander("📑 Use only part of a PDF (optional, single PDF upload only)"):
+        col1, col2 = st.columns(2)
+        with col1:
+            page_range = st.text_input(
+                "📄 Page Range",
+                placeholder="e.g., 40-55 or 1-3, 7",
+                help="Only these pages of the PDF are used to generate questions"
+            )
+        with col2:
+            sections = st.text_input(
+                "🔖 Section Headings",
+                placeholder="e.g., Photosynthesis, Respiration",
+                help="Comma-separated headings from the PDF's bookmarks"
+            )
+    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -482,8 +548,8 @@ with tab2:
     col1, col2, col3 = st.columns([1, 1, 1])
     with col2:
         if st.button("📄 Generate from Document", use_container_width=True, type="primary"):
-            if not uploaded_file:
-                utils.display_error("Please upload a document first")
+            if not uploaded_files and not library_document and not topic.strip():
+                utils.display_error("Please upload or choose a document first")
             elif num_mcqs == 0 and num_short == 0:
                 utils.display_error("Please specify at least one type of question")
             else:
@@ -491,7 +557,6 @@ with tab2:
                 st.session_state.evaluation_results = None
                 
                 with st.spinner("🤖 Analyzing document and generating questions... This may take a moment."):
-                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
                     data = {
                         "num_mcqs": num_mcqs,
                         "num_short_questions": num_short,
@@ -499,8 +564,36 @@ with tab2:
                         "marks_per_short": marks_per_short
                     }
                     
+                    if topic.strip():
+                        # Only the passages that match the topic are used
+                        files = None
+                        data["query"] = topic.strip()
+                        if subject:
+                            data["subject"] = subject
+                        endpoint = "/api/generate_paper_from_library"
+                    elif library_document:
+                        # Stored text is reused, nothing to upload
+                        files = None
+                        endpoint = f"/api/documents/{library_document['id']}/generate_paper"
+                    elif len(uploaded_files) == 1 and not uploaded_files[0].name.lower().endswith(".zip"):
+                        uploaded_file = uploaded_files[0]
+                        files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
+                        if page_range.strip():
+                            data["page_range"] = page_range.strip()
+                        if sections.strip():
+                            data["sections"] = sections.strip()
+                        if subject.strip():
+                            data["subject"] = subject.strip()
+                        endpoint = "/api/generate_paper_from_document"
+                    else:
+                        # Several files or an archive make one combined paper
+                        files = [("files", (f.name, f.getvalue(), f.type)) for f in uploaded_files]
+                        if subject.strip():
+                            data["subject"] = subject.strip()
+                        endpoint = "/api/generate_paper_from_documents"
+                    
                     result = utils.make_api_request(
-                        "/api/generate_paper_from_document",
+                        endpoint,
                         method="POST",
                         data=data,
                         files=files
@@ -803,7 +896,7 @@ with tab3:
     st.markdown("### Generate Paper from Audio/Video")
     st.markdown("Upload audio or video files and generate questions based on their content.")
     
-    st.info("💡 **Supported Formats:** Audio (MP3, WAV, M4A, OGG, FLAC) | Video (MP4, AVI, MOV, MKV, MPEG) | Max Size: 25MB")
+    st.info(f"💡 **Supported Formats:** Audio (MP3, WAV, M4A, OGG, FLAC) | Video (MP4, AVI, MOV, MKV, MPEG) | Max Size: {st.get_option('server.maxUploadSize')}MB")
     
     uploaded_file_media = st.file_uploader(
         "🎬 Upload Media File",
@@ -821,6 +914,11 @@ with tab3:
         if file_size > 20:
             st.warning("⚠️ Large file detected. Transcription may take longer.")
     
+    trim_silence = st.checkbox(
+        "✂️ Trim silence and dead air",
+        help="Cut out silence, setup time and breaks before transcription so only speech is transcribed"
+    )
+    
     st.markdown("---")
     st.markdown("### ⚙️ Configure Questions")
     
@@ -907,22 +1005,32 @@ with tab3:
                 # Clear previous evaluation results
                 st.session_state.evaluation_results = None
                 
-                with st.spinner("🎙️ Transcribing media and generating questions... This may take a few moments."):
+                with st.spinner("🎙️ Transcribing media and generating questions... Long recordings can take several minutes."):
                     files = {"file": (uploaded_file_media.name, uploaded_file_media.getvalue(), uploaded_file_media.type)}
                     data = {
                         "num_mcqs": num_mcqs_media,
                         "num_short_questions": num_short_media,
                         "marks_per_mcq": marks_per_mcq_media,
-                        "marks_per_short": marks_per_short_media
+                        "marks_per_short": marks_per_short_media,
+                        "trim_silence": trim_silence
                     }
                     
+                    # Runs as a background job so long recordings don't time out the request
                     result = utils.make_api_request(
-                        "/api/generate_paper_from_media",
+                        "/api/jobs/generate_paper_from_media",
                         method="POST",
                         data=data,
                         files=files
                     )
                     
+                    if result["success"]:
+                        job_status = st.empty()
+                        result = utils.wait_for_job(
+                            result["data"]["job_id"],
+                            on_update=lambda job: job_status.info(f"⏳ {JOB_STAGE_LABELS.get(job['stage'], job['stage'])}")
+                        )
+                        job_status.empty()
+                    
                     if result["success"]:
                         paper_data = result["data"]
                         st.session_state.current_paper = paper_data
@@ -950,6 +1058,16 @@ if st.session_state.current_paper and st.session_state.get('paper_source') == 'm
     with col3:
         st.markdown(f"**Paper ID:** {paper_data['paper_id']}")
     
+    if paper_data.get('transcript_cached'):
+        st.info("⚡ This recording was transcribed before, so its stored transcript was reused.")
+    
+    media_stats = paper_data.get('media_stats') or {}
+    if media_stats.get('removed_percent') is not None:
+        st.info(
+            f"✂️ Trimmed {media_stats['removed_percent']}% silence: "
+            f"{media_stats['duration_seconds'] / 60:.1f} → {media_stats['transcribed_seconds'] / 60:.1f} minutes transcribed"
+        )
+    
     # Show transcript preview if available
     if paper_data.get('transcript_preview'):
         with st.expander("📝 View Transcript Preview"):
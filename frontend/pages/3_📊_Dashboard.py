@@ -162,6 +162,42 @@ with col2:
     else:
         st.info("No subject performance data available yet. Generate papers to see subject-wise performance.")
 
+# Progress over time
+st.markdown("### 📉 Progress Over Time")
+bucket_labels = {"Daily": "day", "Weekly": "week", "Monthly": "month"}
+bucket_label = st.radio("Group by", list(bucket_labels), index=1, horizontal=True, label_visibility="collapsed")
+progress_result = utils.make_api_request(
+    f"/api/progress/timeseries?bucket={bucket_labels[bucket_label]}&points=120", method="GET"
+)
+
+if progress_result["success"] and progress_result["data"].get("overall"):
+    progress = progress_result["data"]
+    rows = [dict(point, series="Overall") for point in progress["overall"]]
+    for series in progress.get("subjects", []):
+        rows.extend(dict(point, series=series["subject"]) for point in series["points"])
+    df_progress = pd.DataFrame(rows)
+    df_progress["start"] = pd.to_datetime(df_progress["start"])
+
+    fig = px.line(
+        df_progress,
+        x='start',
+        y='average_score',
+        color='series',
+        markers=True,
+        hover_data=['evaluations'],
+        labels={'start': 'Period', 'average_score': 'Average Score (%)', 'series': '', 'evaluations': 'Evaluations'}
+    )
+    fig.update_layout(
+        height=380,
+        yaxis_range=[0, 100],
+        margin=dict(t=10, b=0, l=0, r=0)
+    )
+    st.plotly_chart(fig, use_container_width=True)
+elif not progress_result["success"]:
+    utils.display_error(progress_result["error"])
+else:
+    st.info("No evaluations yet. Your scores over time will appear here.")
+
 st.markdown("---")
 
 # Recent Papers
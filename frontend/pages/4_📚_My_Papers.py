@@ -4,6 +4,7 @@ My Papers Page - View and attempt saved papers
 import streamlit as st
 import json
 import sys
+from urllib.parse import urlencode
 sys.path.append('..')
 import config
 import utils
@@ -31,49 +32,65 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-# Fetch dashboard to get papers
-with st.spinner("Loading your papers..."):
-    result = utils.make_api_request("/api/dashboard", method="GET")
-    
+PAGE_SIZE = 20
+FILTERS = [("subject", "Subject"), ("grade", "Grade"), ("paper_type", "Type")]
+
+
+def search_papers(query: dict, offset: int):
+    """Fetch one page of search results from the backend"""
+    params = {key: value for key, value in query.items() if value}
+    params.update({"limit": PAGE_SIZE, "offset": offset})
+    return utils.make_api_request(f"/api/papers/search?{urlencode(params)}", method="GET")
+
+
+# Search box; filter values come from the previous run's selectboxes
+search = st.text_input("🔍 Search papers", placeholder="Search by chapter, topic, document or question text...")
+query = {"q": search.strip()}
+for field, _ in FILTERS:
+    value = st.session_state.get(f"papers_filter_{field}", "All")
+    query[field] = None if value == "All" else value
+
+# A new search or filter starts again from the first page
+if st.session_state.get("papers_query") != query:
+    with st.spinner("Loading your papers..."):
+        result = search_papers(query, 0)
     if not result["success"]:
         utils.display_error(result["error"])
         st.stop()
-    
-    data = result["data"]
-    papers = data.get("recent_papers", [])
+    st.session_state.papers_query = query
+    st.session_state.papers_results = result["data"]["papers"]
+    st.session_state.papers_total = result["data"]["total"]
+    st.session_state.papers_facets = result["data"]["facets"]
 
-if not papers:
+papers = st.session_state.papers_results
+total = st.session_state.papers_total
+facets = st.session_state.papers_facets
+
+if not total and not any(query.values()):
     st.info("📝 No papers generated yet. Generate your first paper to get started!")
     if st.button("Generate New Paper", use_container_width=True, type="primary"):
         st.switch_page("pages/1_📝_Generate_Paper.py")
     st.stop()
 
-# Filter and search
-col1, col2, col3 = st.columns([2, 1, 1])
-with col1:
-    search = st.text_input("🔍 Search papers", placeholder="Search by subject, chapter, or grade...")
-with col2:
-    filter_subject = st.selectbox("Filter by Subject", ["All"] + list(set([p.get('subject', 'N/A') for p in papers if p.get('subject')])))
-with col3:
-    filter_grade = st.selectbox("Filter by Grade", ["All"] + list(set([p.get('grade', 'N/A') for p in papers if p.get('grade')])))
-
-# Apply filters
-filtered_papers = papers
-if search:
-    filtered_papers = [p for p in filtered_papers if 
-                      search.lower() in str(p.get('subject', '')).lower() or
-                      search.lower() in str(p.get('chapter', '')).lower() or
-                      search.lower() in str(p.get('grade', '')).lower()]
-if filter_subject != "All":
-    filtered_papers = [p for p in filtered_papers if p.get('subject') == filter_subject]
-if filter_grade != "All":
-    filtered_papers = [p for p in filtered_papers if p.get('grade') == filter_grade]
+# Facet filters with match counts
+counts = {field: {f["value"]: f["count"] for f in facets.get(field, [])} for field, _ in FILTERS}
+for column, (field, label) in zip(st.columns(len(FILTERS)), FILTERS):
+    options = ["All"] + list(counts[field])
+    if query[field] and query[field] not in options:
+        options.append(query[field])
+    with column:
+        st.selectbox(
+            f"Filter by {label}",
+            options,
+            key=f"papers_filter_{field}",
+            format_func=lambda value, field=field: value if value == "All" else f"{value} ({counts[field].get(value, 0)})"
+        )
 
-st.markdown(f"### 📋 {len(filtered_papers)} Paper(s) Found")
+st.markdown(f"### 📋 {total} Paper(s) Found")
 st.markdown("---")
 
 # Display papers as cards
-for i, paper in enumerate(filtered_papers):
+for i, paper in enumerate(papers):
     with st.container():
         col1, col2 = st.columns([3, 1])
         
@@ -87,7 +104,7 @@ for i, paper in enumerate(filtered_papers):
                 margin-bottom: 20px;
             ">
                 <h3 style="margin: 0 0 10px 0;">{paper.get('subject', 'N/A')} - {paper.get('chapter', 'N/A')}</h3>
-                <p style="margin: 5px 0; opacity: 0.9;"><strong>Grade:</strong> {paper.get('grade', 'N/A')} | <strong>Type:</strong> {paper.get('type', 'N/A')}</p>
+                <p style="margin: 5px 0; opacity: 0.9;"><strong>Grade:</strong> {paper.get('grade', 'N/A')} | <strong>Type:</strong> {paper.get('paper_type', 'N/A')}</p>
                 <p style="margin: 5px 0; opacity: 0.9;"><strong>Total Marks:</strong> {paper.get('total_marks', 'N/A')}</p>
                 <p style="margin: 5px 0; opacity: 0.9; font-size: 14px;">Created: {utils.format_date(paper['created_at'])}</p>
                 {f"<p style='margin: 5px 0; opacity: 0.9; font-size: 14px;'>Document: {paper.get('document_name', '')}</p>" if paper.get('document_name') else ""}
@@ -104,6 +121,23 @@ for i, paper in enumerate(filtered_papers):
                     st.session_state.view_paper = True
                     st.rerun()
 
+# Fetch further pages on demand instead of downloading the whole list
+col1, col2 = st.columns(2)
+with col1:
+    if len(papers) < total and st.button(f"⬇️ Load More ({len(papers)} of {total} shown)", use_container_width=True):
+        with st.spinner("Loading more papers..."):
+            result = search_papers(query, len(papers))
+        if result["success"]:
+            st.session_state.papers_results = papers + result["data"]["papers"]
+            st.session_state.papers_total = result["data"]["total"]
+            st.rerun()
+        else:
+            utils.display_error(result["error"])
+with col2:
+    if st.button("🔄 Refresh", use_container_width=True):
+        st.session_state.pop("papers_query", None)
+        st.rerun()
+
 # If a paper is selected, show it
 if st.session_state.get('view_paper') and st.session_state.get('selected_paper_id'):
     paper_id = st.session_state.selected_paper_id
@@ -1,9 +1,10 @@
 """
 Utility functions for the frontend application
 """
+import time
 import requests
 import streamlit as st
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable
 import config
 
 
@@ -11,7 +12,7 @@ def make_api_request(
     endpoint: str,
     method: str = "GET",
     data: Optional[Dict] = None,
-    files: Optional[Dict] = None,
+    files: Optional[Any] = None,
     use_auth: bool = True
 ) -> Dict[str, Any]:
     """
@@ -21,7 +22,7 @@ def make_api_request(
         endpoint: API endpoint (e.g., "/api/auth/login")
         method: HTTP method (GET, POST, etc.)
         data: Request data (for POST, PUT)
-        files: Files to upload
+        files: Files to upload (dict, or list of (field, file) tuples for several files)
         use_auth: Whether to include authentication token
     
     Returns:
@@ -64,6 +65,42 @@ def make_api_request(
         return {"success": False, "error": str(e)}
 
 
+def wait_for_job(
+    job_id: int,
+    on_update: Optional[Callable[[Dict], None]] = None,
+    poll_seconds: float = 1.0,
+    timeout_seconds: int = 3600
+) -> Dict[str, Any]:
+    """
+    Poll a background job until it finishes
+    
+    Args:
+        job_id: ID returned by a /api/jobs/... submit endpoint
+        on_update: Called with the job status after every poll (e.g. to show the stage)
+        poll_seconds: Delay between polls
+        timeout_seconds: Give up waiting after this long
+    
+    Returns:
+        Same shape as make_api_request; data is the job's result
+    """
+    deadline = time.time() + timeout_seconds
+    while time.time() < deadline:
+        result = make_api_request(f"/api/jobs/{job_id}")
+        if not result["success"]:
+            return result
+        
+        job = result["data"]
+        if on_update:
+            on_update(job)
+        if job["status"] == "succeeded":
+            return {"success": True, "data": job["result"]}
+        if job["status"] == "failed":
+            return {"success": False, "error": job["error"]}
+        time.sleep(poll_seconds)
+    
+    return {"success": False, "error": "This is taking longer than expected. Please check My Papers later."}
+
+
 def init_session_state():
     """Initialize session state variables"""
     if "authenticated" not in st.session_state:
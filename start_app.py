@@ -1,6 +1,6 @@
 """
 Unified Application Launcher
-Starts both backend API and frontend Streamlit app together
+Starts the backend API, background job workers and frontend Streamlit app together
 """
 import subprocess
 import sys
@@ -47,6 +47,20 @@ def main():
     
     print("✅ Backend API running on http://localhost:8000")
     
+    # Start background job workers (media and other long-running requests)
+    # Their output goes to a log file: a pipe nobody reads would fill up and block them
+    print("\n👷 Starting Background Job Workers...")
+    worker_log_path = backend_dir / "worker.log"
+    worker_log = open(worker_log_path, "a", encoding="utf-8")
+    worker_process = subprocess.Popen(
+        [str(python_exe), "worker.py"],
+        cwd=str(backend_dir),
+        stdout=worker_log,
+        stderr=subprocess.STDOUT,
+        text=True
+    )
+    print(f"✅ Job workers running (output in {worker_log_path})")
+    
     # Start frontend server
     print("\n🎨 Starting Frontend Streamlit App...")
     frontend_process = subprocess.Popen(
@@ -65,7 +79,7 @@ def main():
     print("\n" + "=" * 50)
     print("🎉 Application is ready!")
     print("📱 Open http://localhost:8501 in your browser")
-    print("\n💡 Press Ctrl+C to stop both servers")
+    print("\n💡 Press Ctrl+C to stop all servers")
     print("=" * 50)
     
     try:
@@ -81,6 +95,11 @@ def main():
                 print("\n❌ Frontend stopped unexpectedly!")
                 break
             
+            # Check if workers are still running
+            if worker_process.poll() is not None:
+                print("\n❌ Job workers stopped unexpectedly!")
+                break
+            
             time.sleep(1)
     
     except KeyboardInterrupt:
@@ -90,6 +109,9 @@ def main():
         print("⏹️  Stopping frontend...")
         frontend_process.terminate()
         
+        print("⏹️  Stopping job workers...")
+        worker_process.terminate()
+        
         print("⏹️  Stopping backend...")
         backend_process.terminate()
         
@@ -99,6 +121,7 @@ def main():
         # Force kill if still running
         try:
             frontend_process.kill()
+            worker_process.kill()
             backend_process.kill()
         except:
             pass
@@ -109,9 +132,11 @@ def main():
         # Ensure processes are terminated
         try:
             frontend_process.terminate()
+            worker_process.terminate()
             backend_process.terminate()
         except:
             pass
+        worker_log.close()
 
 if __name__ == "__main__":
     main()